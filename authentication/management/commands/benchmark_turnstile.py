@@ -0,0 +1,123 @@
+"""
+Management command to benchmark Turnstile verification against a local stub server.
+"""
+
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import requests
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from authentication import turnstile
+from bodaboda_welfare.benchmarking import format_timing, timed
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers like siteverify; tokens starting with "bad" are rejected"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        token = parse_qs(self.rfile.read(length).decode()).get('response', [''])[0]
+        time.sleep(self.server.delay)
+        success = not token.startswith('bad')
+        body = json.dumps({
+            'success': success,
+            'error-codes': [] if success else ['invalid-input-response'],
+            'hostname': 'localhost',
+        }).encode()
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The verifier gave up waiting
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Time Turnstile verification, token caching and the circuit breaker against a local stub server'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=200,
+            help='Verifications to time per scenario (default: 200)'
+        )
+        parser.add_argument(
+            '--delay',
+            type=float,
+            default=0.005,
+            help='Seconds the stub takes to answer (default: 0.005)'
+        )
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        server.delay = options['delay']
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_port}/siteverify'
+
+        try:
+            with override_settings(
+                CLOUDFLARE_TURNSTILE_SECRET_KEY='benchmark-secret',
+                TURNSTILE_VERIFY_URL=url,
+                TURNSTILE_READ_TIMEOUT=0.5,
+                TURNSTILE_FAILURE_THRESHOLD=5,
+                TURNSTILE_RECOVERY_TIMEOUT=60,
+            ):
+                results = self.run_scenarios(server, url, repeat)
+            stats = turnstile.stats()
+        finally:
+            server.shutdown()
+            server.server_close()
+            turnstile.reset_session()
+            turnstile.breaker.reset()
+
+        for label, result in results:
+            self.stdout.write(format_timing(label, result))
+        self.stdout.write(f'Verifier stats: {stats}')
+        self.stdout.write(self.style.SUCCESS('Benchmarked Turnstile verification'))
+
+    def run_scenarios(self, server, url, repeat):
+        verifier = turnstile.TurnstileVerification()
+        turnstile.reset_session()
+        turnstile.breaker.reset()
+        turnstile._stats.reset()
+
+        def unpooled():
+            # What every verification used to do: a new connection per call
+            requests.post(url, data={'secret': 'benchmark-secret', 'response': uuid.uuid4().hex}, timeout=10).json()
+
+        def fresh_token():
+            assert verifier.verify_token(uuid.uuid4().hex, '127.0.0.1')['success']
+
+        token = uuid.uuid4().hex
+
+        def repeated_token():
+            assert verifier.verify_token(token, '127.0.0.1', 'benchmark-session', '127.0.0.1')['success']
+
+        results = [
+            ('Before, new connection per verification', timed(unpooled, repeat)),
+            ('After, pooled session', timed(fresh_token, repeat)),
+            ('After, token verified again', timed(repeated_token, repeat)),
+        ]
+
+        # Cloudflare stops answering within the read timeout
+        server.delay = 1
+        results.append(('After, Cloudflare unresponsive', timed(
+            lambda: verifier.verify_token(uuid.uuid4().hex, '127.0.0.1'), 20
+        )))
+        return results
@@ -1,3 +1,76 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from authentication import turnstile
+
+
+@override_settings(CLOUDFLARE_TURNSTILE_SECRET_KEY='test-secret')
+class TurnstileCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        turnstile.breaker.reset()
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {'success': True}
+        self.session = mock.Mock()
+        self.session.post.return_value = response
+        patcher = mock.patch.object(turnstile, 'get_session', return_value=self.session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, session_key=None, remote_addr='10.0.0.1', forwarded_for=None, token='token'):
+        extra = {'REMOTE_ADDR': remote_addr}
+        if forwarded_for:
+            extra['HTTP_X_FORWARDED_FOR'] = forwarded_for
+        request = RequestFactory().post('/auth/login/', {'cf-turnstile-response': token}, **extra)
+        request.session = SessionStore(session_key)
+        return request
+
+    def test_form_posted_again_reuses_verification(self):
+        request = self.post()
+        self.assertTrue(turnstile.verify_turnstile(request)['success'])
+        session_key = request.session.session_key
+        self.assertIsNotNone(session_key)
+
+        result = turnstile.verify_turnstile(self.post(session_key))
+        self.assertTrue(result.get('cached'))
+        self.assertEqual(self.session.post.call_count, 1)
+
+    def test_cached_token_is_bound_to_connection_and_session(self):
+        request = self.post(forwarded_for='203.0.113.9')
+        turnstile.verify_turnstile(request)
+        session_key = request.session.session_key
+
+        # Same forwarded address, different connection or session: not cached
+        turnstile.verify_turnstile(self.post(session_key, remote_addr='10.0.0.2', forwarded_for='203.0.113.9'))
+        turnstile.verify_turnstile(self.post(remote_addr='10.0.0.1', forwarded_for='203.0.113.9'))
+        self.assertEqual(self.session.post.call_count, 3)
+
+    def test_consumed_token_is_verified_again(self):
+        request = self.post()
+        turnstile.verify_turnstile(request)
+        turnstile.consume_turnstile(request)
+
+        result = turnstile.verify_turnstile(self.post(request.session.session_key))
+        self.assertFalse(result.get('cached', False))
+        self.assertEqual(self.session.post.call_count, 2)
+
+    def test_login_spends_token_on_every_attempt(self):
+        User.objects.create_user(username='rider', password='correct-horse')
+        rejected = mock.Mock(status_code=200)
+        rejected.json.return_value = {'success': False, 'error-codes': ['timeout-or-duplicate']}
+        self.session.post.side_effect = [self.session.post.return_value, rejected]
+        form = {'username': 'rider', 'password': 'wrong', 'cf-turnstile-response': 'token'}
+
+        response = self.client.post(reverse('authentication:login'), form)
+        self.assertContains(response, 'Invalid username or password')
+
+        # The same token is sent to Cloudflare again, which rejects it
+        response = self.client.post(reverse('authentication:login'), dict(form, password='correct-horse'))
+        self.assertContains(response, 'Security verification failed')
+        self.assertEqual(self.session.post.call_count, 2)
+        self.assertNotIn('pre_2fa_user_id', self.client.session)
@@ -1,24 +1,187 @@
+"""
+Cloudflare Turnstile verification.
+
+Tokens are checked against ``TURNSTILE_VERIFY_URL`` through one pooled
+``requests.Session`` per process, so logins and registrations reuse a
+kept-alive TLS connection instead of opening a new one each time.
+
+Cloudflare accepts a token only once. A token that verified successfully is
+remembered in the cache for ``TURNSTILE_TOKEN_CACHE_TIMEOUT`` seconds, tied
+to the connecting address (``REMOTE_ADDR``, which unlike X-Forwarded-For the
+client cannot choose) and the session key, so a form posted again with the
+same token after a validation error is not rejected as a duplicate. Once the
+form succeeds the views call ``consume_turnstile`` and the token is spent.
+
+Requests are bounded by ``TURNSTILE_CONNECT_TIMEOUT`` and
+``TURNSTILE_READ_TIMEOUT``. After ``TURNSTILE_FAILURE_THRESHOLD`` network
+failures in a row the verifier stops calling Cloudflare for
+``TURNSTILE_RECOVERY_TIMEOUT`` seconds and fails verification at once
+rather than holding a worker for every request. Verification always fails
+closed. Latency and outcome counters are kept per process, see ``stats``.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import deque
+
 import requests
 from django.conf import settings
-from decouple import config
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """The process-wide HTTP session used for siteverify calls"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.TURNSTILE_POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
+def reset_session():
+    """Close pooled connections, e.g. after changing TURNSTILE_VERIFY_URL"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+class CircuitBreaker:
+    """
+    Stop calling Cloudflare after repeated network failures.
+
+    Once ``TURNSTILE_FAILURE_THRESHOLD`` calls in a row have failed the breaker
+    opens and ``allow`` returns False for ``TURNSTILE_RECOVERY_TIMEOUT``
+    seconds. After that one
+    trial call is let through; it closes the breaker if it succeeds and opens
+    it again if it fails.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self.opened_at < settings.TURNSTILE_RECOVERY_TIMEOUT:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= settings.TURNSTILE_FAILURE_THRESHOLD:
+                if self.opened_at is None:
+                    logger.warning('Turnstile verification unavailable after %s failures', self.failures)
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+    def reset(self):
+        self.record_success()
+
+
+class VerificationStats:
+    """Per-process counters and recent siteverify latencies"""
+
+    def __init__(self, samples=1000):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=samples)
+        self.counts = {}
+
+    def record(self, outcome, latency=None):
+        with self._lock:
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+            if latency is not None:
+                self._latencies.append(latency * 1000)
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: Outcome counts and latency percentiles in milliseconds of
+            the most recent calls to Cloudflare
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            result = dict(self.counts)
+        if latencies:
+            result.update({
+                'calls': len(latencies),
+                'p50_ms': latencies[len(latencies) // 2],
+                'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                'max_ms': latencies[-1],
+            })
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._latencies.clear()
+            self.counts = {}
+
+
+breaker = CircuitBreaker()
+_stats = VerificationStats()
+
+
+def stats():
+    """Verification counters of this process, see VerificationStats.snapshot"""
+    result = _stats.snapshot()
+    result['circuit_open'] = breaker.is_open
+    return result
+
+
+def _cache_key(token, remote_addr, session_key):
+    digest = hashlib.sha256(f'{remote_addr or ""}:{session_key}:{token}'.encode()).hexdigest()
+    return f'turnstile:verified:{digest}'
 
 
 class TurnstileVerification:
     """Cloudflare Turnstile verification utility"""
-    
+
     def __init__(self):
-        self.secret_key = config('CLOUDFLARE_TURNSTILE_SECRET_KEY', default='')
-        self.site_key = config('CLOUDFLARE_TURNSTILE_SITE_KEY', default='')
-        self.verify_url = 'https://challenges.cloudflare.com/turnstile/v0/siteverify'
-    
-    def verify_token(self, token, ip_address=None):
+        self.secret_key = settings.CLOUDFLARE_TURNSTILE_SECRET_KEY
+        self.site_key = settings.CLOUDFLARE_TURNSTILE_SITE_KEY
+        self.verify_url = settings.TURNSTILE_VERIFY_URL
+
+    def verify_token(self, token, ip_address=None, session_key=None, remote_addr=None):
         """
         Verify Turnstile token with Cloudflare
-        
+
         Args:
             token (str): The Turnstile response token
-            ip_address (str, optional): User's IP address
-            
+            ip_address (str, optional): User's IP address, passed on to Cloudflare
+            session_key (str, optional): Session the token was posted in; a
+                verified token is only cached when this is given
+            remote_addr (str, optional): Address of the connection, which the
+                cached token is tied to along with the session
+
         Returns:
             dict: Verification result with success status and details
         """
@@ -35,65 +198,123 @@ class TurnstileVerification:
                     'success': False,
                     'error': 'Turnstile secret key not configured'
                 }
-        
+
         if not token:
             return {
                 'success': False,
                 'error': 'No Turnstile token provided'
             }
-        
+
+        key = _cache_key(token, remote_addr, session_key) if session_key else None
+        cached = cache.get(key) if key else None
+        if cached is not None:
+            _stats.record('cached')
+            return dict(cached, cached=True)
+
+        if not breaker.allow():
+            _stats.record('short_circuited')
+            return {
+                'success': False,
+                'error': 'Verification temporarily unavailable, please try again shortly'
+            }
+
         data = {
             'secret': self.secret_key,
             'response': token
         }
-        
+
         if ip_address:
             data['remoteip'] = ip_address
-        
+
+        started = time.perf_counter()
         try:
-            response = requests.post(self.verify_url, data=data, timeout=10)
+            response = get_session().post(
+                self.verify_url,
+                data=data,
+                timeout=(settings.TURNSTILE_CONNECT_TIMEOUT, settings.TURNSTILE_READ_TIMEOUT)
+            )
+            if response.status_code >= 500:
+                response.raise_for_status()
             result = response.json()
-            
-            return {
-                'success': result.get('success', False),
-                'error_codes': result.get('error-codes', []),
-                'challenge_ts': result.get('challenge_ts'),
-                'hostname': result.get('hostname'),
-                'action': result.get('action'),
-                'cdata': result.get('cdata')
-            }
-            
-        except requests.RequestException as e:
+        except (requests.RequestException, ValueError) as e:
+            latency = time.perf_counter() - started
+            breaker.record_failure()
+            _stats.record('error', latency)
+            logger.warning('Turnstile verification failed after %.0f ms: %s', latency * 1000, e)
             return {
                 'success': False,
                 'error': f'Network error during verification: {str(e)}'
             }
-        except Exception as e:
-            return {
-                'success': False,
-                'error': f'Verification error: {str(e)}'
-            }
 
+        latency = time.perf_counter() - started
+        breaker.record_success()
+        verification = {
+            'success': result.get('success', False),
+            'error_codes': result.get('error-codes', []),
+            'challenge_ts': result.get('challenge_ts'),
+            'hostname': result.get('hostname'),
+            'action': result.get('action'),
+            'cdata': result.get('cdata')
+        }
+        _stats.record('success' if verification['success'] else 'rejected', latency)
+        if verification['success'] and key:
+            cache.set(key, verification, settings.TURNSTILE_TOKEN_CACHE_TIMEOUT)
+        return verification
 
-def verify_turnstile(request):
+
+def verify_turnstile(request, reuse=True):
     """
     Helper function to verify Turnstile token from request
-    
+
     Args:
         request: Django request object
-        
+        reuse (bool): Cache a verified token so the same form can be posted
+            again after a validation error. Pass False for forms that must
+            spend the token on every attempt, such as login.
+
     Returns:
         dict: Verification result
     """
     verifier = TurnstileVerification()
-    token = request.POST.get('cf-turnstile-response') or request.GET.get('cf-turnstile-response')
+    token = _request_token(request)
     ip_address = get_client_ip(request)
-    
-    return verifier.verify_token(token, ip_address)
+    session_key = _session_key(request) if reuse else None
+
+    return verifier.verify_token(token, ip_address, session_key, request.META.get('REMOTE_ADDR'))
+
+
+def consume_turnstile(request):
+    """
+    Forget the token verified for this request once the form it protects has
+    succeeded, so it cannot be posted again. Call before ``login``, which
+    changes the session key.
+    """
+    token = _request_token(request)
+    session_key = request.session.session_key
+    if token and session_key:
+        cache.delete(_cache_key(token, request.META.get('REMOTE_ADDR'), session_key))
+
+
+def _request_token(request):
+    return request.POST.get('cf-turnstile-response') or request.GET.get('cf-turnstile-response')
+
+
+def _session_key(request):
+    session = request.session
+    if session.session_key is None:
+        session.save()
+        # Send the new session cookie, so the form posted again matches the cached token
+        session.modified = True
+    return session.session_key
 
 
 def get_client_ip(request):
-    """Get client IP address from request"""
+    """
+    Get client IP address from request.
+
+    X-Forwarded-For is set by the client unless a proxy overwrites it, so
+    only use this where a spoofed address does no harm.
+    """
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
     if x_forwarded_for:
         ip = x_forwarded_for.split(',')[0]
@@ -104,4 +325,4 @@ def get_client_ip(request):
 
 def get_turnstile_site_key():
     """Get Turnstile site key for templates"""
-    return config('CLOUDFLARE_TURNSTILE_SITE_KEY', default='')
+    return settings.CLOUDFLARE_TURNSTILE_SITE_KEY
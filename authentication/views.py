@@ -24,8 +24,9 @@ import json
 def custom_login(request):
     """Custom login view with 2FA support, email verification, and Turnstile protection"""
     if request.method == 'POST':
-        # Verify Turnstile first
-        turnstile_result = verify_turnstile(request)
+        # Verify Turnstile first; every attempt needs a fresh token, so a
+        # verified token cannot be reused to try more passwords
+        turnstile_result = verify_turnstile(request, reuse=False)
         if not turnstile_result['success']:
             if not turnstile_result.get('sandbox'):
                 messages.error(request, 'Security verification failed. Please try again.')
@@ -2,6 +2,8 @@
 ASGI config for bodaboda_welfare project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests are served by Django; WebSocket connections are handed to the
+group chat sockets in ``social.consumers``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +15,12 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bodaboda_welfare.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from social.consumers import websocket_application  # noqa: E402 (needs the app registry)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        return await websocket_application(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -0,0 +1,61 @@
+"""
+Helpers shared by the benchmark management commands.
+
+Benchmarks build their own throwaway data with the factories in
+``bodaboda_welfare.testing``, inside a transaction that is rolled back at
+the end, so they can be run against a development database without leaving
+rows behind.
+"""
+
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+
+class Rollback(Exception):
+    """Raised to unwind the benchmark transaction"""
+
+
+@contextmanager
+def rolled_back():
+    """Run the enclosed block in a transaction that is always rolled back"""
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def timed(func, repeat=1):
+    """
+    Call ``func`` ``repeat`` times.
+
+    Returns:
+        dict: Latency percentiles in milliseconds and the queries per call
+    """
+    samples = []
+    with CaptureQueriesContext(connection) as queries:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'calls': repeat,
+        'queries': len(queries) / repeat,
+        'mean_ms': statistics.fmean(samples),
+        'p50_ms': samples[len(samples) // 2],
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        'total_ms': sum(samples),
+    }
+
+
+def format_timing(label, result):
+    return (
+        f"{label}: {result['calls']} calls, {result['queries']:.1f} queries/call, "
+        f"mean {result['mean_ms']:.2f} ms, p50 {result['p50_ms']:.2f} ms, p95 {result['p95_ms']:.2f} ms"
+    )
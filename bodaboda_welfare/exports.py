@@ -0,0 +1,257 @@
+"""
+Streaming exports of members, contributions, loans and wallet transactions.
+
+Rows are read with ``values_list(...).iterator(chunk_size=...)``, so only one
+chunk of plain tuples is in memory at a time however large the table is, and
+written out as they arrive: CSV straight into the response, Excel through an
+``openpyxl`` write-only workbook backed by a temporary file.
+
+Every export can be limited to a date range (on the export's date column,
+both ends inclusive) and to one stage.
+"""
+
+import csv
+import re
+import tempfile
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+# Characters that make a spreadsheet read a cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+# Signed numbers such as +254712345678 or -20.50 are left as they are
+PLAIN_NUMBER = re.compile(r'[+-]?[0-9]+(\.[0-9]+)?')
+
+
+def _chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+class Echo:
+    """File-like object that hands back what is written, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def _cell(value, text=True):
+    """
+    A value ready for a CSV file (``text``) or an Excel cell, with
+    spreadsheet formulas defused. Excel keeps numbers and dates typed.
+    """
+    if value is None:
+        return '' if text else None
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.make_naive(value)
+        return value.strftime('%Y-%m-%d %H:%M:%S') if text else value
+    if not isinstance(value, str):
+        return str(value) if text else value
+    if value.startswith(FORMULA_PREFIXES) and not PLAIN_NUMBER.fullmatch(value):
+        return "'" + value
+    return value
+
+
+class Export:
+    """
+    One exportable table.
+
+    Args:
+        name: Name used in URLs and on the command line
+        model: Model exported
+        columns: ``(header, lookup)`` pairs passed to ``values_list``
+        date_field: Datetime field the date range filters on
+        stage_field: Lookup of the member's stage id
+        choices: Lookups whose stored values are shown with their labels
+    """
+
+    def __init__(self, name, model, columns, date_field, stage_field, choices=()):
+        self.name = name
+        self.model = model
+        self.columns = columns
+        self.date_field = date_field
+        self.stage_field = stage_field
+        self.choices = choices
+
+    @property
+    def headers(self):
+        return [header for header, _ in self.columns]
+
+    def queryset(self, date_from=None, date_to=None, stage_id=None):
+        queryset = self.model.objects.all()
+        if date_from:
+            start = timezone.make_aware(datetime.combine(date_from, time.min))
+            queryset = queryset.filter(**{f'{self.date_field}__gte': start})
+        if date_to:
+            end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+            queryset = queryset.filter(**{f'{self.date_field}__lt': end})
+        if stage_id:
+            queryset = queryset.filter(**{self.stage_field: stage_id})
+        return queryset.order_by('pk').values_list(*(lookup for _, lookup in self.columns))
+
+    def rows(self, text=True, **filters):
+        """Yield each row as a list of cells, see ``_cell``"""
+        labels = {}
+        for index, (_, lookup) in enumerate(self.columns):
+            if lookup in self.choices:
+                field = self.model._meta.get_field(lookup)
+                labels[index] = dict(field.flatchoices)
+        for values in self.queryset(**filters).iterator(chunk_size=_chunk_size()):
+            yield [
+                _cell(labels[index].get(value, value) if index in labels else value, text)
+                for index, value in enumerate(values)
+            ]
+
+    def iter_csv(self, **filters):
+        """Yield CSV lines, starting with the header"""
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.headers)
+        for row in self.rows(**filters):
+            yield writer.writerow(row)
+
+    def write_csv(self, fileobj, **filters):
+        """
+        Returns:
+            int: Number of rows written
+        """
+        writer = csv.writer(fileobj)
+        writer.writerow(self.headers)
+        count = 0
+        for row in self.rows(**filters):
+            writer.writerow(row)
+            count += 1
+        return count
+
+    def write_xlsx(self, fileobj, **filters):
+        """
+        Write an Excel workbook without holding its rows in memory.
+
+        Returns:
+            int: Number of rows written
+        """
+        try:
+            import openpyxl
+        except ImportError:
+            raise ImproperlyConfigured('Excel exports require the openpyxl package (pip install openpyxl)')
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet(self.name)
+        sheet.append(self.headers)
+        count = 0
+        for row in self.rows(text=False, **filters):
+            sheet.append(row)
+            count += 1
+        workbook.save(fileobj)
+        return count
+
+    def xlsx_file(self, **filters):
+        """The workbook in a temporary file, rewound for reading"""
+        fileobj = tempfile.TemporaryFile()
+        self.write_xlsx(fileobj, **filters)
+        fileobj.seek(0)
+        return fileobj
+
+
+def _exports():
+    from contributions.models import Contribution
+    from loans.models import Loan
+    from members.models import Member
+    from payments.models import WalletTransaction
+
+    return [
+        Export(
+            'members', Member,
+            [
+                ('Member number', 'member_number'),
+                ('First name', 'user__first_name'),
+                ('Last name', 'user__last_name'),
+                ('National ID', 'national_id'),
+                ('Phone number', 'phone_number'),
+                ('Stage', 'stage__name'),
+                ('Zone', 'zone'),
+                ('SACCO', 'sacco'),
+                ('Status', 'status'),
+                ('Date of birth', 'date_of_birth'),
+                ('Next of kin', 'next_of_kin_name'),
+                ('Next of kin relationship', 'next_of_kin_relationship'),
+                ('Next of kin phone', 'next_of_kin_phone'),
+                ('Dependents', 'dependents_count'),
+                ('Joined', 'created_at'),
+            ],
+            date_field='created_at', stage_field='stage_id', choices=('status',)
+        ),
+        Export(
+            'contributions', Contribution,
+            [
+                ('Transaction ID', 'transaction_id'),
+                ('Member number', 'member__member_number'),
+                ('First name', 'member__user__first_name'),
+                ('Last name', 'member__user__last_name'),
+                ('Stage', 'member__stage__name'),
+                ('Type', 'contribution_type'),
+                ('Amount', 'amount'),
+                ('Payment method', 'payment_method'),
+                ('M-Pesa code', 'mpesa_code'),
+                ('Status', 'status'),
+                ('Payment date', 'payment_date'),
+                ('Due date', 'due_date'),
+            ],
+            date_field='payment_date', stage_field='member__stage_id',
+            choices=('contribution_type', 'payment_method', 'status')
+        ),
+        Export(
+            'loans', Loan,
+            [
+                ('Loan number', 'loan_number'),
+                ('Member number', 'member__member_number'),
+                ('First name', 'member__user__first_name'),
+                ('Last name', 'member__user__last_name'),
+                ('Stage', 'member__stage__name'),
+                ('Type', 'loan_type'),
+                ('Status', 'status'),
+                ('Requested', 'requested_amount'),
+                ('Approved', 'approved_amount'),
+                ('Disbursed', 'disbursed_amount'),
+                ('Interest rate %', 'interest_rate'),
+                ('Term (months)', 'loan_term_months'),
+                ('Total repaid', 'total_repaid'),
+                ('Balance', 'balance_remaining'),
+                ('Applied', 'application_date'),
+                ('Disbursed on', 'disbursement_date'),
+            ],
+            date_field='application_date', stage_field='member__stage_id', choices=('loan_type', 'status')
+        ),
+        Export(
+            'wallet-transactions', WalletTransaction,
+            [
+                ('Transaction ID', 'transaction_id'),
+                ('Wallet', 'wallet__wallet_id'),
+                ('Member number', 'wallet__member__member_number'),
+                ('Stage', 'wallet__member__stage__name'),
+                ('Type', 'transaction_type'),
+                ('Amount', 'amount'),
+                ('Fee', 'fee'),
+                ('Status', 'status'),
+                ('Reference', 'reference'),
+                ('Counterparty wallet', 'related_wallet__wallet_id'),
+                ('Balance before', 'balance_before'),
+                ('Balance after', 'balance_after'),
+                ('Created', 'created_at'),
+                ('Processed', 'processed_at'),
+            ],
+            date_field='created_at', stage_field='wallet__member__stage_id', choices=('transaction_type', 'status')
+        ),
+    ]
+
+
+def get_export(name):
+    """The export called ``name``, or None"""
+    for export in _exports():
+        if export.name == name:
+            return export
+    return None
+
+
+def export_names():
+    return [export.name for export in _exports()]
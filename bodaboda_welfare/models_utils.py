@@ -0,0 +1,18 @@
+"""
+Model helpers shared between apps.
+"""
+
+
+def counter_safe_save_kwargs(instance, kwargs, counters=('member_count',)):
+    """
+    Keep ``save()`` on an existing row from overwriting its counter fields.
+
+    The counters are maintained with F() updates, so the values held by an
+    instance loaded earlier may be stale.
+    """
+    if not instance._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+        kwargs['update_fields'] = [
+            field.name for field in instance._meta.concrete_fields
+            if not field.primary_key and field.name not in counters
+        ]
+    return kwargs
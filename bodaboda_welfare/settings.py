@@ -74,6 +74,7 @@ INSTALLED_APPS = [
     'safety',
     'payments',
     'financial',
+    'renditions',
 ]
 
 MIDDLEWARE = [
@@ -372,3 +373,103 @@ CACHES = {
         }
     }
 }
+
+# Presence tracking
+# Heartbeats are coalesced in memory and flushed to the Member table at most
+# once per PRESENCE_FLUSH_INTERVAL seconds.
+PRESENCE_ONLINE_TIMEOUT = get_config('PRESENCE_ONLINE_TIMEOUT', default=300, cast=int)
+PRESENCE_FLUSH_INTERVAL = get_config('PRESENCE_FLUSH_INTERVAL', default=60, cast=int)
+
+# Payments dashboards are cached per member and dropped whenever one of the
+# member's transactions, tokens or payment methods changes.
+PAYMENTS_SUMMARY_CACHE_TIMEOUT = get_config('PAYMENTS_SUMMARY_CACHE_TIMEOUT', default=300, cast=int)
+
+# Social feed timelines
+# New posts are fanned out to the author's friends and stage members. Stages
+# with more active members than SOCIAL_FANOUT_STAGE_LIMIT are read at feed
+# time instead. SOCIAL_TIMELINE_BACKFILL posts are copied into a timeline when
+# a member joins a stage or makes a new friend.
+SOCIAL_FANOUT_STAGE_LIMIT = get_config('SOCIAL_FANOUT_STAGE_LIMIT', default=500, cast=int)
+SOCIAL_TIMELINE_BACKFILL = get_config('SOCIAL_TIMELINE_BACKFILL', default=200, cast=int)
+# Seconds a member's cached friend and connection sets live; they are also
+# dropped whenever one of the member's friendships changes. That only reaches
+# other workers through a shared cache (Redis, Memcached, database), so with
+# the per-process LocMemCache the shorter local timeout applies.
+SOCIAL_FRIENDS_CACHE_TIMEOUT = get_config('SOCIAL_FRIENDS_CACHE_TIMEOUT', default=3600, cast=int)
+SOCIAL_FRIENDS_LOCAL_CACHE_TIMEOUT = get_config('SOCIAL_FRIENDS_LOCAL_CACHE_TIMEOUT', default=30, cast=int)
+# Social notifications are queued and delivered by `manage.py process_notifications`;
+# jobs that keep failing are retried with backoff up to this many times.
+SOCIAL_NOTIFICATION_MAX_ATTEMPTS = get_config('SOCIAL_NOTIFICATION_MAX_ATTEMPTS', default=5, cast=int)
+
+# Member search
+# Members are indexed with SQLite FTS5 or PostgreSQL full-text search;
+# `manage.py reindex_members` rebuilds the index after bulk changes.
+MEMBER_SEARCH_LIMIT = get_config('MEMBER_SEARCH_LIMIT', default=50, cast=int)
+
+# Member numbers
+# Numbers are PREFIX plus a zero-padded sequence value, e.g. KWS000123. Each
+# process reserves MEMBER_NUMBER_BLOCK_SIZE values at a time. With the
+# 'organization' scope every organization numbers its members separately
+# and its id is included, e.g. KWS7-000042.
+MEMBER_NUMBER_PREFIX = get_config('MEMBER_NUMBER_PREFIX', default='KWS')
+MEMBER_NUMBER_DIGITS = get_config('MEMBER_NUMBER_DIGITS', default=6, cast=int)
+MEMBER_NUMBER_BLOCK_SIZE = get_config('MEMBER_NUMBER_BLOCK_SIZE', default=20, cast=int)
+MEMBER_NUMBER_SCOPE = get_config('MEMBER_NUMBER_SCOPE', default='global')
+
+# Exports
+# /exports/<name>/ and `manage.py export_data` read rows in chunks of this size
+EXPORT_CHUNK_SIZE = get_config('EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+# Real-time chat
+# Broker carrying chat events to open sockets: social.broker.InMemoryBroker
+# (single process) or social.broker.RedisBroker with CHAT_BROKER_URL set to a
+# redis:// URL when running several ASGI workers.
+CHAT_BROKER = get_config('CHAT_BROKER', default='social.broker.InMemoryBroker')
+CHAT_BROKER_URL = get_config('CHAT_BROKER_URL', default='')
+# Messages per chat history window; older messages load as the member scrolls
+CHAT_HISTORY_PAGE_SIZE = get_config('CHAT_HISTORY_PAGE_SIZE', default=50, cast=int)
+
+# Image renditions
+# Uploaded photos are rendered by `manage.py process_renditions` into WebP and
+# JPEG copies no larger than these many pixels on the longest edge.
+MEDIA_RENDITION_SIZES = {'thumb': 160, 'feed': 720, 'full': 1600}
+MEDIA_RENDITION_QUALITY = get_config('MEDIA_RENDITION_QUALITY', default=80, cast=int)
+MEDIA_RENDITION_MAX_ATTEMPTS = get_config('MEDIA_RENDITION_MAX_ATTEMPTS', default=3, cast=int)
+# Shown until an upload's renditions are ready, since the original may still
+# carry EXIF metadata such as the GPS position. Defaults to a transparent pixel.
+MEDIA_RENDITION_PLACEHOLDER = get_config(
+    'MEDIA_RENDITION_PLACEHOLDER', default='data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7'
+)
+
+# Stage map
+# map.geojson responses are cached per bounding box and zoom level until a
+# stage is added, edited or removed, and for at most STAGES_MAP_CACHE_TIMEOUT
+# seconds, which also bounds how stale the member counts on the map can be.
+# Below STAGES_MAP_CLUSTER_ZOOM nearby stages are returned as clusters instead
+# of individual points.
+STAGES_MAP_CACHE_TIMEOUT = get_config('STAGES_MAP_CACHE_TIMEOUT', default=300, cast=int)
+STAGES_MAP_CLUSTER_ZOOM = get_config('STAGES_MAP_CLUSTER_ZOOM', default=11, cast=int)
+# Furthest a nearby-stage lookup searches, in kilometres
+STAGES_NEARBY_MAX_RADIUS_KM = get_config('STAGES_NEARBY_MAX_RADIUS_KM', default=50, cast=float)
+# A new stage named during profile setup within this many kilometres of an
+# existing stage is taken to be that stage
+STAGES_MATCH_RADIUS_KM = get_config('STAGES_MATCH_RADIUS_KM', default=0.1, cast=float)
+
+# Cloudflare Turnstile
+# Tokens are verified through a pooled keep-alive session with bounded
+# timeouts (seconds). After TURNSTILE_FAILURE_THRESHOLD network failures in a
+# row verification fails fast for TURNSTILE_RECOVERY_TIMEOUT seconds. Tokens
+# that verified are remembered per connecting address and session for
+# TURNSTILE_TOKEN_CACHE_TIMEOUT seconds, until the form they protect succeeds;
+# Cloudflare rejects a token it has already seen.
+CLOUDFLARE_TURNSTILE_SITE_KEY = get_config('CLOUDFLARE_TURNSTILE_SITE_KEY', default='')
+CLOUDFLARE_TURNSTILE_SECRET_KEY = get_config('CLOUDFLARE_TURNSTILE_SECRET_KEY', default='')
+TURNSTILE_VERIFY_URL = get_config(
+    'TURNSTILE_VERIFY_URL', default='https://challenges.cloudflare.com/turnstile/v0/siteverify'
+)
+TURNSTILE_CONNECT_TIMEOUT = get_config('TURNSTILE_CONNECT_TIMEOUT', default=2, cast=float)
+TURNSTILE_READ_TIMEOUT = get_config('TURNSTILE_READ_TIMEOUT', default=3, cast=float)
+TURNSTILE_POOL_SIZE = get_config('TURNSTILE_POOL_SIZE', default=10, cast=int)
+TURNSTILE_FAILURE_THRESHOLD = get_config('TURNSTILE_FAILURE_THRESHOLD', default=5, cast=int)
+TURNSTILE_RECOVERY_TIMEOUT = get_config('TURNSTILE_RECOVERY_TIMEOUT', default=30, cast=int)
+TURNSTILE_TOKEN_CACHE_TIMEOUT = get_config('TURNSTILE_TOKEN_CACHE_TIMEOUT', default=120, cast=int)
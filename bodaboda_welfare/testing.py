@@ -0,0 +1,105 @@
+"""
+Data factories shared by the test suites and the benchmark commands.
+
+``make_stage`` and ``create_member`` go through the ORM, so signals keep
+counters, chats and the search index current. ``make_members`` bulk creates
+rows for speed and bypasses them.
+"""
+
+import uuid
+from datetime import date
+
+from django.contrib.auth.models import User
+
+
+def make_stage(name=None, organization=None):
+    """Create a stage, with a new organization unless one is given"""
+    from stages.models import Organization, Stage
+
+    suffix = uuid.uuid4().hex[:8]
+    if organization is None:
+        admin_user = User.objects.create(username=f'bench_admin_{suffix}')
+        organization = Organization.objects.create(
+            name=f'Benchmark Org {suffix}',
+            organization_type='sacco',
+            registration_number=f'BENCH-{suffix}',
+            phone_number='+254700000000',
+            email='bench@example.com',
+            county='nairobi',
+            sub_county='Benchmark',
+            town='nairobi',
+            address='Benchmark',
+            admin_user=admin_user
+        )
+    return Stage.objects.create(
+        name=name or f'Benchmark Stage {suffix}',
+        organization=organization,
+        location='Benchmark',
+        county='nairobi',
+        sub_county='Benchmark',
+        ward='Benchmark',
+        registration_date=date.today()
+    )
+
+
+def create_member(stage, **kwargs):
+    """Create a user and member at a stage through ``save()``, so signals run"""
+    from members.models import Member
+
+    suffix = uuid.uuid4().hex[:8]
+    fields = {
+        'user': User.objects.create(username=f'rider_{suffix}'),
+        'national_id': suffix,
+        'phone_number': '+254700000000',
+        'stage': stage,
+        'zone': 'Zone',
+        'next_of_kin_name': 'Kin',
+        'next_of_kin_relationship': 'Sibling',
+        'next_of_kin_phone': '+254700000001',
+        'next_of_kin_id': '12345678',
+        'date_of_birth': date(1990, 1, 1),
+        'address': 'Address',
+        'member_number': f'T{suffix}',
+    }
+    fields.update(kwargs)
+    return Member.objects.create(**fields)
+
+
+def make_members(count, stage=None):
+    """
+    Bulk create ``count`` users and members at a stage.
+
+    Signals are bypassed, so derived data (counters, chat membership) is not
+    maintained for these rows.
+    """
+    from members.models import Member
+
+    stage = stage or make_stage()
+    suffix = uuid.uuid4().hex[:6]
+    users = User.objects.bulk_create([
+        User(username=f'bench_{suffix}_{i}', first_name=f'Rider{i}', last_name=suffix)
+        for i in range(count)
+    ], batch_size=1000)
+    if users and users[0].pk is None:
+        users = list(User.objects.filter(username__startswith=f'bench_{suffix}_').order_by('id'))
+
+    members = Member.objects.bulk_create([
+        Member(
+            user=user,
+            national_id=f'B{suffix}{i:07d}'[:20],
+            phone_number=f'+2547{i:08d}',
+            stage=stage,
+            zone='Benchmark',
+            next_of_kin_name='Benchmark',
+            next_of_kin_relationship='Benchmark',
+            next_of_kin_phone='+254700000000',
+            next_of_kin_id='00000000',
+            date_of_birth=date(1990, 1, 1),
+            address='Benchmark',
+            member_number=f'BN{suffix}{i:07d}'[:20]
+        )
+        for i, user in enumerate(users)
+    ], batch_size=1000)
+    if members and members[0].pk is None:
+        members = list(Member.objects.filter(user__in=users).order_by('id'))
+    return members
@@ -0,0 +1,34 @@
+import csv
+import io
+
+from django.test import SimpleTestCase, TestCase
+
+from bodaboda_welfare.testing import create_member, make_stage
+from bodaboda_welfare.exports import _cell, get_export
+
+
+class CellEscapingTests(SimpleTestCase):
+    def test_formulas_are_defused(self):
+        for value in (
+            '=1+1', '@SUM(A1)', '\t=1', '\r=1', '-', '+',
+            "+1+cmd|' /C calc'!A0", "-2+3+cmd|' /C calc'!A0", '+1e3', '-1-1',
+        ):
+            self.assertEqual(_cell(value), "'" + value, value)
+            self.assertEqual(_cell(value, text=False), "'" + value, value)
+
+    def test_plain_values_are_kept(self):
+        for value in ('+254712345678', '-20.50', '42', 'Juma', 'a=b', ''):
+            self.assertEqual(_cell(value), value, value)
+
+
+class ExportTests(TestCase):
+    def test_member_csv_escapes_names(self):
+        member = create_member(make_stage(), phone_number='+254712345678')
+        member.user.first_name = "-2+3+cmd|' /C calc'!A0"
+        member.user.save()
+
+        output = io.StringIO()
+        self.assertEqual(get_export('members').write_csv(output), 1)
+        row, = csv.DictReader(io.StringIO(output.getvalue()))
+        self.assertEqual(row['First name'], "'-2+3+cmd|' /C calc'!A0")
+        self.assertEqual(row['Phone number'], '+254712345678')
@@ -49,6 +49,7 @@ urlpatterns = [
     path('analytics/', views.analytics, name='analytics'),
     path('settings/', views.settings, name='settings'),
     path('profile-settings/', views.profile_settings, name='profile_settings'),
+    path('exports/<slug:name>/', views.export_data, name='export_data'),
     
     # API URLs
     path('api/', include('rest_framework.urls')),
@@ -3,12 +3,19 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import ImproperlyConfigured
 from django.db.models import Sum, Count
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_GET
 from members.models import Member
 from contributions.models import Contribution, WelfareAccount
 from emergency.models import EmergencyCase
 from accidents.models import AccidentReport
 from loans.models import Loan, LoanKitty
+from .exports import get_export
 
 def home(request):
     """
@@ -128,9 +135,7 @@ def dashboard(request):
         'recent_accidents': AccidentReport.objects.order_by('-created_at')[:3],
         
         # Member specific data
-        'member_contributions': Contribution.objects.filter(member=member, status='completed').aggregate(
-            total=Sum('amount')
-        )['total'] if member else 0,
+        'member_contributions': member.total_contributions() if member else 0,
         'member_loans': Loan.objects.filter(member=member).order_by('-application_date')[:3] if member else [],
     }
     
@@ -167,7 +172,7 @@ def register(request):
     """
     if request.method == 'POST':
         # Verify Turnstile first
-        from authentication.turnstile import verify_turnstile, get_turnstile_site_key
+        from authentication.turnstile import consume_turnstile, verify_turnstile, get_turnstile_site_key
         turnstile_result = verify_turnstile(request)
         if not turnstile_result['success']:
             if not turnstile_result.get('sandbox'):
@@ -204,6 +209,7 @@ def register(request):
             last_name=last_name,
             is_active=False  # Account inactive until email verification
         )
+        consume_turnstile(request)
         
         # Send verification email
         from authentication.models import EmailVerification
@@ -328,3 +334,44 @@ def profile_settings(request):
         return redirect('profile_settings')
     
     return render(request, 'profile_settings.html')
+
+def _export_filters(params):
+    """Date range and stage filters of an export request, see bodaboda_welfare.exports"""
+    filters = {}
+    for param, key in (('from', 'date_from'), ('to', 'date_to')):
+        if params.get(param):
+            filters[key] = parse_date(params[param])
+            if filters[key] is None:
+                raise ValueError(f'{param} must be a date (YYYY-MM-DD)')
+    if params.get('stage'):
+        if not params['stage'].isdigit():
+            raise ValueError('stage must be a stage id')
+        filters['stage_id'] = int(params['stage'])
+    return filters
+
+@staff_member_required
+@require_GET
+def export_data(request, name):
+    """
+    Stream an export as CSV, or as an Excel workbook with ``?format=xlsx``.
+    Filtered with ``?from=``, ``?to=`` (YYYY-MM-DD) and ``?stage=``.
+    """
+    export = get_export(name)
+    if export is None:
+        raise Http404('Unknown export')
+    try:
+        filters = _export_filters(request.GET)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    filename = f"{name}-{timezone.localdate():%Y%m%d}"
+    if request.GET.get('format') == 'xlsx':
+        try:
+            workbook = export.xlsx_file(**filters)
+        except ImproperlyConfigured as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        return FileResponse(workbook, as_attachment=True, filename=f'{filename}.xlsx')
+
+    response = StreamingHttpResponse(export.iter_csv(**filters), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ContributionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'contributions'
+
+    def ready(self):
+        """Import signals when app is ready."""
+        import contributions.signals
@@ -0,0 +1,168 @@
+"""
+Running balances for the append-only fund ledgers.
+
+``WelfareAccount`` and ``LoanKitty`` rows are credits or debits against a
+fund. Each new row stores the fund balance after it was applied
+(``balance_after``), and ``LedgerBalance`` holds the current balance of each
+ledger, so reading it is a single lookup. ``LedgerCheckpoint`` rows record
+the balance at a point in time; balances for earlier dates are the nearest
+checkpoint plus the entries written after it.
+
+Ledger rows are treated as immutable. Editing or deleting them afterwards
+shows up as drift in ``verify_ledger``, which the ``verify_ledgers``
+command can also repair.
+"""
+
+from decimal import Decimal
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Sum, When
+from django.utils import timezone
+
+LEDGERS = {
+    'welfare': 'contributions.WelfareAccount',
+    'loan_kitty': 'loans.LoanKitty',
+}
+
+
+def ledger_model(ledger):
+    return apps.get_model(LEDGERS[ledger])
+
+
+def signed_amount():
+    """Expression for an entry's effect on the balance: credits add, debits subtract"""
+    return Case(
+        When(is_credit=True, then=F('amount')),
+        default=-F('amount'),
+        output_field=DecimalField(max_digits=14, decimal_places=2)
+    )
+
+
+def entry_delta(entry):
+    amount = Decimal(str(entry.amount))
+    return amount if entry.is_credit else -amount
+
+
+def save_entry(entry, save):
+    """
+    Save a new ledger entry and advance its ledger's running balance.
+
+    The ``LedgerBalance`` row is locked for the duration of the insert so
+    that concurrent postings are applied one after another.
+    """
+    from .models import LedgerBalance
+
+    if not entry._state.adding:
+        save()
+        return
+
+    with transaction.atomic():
+        head, _ = LedgerBalance.objects.select_for_update().get_or_create(ledger=entry.LEDGER)
+        entry.balance_after = head.balance + entry_delta(entry)
+        save()
+        head.balance = entry.balance_after
+        head.last_entry_id = entry.pk
+        head.save(update_fields=['balance', 'last_entry_id', 'updated_at'])
+
+
+def current_balance(ledger):
+    """Current balance of a ledger"""
+    from .models import LedgerBalance
+
+    balance = LedgerBalance.objects.filter(ledger=ledger).values_list('balance', flat=True).first()
+    return balance if balance is not None else Decimal('0')
+
+
+def balance_at(ledger, when):
+    """
+    Balance of a ledger at a point in time.
+
+    Starts from the latest checkpoint taken at or before ``when`` and adds
+    the entries written after it, so only a bounded range is summed.
+    """
+    from .models import LedgerCheckpoint
+
+    checkpoint = LedgerCheckpoint.objects.filter(ledger=ledger, as_of__lte=when).order_by('-as_of').first()
+    entries = ledger_model(ledger).objects.filter(created_at__lte=when)
+    balance = Decimal('0')
+    if checkpoint:
+        entries = entries.filter(id__gt=checkpoint.last_entry_id)
+        balance = checkpoint.balance
+
+    delta = entries.aggregate(total=Sum(signed_amount()))['total']
+    return balance + (delta or Decimal('0'))
+
+
+def create_checkpoint(ledger):
+    """Record the current balance of a ledger as a checkpoint"""
+    from .models import LedgerBalance, LedgerCheckpoint
+
+    with transaction.atomic():
+        head, _ = LedgerBalance.objects.select_for_update().get_or_create(ledger=ledger)
+        return LedgerCheckpoint.objects.create(
+            ledger=ledger,
+            as_of=timezone.now(),
+            last_entry_id=head.last_entry_id,
+            balance=head.balance
+        )
+
+
+def verify_ledger(ledger, repair=False):
+    """
+    Replay a ledger from its first entry and compare the stored balances.
+
+    Args:
+        ledger (str): Ledger name, one of ``LEDGERS``
+        repair (bool): Rewrite drifted ``balance_after`` values and the
+            current balance with the replayed figures
+
+    Returns:
+        list: Human readable descriptions of every mismatch found
+    """
+    from .models import LedgerBalance, LedgerCheckpoint
+
+    model = ledger_model(ledger)
+    checkpoints = list(LedgerCheckpoint.objects.filter(ledger=ledger))
+    checkpoint_entry_ids = {checkpoint.last_entry_id for checkpoint in checkpoints}
+    problems = []
+    drifted = []
+    balance = Decimal('0')
+    last_entry_id = 0
+    replayed = {0: balance}
+
+    entries = model.objects.order_by('id').only('id', 'amount', 'is_credit', 'balance_after')
+    for entry in entries.iterator(chunk_size=2000):
+        balance += entry_delta(entry)
+        last_entry_id = entry.id
+        if entry.id in checkpoint_entry_ids:
+            replayed[entry.id] = balance
+        if entry.balance_after != balance:
+            problems.append(f'{ledger} entry #{entry.id}: stored {entry.balance_after}, replayed {balance}')
+            entry.balance_after = balance
+            drifted.append(entry)
+
+    head = LedgerBalance.objects.filter(ledger=ledger).first()
+    if head is None or head.balance != balance:
+        problems.append(f'{ledger} current balance: stored {head.balance if head else None}, replayed {balance}')
+
+    drifted_checkpoints = []
+    for checkpoint in checkpoints:
+        expected = replayed.get(checkpoint.last_entry_id)
+        if expected is not None and checkpoint.balance != expected:
+            problems.append(
+                f'{ledger} checkpoint {checkpoint.as_of:%Y-%m-%d %H:%M}: stored {checkpoint.balance}, replayed {expected}'
+            )
+            checkpoint.balance = expected
+            drifted_checkpoints.append(checkpoint)
+
+    if repair and problems:
+        with transaction.atomic():
+            model.objects.bulk_update(drifted, ['balance_after'], batch_size=1000)
+            LedgerBalance.objects.update_or_create(
+                ledger=ledger,
+                defaults={'balance': balance, 'last_entry_id': last_entry_id}
+            )
+            LedgerCheckpoint.objects.bulk_update(drifted_checkpoints, ['balance'])
+
+    return problems
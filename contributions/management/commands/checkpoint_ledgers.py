@@ -0,0 +1,30 @@
+"""
+Management command to record balance checkpoints for the fund ledgers.
+Run this periodically (e.g., nightly or at month end) via cron job.
+"""
+
+from django.core.management.base import BaseCommand
+from contributions.ledger import LEDGERS, create_checkpoint
+
+
+class Command(BaseCommand):
+    help = 'Record the current balance of the welfare account and loan kitty as checkpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ledger',
+            choices=sorted(LEDGERS),
+            help='Only checkpoint this ledger (default: all ledgers)'
+        )
+
+    def handle(self, *args, **options):
+        ledgers = [options['ledger']] if options['ledger'] else sorted(LEDGERS)
+        
+        for ledger in ledgers:
+            checkpoint = create_checkpoint(ledger)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'{ledger}: KSh {checkpoint.balance} as of {checkpoint.as_of:%Y-%m-%d %H:%M} '
+                    f'(entry #{checkpoint.last_entry_id})'
+                )
+            )
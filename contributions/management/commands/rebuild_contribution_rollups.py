@@ -0,0 +1,37 @@
+"""
+Management command to rebuild or verify the monthly contribution rollups.
+"""
+
+from django.core.management.base import BaseCommand
+from contributions.rollups import check_contribution_rollups, rebuild_contribution_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the monthly member and stage contribution rollups from completed contributions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report rollups that differ from the Contribution table, without changing them'
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            problems = check_contribution_rollups()
+            for model_name, key, month, stored, actual in problems:
+                self.stdout.write(
+                    self.style.WARNING(f'{model_name} {key} {month:%Y-%m}: stored KSh {stored}, actual KSh {actual}')
+                )
+            if problems:
+                self.stdout.write(self.style.ERROR(f'{len(problems)} rollup rows are out of date'))
+            else:
+                self.stdout.write(self.style.SUCCESS('All contribution rollups are consistent'))
+            return
+
+        member_rows, stage_rows = rebuild_contribution_rollups()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Rebuilt contribution rollups ({member_rows} member rows, {stage_rows} stage rows)'
+            )
+        )
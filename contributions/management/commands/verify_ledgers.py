@@ -0,0 +1,39 @@
+"""
+Management command to replay the fund ledgers and report balance drift.
+"""
+
+from django.core.management.base import BaseCommand
+from contributions.ledger import LEDGERS, verify_ledger
+
+
+class Command(BaseCommand):
+    help = 'Replay the welfare account and loan kitty ledgers and compare the stored running balances'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ledger',
+            choices=sorted(LEDGERS),
+            help='Only verify this ledger (default: all ledgers)'
+        )
+        parser.add_argument(
+            '--repair',
+            action='store_true',
+            help='Overwrite drifted balances with the replayed figures'
+        )
+
+    def handle(self, *args, **options):
+        ledgers = [options['ledger']] if options['ledger'] else sorted(LEDGERS)
+        total_problems = 0
+        
+        for ledger in ledgers:
+            problems = verify_ledger(ledger, repair=options['repair'])
+            total_problems += len(problems)
+            for problem in problems:
+                self.stdout.write(self.style.WARNING(problem))
+        
+        if not total_problems:
+            self.stdout.write(self.style.SUCCESS('All ledger balances are consistent'))
+        elif options['repair']:
+            self.stdout.write(self.style.SUCCESS(f'Repaired {total_problems} drifted balances'))
+        else:
+            self.stdout.write(self.style.ERROR(f'{total_problems} drifted balances found (run with --repair to fix)'))
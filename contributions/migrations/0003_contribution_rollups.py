@@ -0,0 +1,72 @@
+# Generated by Django 5.2.4 on 2026-10-17 15:35
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def populate_rollups(apps, schema_editor):
+    Contribution = apps.get_model('contributions', 'Contribution')
+    MemberContributionRollup = apps.get_model('contributions', 'MemberContributionRollup')
+    StageContributionRollup = apps.get_model('contributions', 'StageContributionRollup')
+
+    def monthly_totals(group_by):
+        return (
+            Contribution.objects.filter(status='completed')
+            .annotate(month=TruncMonth('payment_date', output_field=models.DateField()))
+            .values(group_by, 'month')
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by()
+        )
+
+    MemberContributionRollup.objects.bulk_create([
+        MemberContributionRollup(member_id=row['member'], month=row['month'], total=row['total'], count=row['count'])
+        for row in monthly_totals('member')
+    ], batch_size=1000)
+    StageContributionRollup.objects.bulk_create([
+        StageContributionRollup(stage_id=row['member__stage'], month=row['month'], total=row['total'], count=row['count'])
+        for row in monthly_totals('member__stage')
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contributions', '0002_initial'),
+        ('members', '0007_memberprofile'),
+        ('stages', '0006_organization_member_count_stage_member_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberContributionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contribution_rollups', to='members.member')),
+            ],
+            options={
+                'ordering': ['-month'],
+                'unique_together': {('member', 'month')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StageContributionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('stage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contribution_rollups', to='stages.stage')),
+            ],
+            options={
+                'ordering': ['-month'],
+                'unique_together': {('stage', 'month')},
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.4 on 2026-10-17 15:36
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def backfill_running_balances(apps, schema_editor):
+    Entry = apps.get_model('contributions', 'WelfareAccount')
+    LedgerBalance = apps.get_model('contributions', 'LedgerBalance')
+
+    balance = Decimal('0')
+    last_entry_id = 0
+    entries = []
+    for entry in Entry.objects.order_by('id').iterator(chunk_size=2000):
+        balance += entry.amount if entry.is_credit else -entry.amount
+        last_entry_id = entry.id
+        entry.balance_after = balance
+        entries.append(entry)
+    Entry.objects.bulk_update(entries, ['balance_after'], batch_size=1000)
+
+    LedgerBalance.objects.update_or_create(
+        ledger='welfare',
+        defaults={'balance': balance, 'last_entry_id': last_entry_id}
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contributions', '0003_contribution_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ledger', models.CharField(max_length=20, unique=True)),
+                ('balance', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('last_entry_id', models.BigIntegerField(default=0, help_text='Last ledger entry included in the balance')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='welfareaccount',
+            name='balance_after',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=14, null=True),
+        ),
+        migrations.CreateModel(
+            name='LedgerCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ledger', models.CharField(max_length=20)),
+                ('as_of', models.DateTimeField()),
+                ('last_entry_id', models.BigIntegerField(help_text='Last ledger entry included in the balance')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-as_of'],
+                'indexes': [models.Index(fields=['ledger', 'as_of'], name='contributio_ledger_d4a7f2_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_running_balances, migrations.RunPython.noop),
+    ]
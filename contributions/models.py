@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from decimal import Decimal
 
 class Contribution(models.Model):
@@ -63,6 +63,50 @@ class Contribution(models.Model):
     
     def __str__(self):
         return f"{self.member.full_name} - KSh {self.amount} ({self.get_contribution_type_display()})"
+    
+    def save(self, *args, **kwargs):
+        # Monthly rollups are updated by signals in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
+class MemberContributionRollup(models.Model):
+    """
+    Monthly total of completed contributions for each member.
+    Maintained incrementally by contributions.rollups.
+    """
+    member = models.ForeignKey('members.Member', on_delete=models.CASCADE, related_name='contribution_rollups')
+    month = models.DateField(help_text="First day of the month")
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-month']
+        unique_together = ['member', 'month']
+    
+    def __str__(self):
+        return f"{self.member_id} {self.month:%Y-%m}: KSh {self.total}"
+
+class StageContributionRollup(models.Model):
+    """
+    Monthly total of completed contributions for each stage, attributed to
+    the stage each member currently belongs to.
+    Maintained incrementally by contributions.rollups.
+    """
+    stage = models.ForeignKey('stages.Stage', on_delete=models.CASCADE, related_name='contribution_rollups')
+    month = models.DateField(help_text="First day of the month")
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-month']
+        unique_together = ['stage', 'month']
+    
+    def __str__(self):
+        return f"{self.stage_id} {self.month:%Y-%m}: KSh {self.total}"
 
 class ContributionPlan(models.Model):
     """
@@ -118,8 +162,13 @@ class WelfareAccount(models.Model):
     description = models.TextField()
     processed_by = models.ForeignKey('members.Member', on_delete=models.SET_NULL, null=True)
     
+    # Running balance, set when the entry is posted
+    balance_after = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     
+    LEDGER = 'welfare'
+    
     class Meta:
         ordering = ['-created_at']
     
@@ -127,17 +176,52 @@ class WelfareAccount(models.Model):
         direction = "Credit" if self.is_credit else "Debit"
         return f"{direction}: KSh {self.amount} - {self.get_transaction_type_display()}"
     
+    def save(self, *args, **kwargs):
+        from .ledger import save_entry
+        save_entry(self, lambda: super(WelfareAccount, self).save(*args, **kwargs))
+    
     @classmethod
     def get_current_balance(cls):
-        """Calculate current welfare account balance"""
-        from django.db.models import Sum, Q
-        
-        credits = cls.objects.filter(is_credit=True).aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0')
-        
-        debits = cls.objects.filter(is_credit=False).aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0')
-        
-        return credits - debits
+        """Current welfare account balance"""
+        from .ledger import current_balance
+        return current_balance(cls.LEDGER)
+    
+    @classmethod
+    def get_balance_at(cls, when):
+        """Welfare account balance at a point in time"""
+        from .ledger import balance_at
+        return balance_at(cls.LEDGER, when)
+
+class LedgerBalance(models.Model):
+    """
+    Current balance of each fund ledger (welfare account, loan kitty)
+    """
+    ledger = models.CharField(max_length=20, unique=True)
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    last_entry_id = models.BigIntegerField(default=0, help_text="Last ledger entry included in the balance")
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.ledger}: KSh {self.balance}"
+
+class LedgerCheckpoint(models.Model):
+    """
+    Balance of a fund ledger at a point in time, used to answer
+    historical balance queries without summing the whole ledger
+    """
+    ledger = models.CharField(max_length=20)
+    as_of = models.DateTimeField()
+    last_entry_id = models.BigIntegerField(help_text="Last ledger entry included in the balance")
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-as_of']
+        indexes = [
+            models.Index(fields=['ledger', 'as_of']),
+        ]
+    
+    def __str__(self):
+        return f"{self.ledger} at {self.as_of:%Y-%m-%d %H:%M}: KSh {self.balance}"
@@ -0,0 +1,147 @@
+"""
+Monthly contribution rollups per member and per stage.
+
+Only contributions in the ``completed`` state are counted. The signal
+handlers in ``contributions.signals`` apply each status transition as a
+delta, so reading a total touches one row per month instead of every
+historical contribution. ``rebuild_contribution_rollups`` recomputes the
+tables from scratch and ``check_contribution_rollups`` reports drift.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import Greatest, TruncMonth
+from django.utils import timezone
+
+from .models import Contribution, MemberContributionRollup, StageContributionRollup
+
+
+def contribution_month(payment_date):
+    """Return the first day of the (local) month a payment falls in"""
+    if timezone.is_aware(payment_date):
+        payment_date = timezone.localtime(payment_date)
+    return payment_date.date().replace(day=1)
+
+
+def rollup_state(contribution):
+    """
+    Return ``(member_id, month, amount)`` for a completed contribution,
+    or None if it does not count towards the rollups.
+    """
+    if contribution.status != 'completed' or not contribution.payment_date:
+        return None
+    return (
+        contribution.member_id,
+        contribution_month(contribution.payment_date),
+        Decimal(str(contribution.amount)),
+    )
+
+
+def _bump(model, lookup, amount, count):
+    if count > 0:
+        _, created = model.objects.get_or_create(
+            defaults={'total': amount, 'count': count}, **lookup
+        )
+        if created:
+            return
+    model.objects.filter(**lookup).update(
+        total=F('total') + amount,
+        count=Greatest(F('count') + count, 0)
+    )
+
+
+def apply_rollup(state, sign, stage_id=None):
+    """
+    Add (``sign=1``) or remove (``sign=-1``) a contribution from the rollups.
+    """
+    if state is None:
+        return
+
+    member_id, month, amount = state
+    if stage_id is None:
+        from members.models import Member
+        stage_id = Member.objects.filter(id=member_id).values_list('stage_id', flat=True).first()
+
+    _bump(MemberContributionRollup, {'member_id': member_id, 'month': month}, amount * sign, sign)
+    if stage_id:
+        _bump(StageContributionRollup, {'stage_id': stage_id, 'month': month}, amount * sign, sign)
+
+
+def move_member_rollups(member_id, old_stage_id, new_stage_id):
+    """Re-attribute a member's monthly totals when they move to another stage"""
+    if old_stage_id == new_stage_id:
+        return
+
+    for row in MemberContributionRollup.objects.filter(member_id=member_id):
+        if old_stage_id:
+            _bump(StageContributionRollup, {'stage_id': old_stage_id, 'month': row.month}, -row.total, -row.count)
+        if new_stage_id:
+            _bump(StageContributionRollup, {'stage_id': new_stage_id, 'month': row.month}, row.total, row.count)
+
+
+def _monthly_totals(group_by):
+    return (
+        Contribution.objects.filter(status='completed')
+        .annotate(month=TruncMonth('payment_date', output_field=DateField()))
+        .values(group_by, 'month')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+
+
+def rebuild_contribution_rollups():
+    """
+    Recompute both rollup tables from the ``Contribution`` table.
+
+    Returns:
+        tuple: Number of member and stage rollup rows written
+    """
+    member_rows = [
+        MemberContributionRollup(member_id=row['member'], month=row['month'], total=row['total'], count=row['count'])
+        for row in _monthly_totals('member')
+    ]
+    stage_rows = [
+        StageContributionRollup(stage_id=row['member__stage'], month=row['month'], total=row['total'], count=row['count'])
+        for row in _monthly_totals('member__stage')
+    ]
+
+    with transaction.atomic():
+        MemberContributionRollup.objects.all().delete()
+        StageContributionRollup.objects.all().delete()
+        MemberContributionRollup.objects.bulk_create(member_rows, batch_size=1000)
+        StageContributionRollup.objects.bulk_create(stage_rows, batch_size=1000)
+
+    return len(member_rows), len(stage_rows)
+
+
+def check_contribution_rollups():
+    """
+    Compare the rollup tables with the ``Contribution`` table.
+
+    Returns:
+        list: ``(model_name, key, month, stored, actual)`` for every row that drifted
+    """
+    problems = []
+
+    for model, key, group_by in (
+        (MemberContributionRollup, 'member_id', 'member'),
+        (StageContributionRollup, 'stage_id', 'member__stage'),
+    ):
+        actual = {
+            (row[group_by], row['month']): row['total']
+            for row in _monthly_totals(group_by)
+        }
+        stored = {
+            (row[key], row['month']): row['total']
+            for row in model.objects.exclude(count=0).values(key, 'month', 'total')
+        }
+        for bucket in sorted(set(actual) | set(stored), key=str):
+            if actual.get(bucket, Decimal('0')) != stored.get(bucket, Decimal('0')):
+                problems.append((
+                    model.__name__, bucket[0], bucket[1],
+                    stored.get(bucket, Decimal('0')), actual.get(bucket, Decimal('0'))
+                ))
+
+    return problems
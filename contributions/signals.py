@@ -0,0 +1,66 @@
+"""
+Django signals for the contributions app.
+Keep the monthly contribution rollups in step with Contribution rows.
+"""
+
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+from members.models import Member
+from .models import Contribution
+from .rollups import apply_rollup, move_member_rollups, rollup_state
+
+
+@receiver(post_init, sender=Contribution)
+def remember_rollup_state(sender, instance, **kwargs):
+    """
+    Remember whether a loaded contribution is counted in the rollups.
+    Skipped for deferred loads so that no extra query is issued.
+    """
+    if {'status', 'amount', 'member_id', 'payment_date'} <= instance.__dict__.keys():
+        instance._rollup_state = rollup_state(instance)
+
+
+@receiver(pre_save, sender=Contribution)
+def load_rollup_state(sender, instance, **kwargs):
+    """
+    Fetch the stored state for contributions loaded without it.
+    """
+    if instance._state.adding or hasattr(instance, '_rollup_state'):
+        return
+    stored = Contribution.objects.filter(pk=instance.pk).first()
+    instance._rollup_state = rollup_state(stored) if stored else None
+
+
+@receiver(post_save, sender=Contribution)
+def update_rollups(sender, instance, created, **kwargs):
+    """
+    Apply a contribution's transition into or out of the completed state.
+    """
+    old_state = None if created else getattr(instance, '_rollup_state', None)
+    new_state = rollup_state(instance)
+    if old_state != new_state:
+        apply_rollup(old_state, -1)
+        apply_rollup(new_state, 1)
+    instance._rollup_state = new_state
+
+
+@receiver(post_delete, sender=Contribution)
+def release_rollups(sender, instance, **kwargs):
+    apply_rollup(getattr(instance, '_rollup_state', rollup_state(instance)), -1)
+
+
+@receiver(post_init, sender=Member)
+def remember_rollup_stage(sender, instance, **kwargs):
+    if 'stage_id' in instance.__dict__:
+        instance._rollup_stage_id = instance.stage_id
+
+
+@receiver(post_save, sender=Member)
+def move_rollups_with_member(sender, instance, created, **kwargs):
+    """
+    Stage rollups follow the member, so move their history on a stage change.
+    """
+    old_stage_id = getattr(instance, '_rollup_stage_id', None)
+    if not created and old_stage_id is not None:
+        move_member_rollups(instance.id, old_stage_id, instance.stage_id)
+    instance._rollup_stage_id = instance.stage_id
@@ -1,3 +1,130 @@
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
 from django.test import TestCase
+from django.utils import timezone
+
+from bodaboda_welfare.testing import create_member, make_stage
+from contributions.ledger import balance_at, create_checkpoint, current_balance, verify_ledger
+from contributions.models import (
+    Contribution, LedgerBalance, MemberContributionRollup, StageContributionRollup, WelfareAccount
+)
+from contributions.rollups import check_contribution_rollups, rebuild_contribution_rollups
+
+
+def create_contribution(member, amount, status='completed'):
+    return Contribution.objects.create(
+        member=member,
+        contribution_type='monthly',
+        amount=Decimal(amount),
+        payment_method='cash',
+        transaction_id=uuid.uuid4().hex,
+        status=status
+    )
+
+
+class ContributionRollupTests(TestCase):
+    def setUp(self):
+        self.stage = make_stage()
+        self.member = create_member(self.stage)
+
+    def assertTotals(self, member_total, stage_total, stage=None):
+        self.assertEqual(self.member.total_contributions(), Decimal(member_total))
+        stage_rollup = StageContributionRollup.objects.filter(stage=stage or self.stage).first()
+        self.assertEqual(stage_rollup.total if stage_rollup else Decimal('0'), Decimal(stage_total))
+
+    def test_completed_contributions_are_rolled_up(self):
+        create_contribution(self.member, '100.00')
+        create_contribution(self.member, '50.00')
+        create_contribution(self.member, '70.00', status='pending')
+        self.assertTotals('150.00', '150.00')
+        self.assertEqual(MemberContributionRollup.objects.get(member=self.member).count, 2)
+
+    def test_status_transitions_apply_deltas(self):
+        contribution = create_contribution(self.member, '100.00', status='pending')
+        self.assertTotals('0', '0')
+
+        contribution.status = 'completed'
+        contribution.save()
+        self.assertTotals('100.00', '100.00')
+
+        contribution.status = 'refunded'
+        contribution.save()
+        self.assertTotals('0', '0')
+
+    def test_delete_removes_contribution(self):
+        create_contribution(self.member, '100.00').delete()
+        self.assertTotals('0', '0')
+
+    def test_stage_move_moves_stage_totals(self):
+        create_contribution(self.member, '100.00')
+        other = make_stage(organization=self.stage.organization)
+        self.member.stage = other
+        self.member.save()
+        self.assertTotals('100.00', '0')
+        self.assertTotals('100.00', '100.00', stage=other)
+
+    def test_rebuild_repairs_drift(self):
+        contribution = create_contribution(self.member, '100.00')
+        Contribution.objects.filter(id=contribution.id).update(amount=Decimal('80.00'))
+        self.assertEqual(len(check_contribution_rollups()), 2)
+
+        rebuild_contribution_rollups()
+        self.assertEqual(check_contribution_rollups(), [])
+        self.assertTotals('80.00', '80.00')
+
+
+def post(amount, is_credit=True, created_at=None):
+    entry = WelfareAccount.objects.create(
+        transaction_type='contribution' if is_credit else 'expense',
+        amount=Decimal(amount),
+        is_credit=is_credit,
+        description='Test entry'
+    )
+    if created_at:
+        WelfareAccount.objects.filter(id=entry.id).update(created_at=created_at)
+    return entry
+
+
+class LedgerTests(TestCase):
+    def test_entries_store_running_balance(self):
+        post('100.00')
+        entry = post('30.00', is_credit=False)
+        self.assertEqual(entry.balance_after, Decimal('70.00'))
+        self.assertEqual(current_balance('welfare'), Decimal('70.00'))
+        self.assertEqual(WelfareAccount.get_current_balance(), Decimal('70.00'))
+
+    def test_balance_at_point_in_time(self):
+        now = timezone.now()
+        post('100.00', created_at=now - timedelta(days=3))
+        post('40.00', is_credit=False, created_at=now - timedelta(days=2))
+        post('500.00', created_at=now - timedelta(days=1))
+
+        self.assertEqual(balance_at('welfare', now - timedelta(days=4)), Decimal('0'))
+        self.assertEqual(balance_at('welfare', now - timedelta(days=2)), Decimal('60.00'))
+        self.assertEqual(balance_at('welfare', now), Decimal('560.00'))
+
+    def test_balance_at_starts_from_checkpoint(self):
+        now = timezone.now()
+        post('100.00', created_at=now - timedelta(days=2))
+        checkpoint = create_checkpoint('welfare')
+        post('25.00', is_credit=False)
+
+        self.assertEqual(checkpoint.balance, Decimal('100.00'))
+        self.assertEqual(balance_at('welfare', timezone.now()), Decimal('75.00'))
+
+    def test_verify_reports_and_repairs_drift(self):
+        post('100.00')
+        edited = post('50.00')
+        post('10.00', is_credit=False)
+        self.assertEqual(verify_ledger('welfare'), [])
+
+        WelfareAccount.objects.filter(id=edited.id).update(amount=Decimal('20.00'))
+        problems = verify_ledger('welfare')
+        # The edited entry, the entry after it and the current balance
+        self.assertEqual(len(problems), 3)
 
-# Create your tests here.
+        verify_ledger('welfare', repair=True)
+        self.assertEqual(verify_ledger('welfare'), [])
+        self.assertEqual(LedgerBalance.objects.get(ledger='welfare').balance, Decimal('110.00'))
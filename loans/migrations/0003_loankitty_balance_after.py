@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-17 15:36
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def backfill_running_balances(apps, schema_editor):
+    Entry = apps.get_model('loans', 'LoanKitty')
+    LedgerBalance = apps.get_model('contributions', 'LedgerBalance')
+
+    balance = Decimal('0')
+    last_entry_id = 0
+    entries = []
+    for entry in Entry.objects.order_by('id').iterator(chunk_size=2000):
+        balance += entry.amount if entry.is_credit else -entry.amount
+        last_entry_id = entry.id
+        entry.balance_after = balance
+        entries.append(entry)
+    Entry.objects.bulk_update(entries, ['balance_after'], batch_size=1000)
+
+    LedgerBalance.objects.update_or_create(
+        ledger='loan_kitty',
+        defaults={'balance': balance, 'last_entry_id': last_entry_id}
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contributions', '0004_ledger_running_balances'),
+        ('loans', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loankitty',
+            name='balance_after',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=14, null=True),
+        ),
+        migrations.RunPython(backfill_running_balances, migrations.RunPython.noop),
+    ]
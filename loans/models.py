@@ -181,8 +181,13 @@ class LoanKitty(models.Model):
     description = models.TextField()
     processed_by = models.ForeignKey('members.Member', on_delete=models.SET_NULL, null=True)
     
+    # Running balance, set when the entry is posted
+    balance_after = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     
+    LEDGER = 'loan_kitty'
+    
     class Meta:
         ordering = ['-created_at']
     
@@ -190,17 +195,18 @@ class LoanKitty(models.Model):
         direction = "Credit" if self.is_credit else "Debit"
         return f"{direction}: KSh {self.amount} - {self.get_transaction_type_display()}"
     
+    def save(self, *args, **kwargs):
+        from contributions.ledger import save_entry
+        save_entry(self, lambda: super(LoanKitty, self).save(*args, **kwargs))
+    
     @classmethod
     def get_current_balance(cls):
-        """Calculate current loan kitty balance"""
-        from django.db.models import Sum
-        
-        credits = cls.objects.filter(is_credit=True).aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0')
-        
-        debits = cls.objects.filter(is_credit=False).aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0')
-        
-        return credits - debits
+        """Current loan kitty balance"""
+        from contributions.ledger import current_balance
+        return current_balance(cls.LEDGER)
+    
+    @classmethod
+    def get_balance_at(cls, when):
+        """Loan kitty balance at a point in time"""
+        from contributions.ledger import balance_at
+        return balance_at(cls.LEDGER, when)
@@ -1,3 +1,61 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.core.exceptions import ImproperlyConfigured, PermissionDenied
+from django.template.response import TemplateResponse
+from django.urls import path
+from stages.models import Organization
+from .importer import ImportFileError, import_members
+from .models import Member
 
-# Register your models here.
+class MemberImportForm(forms.Form):
+    file = forms.FileField(help_text='CSV or .xlsx file with one member per row')
+    organization = forms.ModelChoiceField(
+        Organization.objects.all(),
+        required=False,
+        help_text='Only match stages of this organization'
+    )
+    dry_run = forms.BooleanField(required=False, help_text='Validate every row without creating anything')
+
+@admin.register(Member)
+class MemberAdmin(admin.ModelAdmin):
+    list_display = ['member_number', 'full_name', 'national_id', 'phone_number', 'stage', 'status', 'created_at']
+    list_filter = ['status']
+    list_select_related = ['user', 'stage']
+    search_fields = ['member_number', 'national_id', 'phone_number', 'user__first_name', 'user__last_name']
+    raw_id_fields = ['user', 'stage']
+    change_list_template = 'admin/members/member/change_list.html'
+    
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_members_view), name='members_member_import'),
+        ] + super().get_urls()
+    
+    def import_members_view(self, request):
+        """Upload a CSV or Excel file of members, see members.importer"""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = MemberImportForm(request.POST or None, request.FILES or None)
+        result = None
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                result = import_members(
+                    upload, upload.name, form.cleaned_data['organization'], dry_run=form.cleaned_data['dry_run']
+                )
+            except (ImproperlyConfigured, ImportFileError) as e:
+                messages.error(request, str(e))
+            else:
+                verb = 'Would create' if form.cleaned_data['dry_run'] else 'Created'
+                level = messages.WARNING if result.errors else messages.SUCCESS
+                messages.add_message(
+                    request, level,
+                    f'{verb} {result.created} of {result.rows} members ({len(result.errors)} rows failed)'
+                )
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import members',
+            'form': form,
+            'result': result,
+        }
+        return TemplateResponse(request, 'admin/members/member/import.html', context)
@@ -0,0 +1,404 @@
+"""
+Bulk import of members from CSV or Excel files.
+
+Rows are read one at a time and validated in batches. Each batch costs a
+fixed number of queries whatever its size: one to find national IDs and
+usernames that are already taken, a ``bulk_create`` each for users and
+members, and the bookkeeping the per-member signals would otherwise do
+(stage counters, stage group chats, feed timelines and the search index),
+grouped by stage. Stages are resolved by name from a map built once before
+the first row.
+
+Expected columns, matched case-insensitively with spaces or underscores:
+``first_name``, ``last_name``, ``national_id``, ``phone_number``,
+``date_of_birth``, ``address``, ``stage``, ``zone``, ``next_of_kin_name``,
+``next_of_kin_relationship``, ``next_of_kin_phone`` and ``next_of_kin_id``,
+plus the optional ``username``, ``email``, ``sacco`` and
+``dependents_count``.
+
+Every row is checked with the model field validators (phone number format,
+field lengths, email) before anything is written, since ``bulk_create``
+skips them and one bad value would otherwise fail the whole batch in the
+database. CSV files must be UTF-8; anything else is rejected with an
+``ImportFileError`` before the first row is imported.
+
+Users are created with unusable passwords; imported riders set one through
+password reset. Excel files need the ``openpyxl`` package.
+"""
+
+import codecs
+import csv
+import re
+import zipfile
+from collections import defaultdict
+from datetime import date, datetime
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import transaction
+
+from stages.counters import adjust_member_count
+from stages.models import Stage
+from .models import Member
+from .numbers import allocate_member_numbers
+from .search import index_members
+
+REQUIRED_COLUMNS = [
+    'first_name', 'last_name', 'national_id', 'phone_number', 'date_of_birth', 'address',
+    'stage', 'zone', 'next_of_kin_name', 'next_of_kin_relationship', 'next_of_kin_phone', 'next_of_kin_id',
+]
+OPTIONAL_COLUMNS = ['username', 'email', 'sacco', 'dependents_count']
+MEMBER_FIELDS = [
+    'national_id', 'phone_number', 'stage', 'zone', 'sacco', 'next_of_kin_name', 'next_of_kin_relationship',
+    'next_of_kin_phone', 'next_of_kin_id', 'date_of_birth', 'address', 'dependents_count',
+]
+DATE_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y']
+# Validated through the model fields; user and member number are assigned on
+# creation and the stage is resolved through ``StageMap``
+UNVALIDATED_MEMBER_FIELDS = ['user', 'member_number', 'stage']
+UNVALIDATED_USER_FIELDS = ['password', 'last_login', 'date_joined']
+
+
+class ImportFileError(Exception):
+    """The file as a whole cannot be read, so no rows were imported"""
+
+
+class ImportResult:
+    """Counts and per-row errors of an import"""
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.errors = []
+        # Original values of the failed rows, by row number
+        self.failed_rows = {}
+
+    def add_error(self, row_number, message, row=None):
+        self.errors.append((row_number, message))
+        if row is not None:
+            self.failed_rows[row_number] = row
+
+
+def _column_name(header):
+    return re.sub(r'[\s_]+', '_', str(header or '').strip().lower())
+
+
+def _check_encoding(fileobj, encoding):
+    """Decode the whole file once so a bad byte is reported before any row is imported"""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for line_number, line in enumerate(fileobj, start=1):
+        try:
+            decoder.decode(line)
+        except UnicodeDecodeError:
+            raise ImportFileError(
+                f'line {line_number} is not valid UTF-8 text; save the file as "CSV UTF-8" and try again'
+            )
+    try:
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        raise ImportFileError('the file ends part-way through a character; save it as "CSV UTF-8" and try again')
+    fileobj.seek(0)
+
+
+def _csv_rows(fileobj):
+    _check_encoding(fileobj, 'utf-8-sig')
+    reader = csv.reader(codecs.iterdecode(fileobj, 'utf-8-sig'))
+    header = [_column_name(name) for name in next(reader, [])]
+    for values in reader:
+        yield dict(zip(header, values))
+
+
+def _excel_rows(fileobj):
+    try:
+        import openpyxl
+    except ImportError:
+        raise ImproperlyConfigured('Importing Excel files requires the openpyxl package (pip install openpyxl)')
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    try:
+        workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError):
+        # KeyError: a zip archive without the parts of a workbook
+        raise ImportFileError('the file is not a valid Excel workbook; save it as .xlsx and try again')
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [_column_name(name) for name in next(rows, ())]
+        for values in rows:
+            yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def read_rows(fileobj, filename):
+    """
+    Rows of an uploaded file as dicts keyed by column name.
+
+    Yields:
+        tuple: ``(row_number, row)``, numbered as in a spreadsheet with the
+        header on row 1
+
+    Raises:
+        ImportFileError: If a CSV file is not UTF-8 text or an Excel file is
+            not a valid workbook
+    """
+    reader = _excel_rows if filename.lower().endswith(('.xlsx', '.xlsm')) else _csv_rows
+    for row_number, row in enumerate(reader(fileobj), start=2):
+        if any(value not in (None, '') for value in row.values()):
+            yield row_number, row
+
+
+def normalize_phone_number(phone_number):
+    """Write a Kenyan phone number as +254..., as profile setup does"""
+    phone_number = re.sub(r'[\s-]', '', phone_number)
+    if phone_number.startswith('+254'):
+        return phone_number
+    if phone_number.startswith('254'):
+        return '+' + phone_number
+    if phone_number.startswith('0'):
+        return '+254' + phone_number[1:]
+    return '+254' + phone_number
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(str(value).strip(), date_format).date()
+        except ValueError:
+            pass
+    raise ValueError(f'date of birth "{value}" is not a date (use YYYY-MM-DD)')
+
+
+def _check_fields(instance, exclude):
+    """Run a model's field validators, raising ValueError with every failure"""
+    try:
+        instance.clean_fields(exclude=exclude)
+    except ValidationError as e:
+        raise ValueError('; '.join(
+            f"{field.replace('_', ' ')}: {' '.join(messages)}" for field, messages in e.message_dict.items()
+        ))
+
+
+def _text(row, column):
+    value = row.get(column)
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        # Spreadsheets store ID and phone numbers as floats
+        value = int(value)
+    return str(value).strip()
+
+
+class StageMap:
+    """
+    Stages by lower-cased name, built with a single query.
+
+    Names used by stages in more than one organization are ambiguous unless
+    the import is limited to one organization.
+    """
+
+    def __init__(self, organization=None):
+        stages = Stage.objects.filter(is_active=True)
+        if organization is not None:
+            stages = stages.filter(organization=organization)
+        self._stages = {}
+        self._ambiguous = set()
+        for stage in stages.only('id', 'name', 'organization_id'):
+            key = stage.name.strip().lower()
+            if key in self._stages:
+                self._ambiguous.add(key)
+            self._stages[key] = stage
+
+    def resolve(self, name):
+        key = name.strip().lower()
+        if key in self._ambiguous:
+            raise ValueError(f'stage "{name}" exists in several organizations; import one organization at a time')
+        try:
+            return self._stages[key]
+        except KeyError:
+            raise ValueError(f'unknown stage "{name}"')
+
+
+class MemberImporter:
+    """
+    Validate and create members from rows produced by ``read_rows``.
+
+    Args:
+        organization: Only resolve stages of this organization
+        batch_size: Rows validated and written together
+        dry_run: Validate every row without creating anything
+    """
+
+    def __init__(self, organization=None, batch_size=1000, dry_run=False):
+        self.stages = StageMap(organization)
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.result = ImportResult()
+        self._seen_national_ids = set()
+        self._seen_usernames = set()
+
+    def run(self, rows):
+        """
+        Returns:
+            ImportResult
+        """
+        batch = []
+        for row_number, row in rows:
+            self.result.rows += 1
+            batch.append((row_number, row))
+            if len(batch) == self.batch_size:
+                self._import_batch(batch)
+                batch = []
+        self._import_batch(batch)
+        return self.result
+
+    def _validate(self, row):
+        missing = [column for column in REQUIRED_COLUMNS if not _text(row, column)]
+        if missing:
+            raise ValueError('missing ' + ', '.join(missing))
+
+        national_id = _text(row, 'national_id')
+        if not national_id.isdigit() or len(national_id) != 8:
+            raise ValueError('national ID must be exactly 8 digits')
+        dependents_count = _text(row, 'dependents_count') or '0'
+        if not dependents_count.isdigit():
+            raise ValueError('dependents count must be a whole number')
+
+        data = {
+            'username': _text(row, 'username') or national_id,
+            'first_name': _text(row, 'first_name'),
+            'last_name': _text(row, 'last_name'),
+            'email': _text(row, 'email'),
+            'national_id': national_id,
+            'phone_number': normalize_phone_number(_text(row, 'phone_number')),
+            'stage': self.stages.resolve(_text(row, 'stage')),
+            'zone': _text(row, 'zone'),
+            'sacco': _text(row, 'sacco'),
+            'next_of_kin_name': _text(row, 'next_of_kin_name'),
+            'next_of_kin_relationship': _text(row, 'next_of_kin_relationship'),
+            'next_of_kin_phone': normalize_phone_number(_text(row, 'next_of_kin_phone')),
+            'next_of_kin_id': _text(row, 'next_of_kin_id'),
+            'date_of_birth': _parse_date(row.get('date_of_birth')),
+            'address': _text(row, 'address'),
+            'dependents_count': int(dependents_count),
+        }
+        _check_fields(
+            User(**{field: data[field] for field in ('username', 'first_name', 'last_name', 'email')}),
+            UNVALIDATED_USER_FIELDS
+        )
+        _check_fields(Member(**{field: data[field] for field in MEMBER_FIELDS}), UNVALIDATED_MEMBER_FIELDS)
+        return data
+
+    def _import_batch(self, batch):
+        valid = []
+        for row_number, row in batch:
+            try:
+                data = self._validate(row)
+            except ValueError as e:
+                self.result.add_error(row_number, str(e), row)
+                continue
+            if data['national_id'] in self._seen_national_ids:
+                self.result.add_error(
+                    row_number, f"national ID {data['national_id']} appears earlier in the file", row
+                )
+            elif data['username'].lower() in self._seen_usernames:
+                self.result.add_error(row_number, f"username {data['username']} appears earlier in the file", row)
+            else:
+                self._seen_national_ids.add(data['national_id'])
+                self._seen_usernames.add(data['username'].lower())
+                valid.append((row_number, row, data))
+        if not valid:
+            return
+
+        taken_ids = set(Member.objects.filter(
+            national_id__in=[data['national_id'] for _, _, data in valid]
+        ).values_list('national_id', flat=True))
+        taken_usernames = {username.lower() for username in User.objects.filter(
+            username__in=[data['username'] for _, _, data in valid]
+        ).values_list('username', flat=True)}
+        rows = []
+        for row_number, row, data in valid:
+            if data['national_id'] in taken_ids:
+                self.result.add_error(
+                    row_number, f"a member with national ID {data['national_id']} already exists", row
+                )
+            elif data['username'].lower() in taken_usernames:
+                self.result.add_error(row_number, f"username {data['username']} is already taken", row)
+            else:
+                rows.append(data)
+
+        if rows and not self.dry_run:
+            self._create(rows)
+        self.result.created += len(rows)
+
+    def _create(self, rows):
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(
+                    username=data['username'],
+                    first_name=data['first_name'],
+                    last_name=data['last_name'],
+                    email=data['email'],
+                    password=make_password(None)
+                )
+                for data in rows
+            ])
+            if users and users[0].pk is None:
+                by_username = dict(User.objects.filter(
+                    username__in=[data['username'] for data in rows]
+                ).values_list('username', 'id'))
+                for user in users:
+                    user.pk = by_username[user.username]
+
+            by_organization = defaultdict(list)
+            for data in rows:
+                by_organization[data['stage'].organization_id].append(data)
+            member_numbers = {}
+            for organization_id, organization_rows in by_organization.items():
+                numbers = allocate_member_numbers(len(organization_rows), organization_id)
+                member_numbers.update(zip((data['national_id'] for data in organization_rows), numbers))
+
+            members = Member.objects.bulk_create([
+                Member(
+                    user=user,
+                    member_number=member_numbers[data['national_id']],
+                    **{field: data[field] for field in MEMBER_FIELDS}
+                )
+                for user, data in zip(users, rows)
+            ])
+            if members and members[0].pk is None:
+                members = list(Member.objects.filter(user__in=users))
+
+            self._after_create(members)
+
+    def _after_create(self, members):
+        """Do in bulk what the Member signals do for a single save"""
+        from social.chat import join_stage_group
+        from social.timelines import backfill_new_stage_members
+
+        by_stage = defaultdict(list)
+        for member in members:
+            by_stage[member.stage_id].append(member)
+        for stage_id, stage_members in by_stage.items():
+            adjust_member_count(stage_id, len(stage_members))
+            join_stage_group(stage_members[0].stage, stage_members)
+            backfill_new_stage_members([member.id for member in stage_members], stage_id)
+        index_members([member.id for member in members])
+
+
+def import_members(fileobj, filename, organization=None, batch_size=1000, dry_run=False):
+    """
+    Import members from a CSV or Excel file.
+
+    Returns:
+        ImportResult
+
+    Raises:
+        ImportFileError: If the file cannot be read as a whole
+    """
+    importer = MemberImporter(organization, batch_size, dry_run)
+    return importer.run(read_rows(fileobj, filename))
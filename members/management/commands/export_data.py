@@ -0,0 +1,53 @@
+"""
+Management command to export members, contributions, loans or wallet
+transactions to CSV or Excel.
+"""
+
+import sys
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from bodaboda_welfare.exports import export_names, get_export
+
+
+def _date(value):
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = 'Export a table to CSV or Excel, streaming rows so memory use stays flat'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=export_names(), help='What to export')
+        parser.add_argument(
+            '--output',
+            metavar='PATH',
+            help='File to write; .xlsx writes an Excel workbook (default: CSV to stdout)'
+        )
+        parser.add_argument('--from', dest='date_from', type=_date, help='First day to include (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', type=_date, help='Last day to include (YYYY-MM-DD)')
+        parser.add_argument('--stage', dest='stage_id', type=int, help='Only rows of members at this stage id')
+
+    def handle(self, *args, **options):
+        export = get_export(options['name'])
+        filters = {key: options[key] for key in ('date_from', 'date_to', 'stage_id')}
+        output = options['output']
+
+        try:
+            if output and output.lower().endswith('.xlsx'):
+                with open(output, 'wb') as fileobj:
+                    count = export.write_xlsx(fileobj, **filters)
+            elif output:
+                with open(output, 'w', newline='', encoding='utf-8') as fileobj:
+                    count = export.write_csv(fileobj, **filters)
+            else:
+                export.write_csv(sys.stdout, **filters)
+                return
+        except (OSError, ImproperlyConfigured) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f'Exported {count} {export.name} to {output}'))
@@ -0,0 +1,84 @@
+"""
+Management command to import members from a CSV or Excel file.
+"""
+
+import csv
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from members.importer import ImportFileError, import_members
+from stages.models import Organization
+
+
+class Command(BaseCommand):
+    help = 'Import members from a CSV or Excel (.xlsx) file, creating their user accounts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or .xlsx file with one member per row')
+        parser.add_argument(
+            '--organization',
+            type=int,
+            help='Only match stages of the organization with this id'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows validated and written together (default: 1000)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate every row without creating anything'
+        )
+        parser.add_argument(
+            '--errors',
+            metavar='PATH',
+            help='Write rows that failed, with their original values and the error, to this CSV file'
+        )
+
+    def handle(self, *args, **options):
+        organization = None
+        if options['organization'] is not None:
+            try:
+                organization = Organization.objects.get(id=options['organization'])
+            except Organization.DoesNotExist:
+                raise CommandError(f"Organization {options['organization']} does not exist")
+
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                result = import_members(
+                    fileobj, options['path'], organization, options['batch_size'], options['dry_run']
+                )
+        except (OSError, ImproperlyConfigured, ImportFileError) as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        for row_number, message in result.errors[:20]:
+            self.stdout.write(self.style.WARNING(f'Row {row_number}: {message}'))
+        if len(result.errors) > 20:
+            self.stdout.write(self.style.WARNING(f'... and {len(result.errors) - 20} more'))
+        if options['errors'] and result.errors:
+            self.write_errors(options['errors'], result)
+
+        verb = 'Would create' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {result.created} of {result.rows} members in {elapsed:.1f}s '
+            f'({len(result.errors)} rows failed)'
+        ))
+
+    def write_errors(self, path, result):
+        """Failed rows as they appeared in the file, after their row number and error"""
+        columns = []
+        for row in result.failed_rows.values():
+            columns.extend(column for column in row if column not in columns)
+        with open(path, 'w', newline='', encoding='utf-8') as report:
+            writer = csv.writer(report)
+            writer.writerow(['row', 'error'] + columns)
+            for row_number, message in result.errors:
+                row = result.failed_rows.get(row_number, {})
+                writer.writerow([row_number, message] + [
+                    '' if row.get(column) is None else row[column] for column in columns
+                ])
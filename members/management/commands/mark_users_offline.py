@@ -7,6 +7,7 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
 from members.models import Member
+from members import presence
 
 
 class Command(BaseCommand):
@@ -24,16 +25,25 @@ class Command(BaseCommand):
         minutes = options['minutes']
         cutoff_time = timezone.now() - timedelta(minutes=minutes)
         
+        # Heartbeats buffered by web processes are flushed by those processes
+        # on a timer; a member marked offline here too early is set back online
+        # by that flush.
+        
         # Find users who were online but haven't been active recently
-        inactive_users = Member.objects.filter(
+        stale_ids = set(Member.objects.filter(
             is_online=True,
             last_activity__lt=cutoff_time
-        )
+        ).values_list('id', flat=True))
         
-        count = inactive_users.count()
+        # Keep anyone the presence store has seen since the last flush
+        still_online = {
+            member_id for member_id, seen_at in presence.last_seen(stale_ids).items()
+            if seen_at >= cutoff_time
+        }
+        inactive_ids = stale_ids - still_online
         
         # Mark them as offline
-        inactive_users.update(is_online=False)
+        count = Member.objects.filter(id__in=inactive_ids).update(is_online=False)
         
         self.stdout.write(
             self.style.SUCCESS(
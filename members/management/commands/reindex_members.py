@@ -0,0 +1,28 @@
+"""
+Management command to rebuild the member search index.
+"""
+
+from django.core.management.base import BaseCommand
+from members.search import get_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the member search index from the Member table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Members written per batch (default: 2000)'
+        )
+
+    def handle(self, *args, **options):
+        if get_backend() is None:
+            self.stdout.write(self.style.WARNING(
+                'This database has no search index; member search uses plain lookups'
+            ))
+            return
+
+        count = rebuild_index(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} members'))
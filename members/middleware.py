@@ -2,29 +2,27 @@
 Middleware to track user online status and activity.
 """
 
-from django.utils import timezone
 from django.contrib.auth.models import AnonymousUser
 from members.models import Member
+from members import presence
 
 
 class OnlineStatusMiddleware:
     """
     Middleware to track when users are online and update their activity.
+
+    Activity is recorded through the presence tracker, which batches the
+    database writes instead of updating the member row on every request.
     """
 
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        # Update user's online status if they're authenticated
+        # Record a heartbeat if the user is authenticated
         if not isinstance(request.user, AnonymousUser) and hasattr(request.user, 'member'):
             try:
-                member = request.user.member
-                Member.objects.filter(id=member.id).update(
-                    is_online=True,
-                    last_activity=timezone.now(),
-                    last_seen=timezone.now()
-                )
+                presence.record_heartbeat(request.user.member.id)
             except Member.DoesNotExist:
                 pass
 
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:40
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from members.search import get_backend, search_document
+
+    backend = get_backend(schema_editor.connection)
+    if backend is None:
+        return
+
+    Member = apps.get_model('members', 'Member')
+    rows = [
+        (member.id, *search_document(
+            member.user.first_name, member.user.last_name, member.user.username,
+            member.member_number, member.national_id, member.phone_number
+        ))
+        for member in Member.objects.select_related('user').iterator(chunk_size=2000)
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        backend.create(cursor)
+        backend.upsert(cursor, rows)
+
+
+def drop_search_index(apps, schema_editor):
+    from members.search import get_backend
+
+    backend = get_backend(schema_editor.connection)
+    if backend is not None:
+        with schema_editor.connection.cursor() as cursor:
+            backend.drop(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0007_memberprofile'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:55
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def seed_member_sequence(apps, schema_editor):
+    """
+    Start the global sequence above every existing number with the
+    configured MEMBER_NUMBER_PREFIX so that new numbers stay clear of them.
+    Existing numbers are left as they are.
+    """
+    Member = apps.get_model('members', 'Member')
+    MemberNumberSequence = apps.get_model('members', 'MemberNumberSequence')
+
+    prefix = settings.MEMBER_NUMBER_PREFIX
+    pattern = re.compile(re.escape(prefix) + r'(\d+)')
+    highest = 0
+    numbers = Member.objects.filter(member_number__startswith=prefix).values_list('member_number', flat=True)
+    for number in numbers.iterator():
+        match = pattern.fullmatch(number)
+        if match:
+            highest = max(highest, int(match.group(1)))
+    MemberNumberSequence.objects.update_or_create(name='member', defaults={'next_value': highest + 1})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0008_member_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberNumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('next_value', models.PositiveBigIntegerField(default=1)),
+            ],
+            options={
+                'verbose_name': 'Member Number Sequence',
+                'verbose_name_plural': 'Member Number Sequences',
+            },
+        ),
+        migrations.RunPython(seed_member_sequence, migrations.RunPython.noop),
+    ]
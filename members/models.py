@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
 from django.core.exceptions import ValidationError
@@ -68,12 +68,24 @@ class Member(models.Model):
     def full_name(self):
         return self.user.get_full_name()
     
+    def save(self, *args, **kwargs):
+        # Stage/organization counters are updated by signals in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+    
     def total_contributions(self):
         """Calculate total contributions made by this member"""
-        from contributions.models import Contribution
-        return Contribution.objects.filter(member=self, status='completed').aggregate(
-            total=models.Sum('amount')
+        return self.contribution_rollups.aggregate(
+            total=models.Sum('total')
         )['total'] or 0
+    
+    def monthly_contributions(self, months=12):
+        """Completed contribution totals for the most recent months, newest first"""
+        return self.contribution_rollups.values('month', 'total', 'count')[:months]
 
 class MemberDocument(models.Model):
     """
@@ -194,3 +206,17 @@ class MemberProfile(models.Model):
         if self.is_super_admin:
             raise ValidationError("👑 Super admin profiles cannot be deleted for system security.")
         return super().delete(*args, **kwargs)
+
+class MemberNumberSequence(models.Model):
+    """
+    Next free value of a member number sequence, see members.numbers
+    """
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.PositiveBigIntegerField(default=1)
+    
+    class Meta:
+        verbose_name = 'Member Number Sequence'
+        verbose_name_plural = 'Member Number Sequences'
+    
+    def __str__(self):
+        return f"{self.name} (next {self.next_value})"
@@ -0,0 +1,91 @@
+"""
+Member number allocation.
+
+Member numbers come from a counter row in ``MemberNumberSequence`` rather
+than from random guesses checked against the ``Member`` table. Each process
+reserves a block of ``MEMBER_NUMBER_BLOCK_SIZE`` values with a single
+update and hands them out from memory, so allocating a number costs no
+query at all most of the time and never more than two.
+
+A block reserved inside a transaction could be rolled back while this
+process still holds it, letting another process reserve the same values.
+Allocations made inside ``transaction.atomic()`` therefore reserve a single
+value in that transaction instead of using the block.
+
+Numbers in a block that is never used (for example when the process exits)
+are skipped, so member numbers are unique and increasing but not gapless.
+
+With ``MEMBER_NUMBER_SCOPE = 'organization'`` every organization has its
+own sequence and its id in the number, e.g. ``KWS7-000042``.
+"""
+
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import MemberNumberSequence
+
+GLOBAL_SEQUENCE = 'member'
+
+_blocks = {}
+_lock = threading.Lock()
+
+
+def sequence_name(organization_id=None):
+    if organization_id is not None and settings.MEMBER_NUMBER_SCOPE == 'organization':
+        return f'member:organization:{organization_id}'
+    return GLOBAL_SEQUENCE
+
+
+def format_member_number(value, organization_id=None):
+    number = f'{value:0{settings.MEMBER_NUMBER_DIGITS}d}'
+    if sequence_name(organization_id) != GLOBAL_SEQUENCE:
+        return f'{settings.MEMBER_NUMBER_PREFIX}{organization_id}-{number}'
+    return f'{settings.MEMBER_NUMBER_PREFIX}{number}'
+
+
+def reserve(name, size):
+    """
+    Take ``size`` consecutive values from a sequence.
+
+    Returns:
+        int: The first reserved value
+    """
+    with transaction.atomic():
+        MemberNumberSequence.objects.get_or_create(name=name)
+        MemberNumberSequence.objects.filter(name=name).update(next_value=F('next_value') + size)
+        next_value = MemberNumberSequence.objects.filter(name=name).values_list('next_value', flat=True).get()
+    return next_value - size
+
+
+def allocate_member_number(organization_id=None):
+    """
+    The next free member number.
+
+    Args:
+        organization_id: Organization the member joins; only used when
+            ``MEMBER_NUMBER_SCOPE`` is ``'organization'``
+    """
+    name = sequence_name(organization_id)
+    if connection.in_atomic_block:
+        return format_member_number(reserve(name, 1), organization_id)
+
+    with _lock:
+        value, end = _blocks.get(name, (0, 0))
+        if value >= end:
+            size = settings.MEMBER_NUMBER_BLOCK_SIZE
+            value = reserve(name, size)
+            end = value + size
+        _blocks[name] = (value + 1, end)
+    return format_member_number(value, organization_id)
+
+
+def allocate_member_numbers(count, organization_id=None):
+    """
+    ``count`` new member numbers from one reservation, for bulk imports.
+    """
+    name = sequence_name(organization_id)
+    start = reserve(name, count)
+    return [format_member_number(value, organization_id) for value in range(start, start + count)]
@@ -0,0 +1,181 @@
+"""
+Presence tracking for members.
+
+Heartbeats from authenticated requests are recorded in the cache and in a
+small in-process buffer. The buffer is flushed to the ``Member`` table with a
+single bulk UPDATE at most once per ``PRESENCE_FLUSH_INTERVAL`` seconds, so
+busy periods no longer issue one write per request. Each process flushes its
+own buffer: on the next heartbeat once the interval has passed, from a timer
+when traffic stops, and when the process exits.
+
+Readers (online counts, the ``mark_users_offline`` command) consult the cache
+first and only fall back to the ``Member`` row for members the cache does not
+know about, e.g. when each worker runs its own local-memory cache.
+"""
+
+import atexit
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+CACHE_KEY_PREFIX = 'presence:member:'
+
+_lock = threading.Lock()
+_pending = {}
+_last_flush = time.monotonic()
+_timer = None
+
+# Members stamped per UPDATE statement
+FLUSH_BATCH_SIZE = 500
+
+
+def _online_timeout():
+    """Seconds of inactivity after which a member is considered offline"""
+    return getattr(settings, 'PRESENCE_ONLINE_TIMEOUT', 300)
+
+
+def _flush_interval():
+    """Seconds to coalesce heartbeats before writing them to the database"""
+    return getattr(settings, 'PRESENCE_FLUSH_INTERVAL', 60)
+
+
+def _cache_key(member_id):
+    return f'{CACHE_KEY_PREFIX}{member_id}'
+
+
+def record_heartbeat(member_id, now=None):
+    """
+    Record that a member is active right now.
+
+    The cache entry is refreshed on every call; the database is only written
+    when the coalescing window has elapsed.
+    """
+    global _last_flush
+
+    now = now or timezone.now()
+    cache.set(_cache_key(member_id), now, _online_timeout())
+
+    with _lock:
+        _pending[member_id] = now
+        due = time.monotonic() - _last_flush >= _flush_interval()
+        if not due:
+            _schedule_flush()
+
+    if due:
+        flush()
+
+
+def _schedule_flush():
+    """Start the flush timer if it is not running; call with ``_lock`` held"""
+    global _timer
+
+    if _timer is None:
+        _timer = threading.Timer(_flush_interval(), _flush_from_timer)
+        _timer.daemon = True
+        _timer.start()
+
+
+def _flush_from_timer():
+    global _timer
+
+    with _lock:
+        _timer = None
+    try:
+        flush()
+    finally:
+        # The timer thread opened its own database connection
+        connections.close_all()
+
+
+def flush():
+    """
+    Write buffered heartbeats to the database, one UPDATE per
+    ``FLUSH_BATCH_SIZE`` members.
+
+    Every member is stamped with their own latest heartbeat time.
+
+    Returns:
+        int: Number of member rows updated
+    """
+    global _last_flush
+
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+
+    if not pending:
+        return 0
+
+    from members.models import Member
+
+    updated = 0
+    items = list(pending.items())
+    for start in range(0, len(items), FLUSH_BATCH_SIZE):
+        batch = items[start:start + FLUSH_BATCH_SIZE]
+        seen_at = Case(
+            *[When(id=member_id, then=Value(timestamp)) for member_id, timestamp in batch],
+            output_field=DateTimeField()
+        )
+        updated += Member.objects.filter(id__in=[member_id for member_id, _ in batch]).update(
+            is_online=True,
+            last_activity=seen_at,
+            last_seen=seen_at
+        )
+    return updated
+
+
+atexit.register(flush)
+
+
+def last_seen(member_ids):
+    """
+    Return the last heartbeat time recorded in the cache for each member.
+
+    Members without a cached heartbeat are left out of the result.
+    """
+    hits = cache.get_many([_cache_key(member_id) for member_id in member_ids])
+    return {int(key[len(CACHE_KEY_PREFIX):]): seen_at for key, seen_at in hits.items()}
+
+
+def online_member_ids(member_ids):
+    """
+    Return the subset of ``member_ids`` that are currently online.
+
+    Cache hits are trusted as-is. Members missing from the cache are checked
+    against their ``Member`` row in a single query.
+    """
+    member_ids = set(member_ids)
+    if not member_ids:
+        return set()
+
+    online = set(last_seen(member_ids))
+
+    with _lock:
+        online.update(member_id for member_id in _pending if member_id in member_ids)
+
+    missing = member_ids - online
+    if missing:
+        from members.models import Member
+
+        cutoff = timezone.now() - timedelta(seconds=_online_timeout())
+        online.update(
+            Member.objects.filter(
+                id__in=missing,
+                is_online=True,
+                last_activity__gte=cutoff
+            ).values_list('id', flat=True)
+        )
+
+    return online
+
+
+def is_online(member_id):
+    """Check whether a single member is currently online"""
+    return member_id in online_member_ids([member_id])
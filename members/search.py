@@ -0,0 +1,273 @@
+"""
+Full-text search over members.
+
+Each member has one row in a search index holding their name and their
+identifying numbers (member number, national ID and phone number in the
+forms people type it). The index lives outside the ORM because its shape
+depends on the database:
+
+* SQLite: an FTS5 table ranked with bm25, plus an ``fts5vocab`` table that
+  supplies close spellings when a word has no match.
+* PostgreSQL: a table with a ``tsvector`` ranked with ``ts_rank`` and a
+  ``pg_trgm`` index for close spellings.
+* Anything else: ``icontains`` lookups, unranked.
+
+Rows are kept current by ``members.signals`` and can be rebuilt with
+``manage.py reindex_members``.
+"""
+
+import difflib
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import Member
+
+TABLE = 'members_search'
+VOCAB_TABLE = 'members_search_vocab'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+# Spaces and dashes inside a number, as in "0712 345 678"
+DIGIT_SEPARATOR_RE = re.compile(r'(?<=\d)[\s-]+(?=\d)')
+# Words shorter than this are only matched as prefixes, never respelled
+MIN_FUZZY_LENGTH = 4
+FUZZY_CUTOFF = 0.75
+FUZZY_ALTERNATIVES = 3
+
+
+def phone_forms(phone_number):
+    """The ways a Kenyan phone number is commonly written, digits only"""
+    digits = re.sub(r'\D', '', phone_number or '')
+    if not digits:
+        return []
+    forms = {digits}
+    if digits.startswith('254') and len(digits) > 9:
+        local = digits[3:]
+        forms.update({local, '0' + local})
+    elif digits.startswith('0'):
+        forms.update({digits[1:], '254' + digits[1:]})
+    return sorted(forms)
+
+
+def search_document(first_name, last_name, username, member_number, national_id, phone_number):
+    """
+    The indexed text for a member.
+
+    Returns:
+        tuple: ``(name, numbers)`` column values
+    """
+    name = ' '.join(part for part in (first_name, last_name, username) if part)
+    numbers = ' '.join([member_number or '', national_id or '', *phone_forms(phone_number)]).strip()
+    return name, numbers
+
+
+def member_document(member):
+    user = member.user
+    return search_document(
+        user.first_name, user.last_name, user.username,
+        member.member_number, member.national_id, member.phone_number
+    )
+
+
+def tokenize(query):
+    query = DIGIT_SEPARATOR_RE.sub('', query or '')
+    return [token.lower() for token in TOKEN_RE.findall(query)][:8]
+
+
+class SQLiteBackend:
+    """FTS5 index ranked with bm25; name matches weigh less than numbers"""
+
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+            f"name, numbers, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {VOCAB_TABLE} USING fts5vocab({TABLE}, 'row')")
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {VOCAB_TABLE}')
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    def upsert(self, cursor, rows):
+        rows = list(rows)
+        cursor.executemany(f'DELETE FROM {TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(f'INSERT INTO {TABLE} (rowid, name, numbers) VALUES (%s, %s, %s)', rows)
+
+    def delete(self, cursor, member_ids):
+        cursor.executemany(f'DELETE FROM {TABLE} WHERE rowid = %s', [(member_id,) for member_id in member_ids])
+
+    def clear(self, cursor):
+        cursor.execute(f'DELETE FROM {TABLE}')
+
+    def _close_terms(self, cursor, token):
+        """Indexed words spelled like ``token``, if nothing starts with it"""
+        # Candidates share the first letter, which keeps the vocabulary scan short
+        cursor.execute(
+            f'SELECT term FROM {VOCAB_TABLE} WHERE term >= %s AND term < %s',
+            [token[0], chr(ord(token[0]) + 1)]
+        )
+        terms = [term for (term,) in cursor.fetchall()]
+        if any(term.startswith(token) for term in terms):
+            return []
+        return difflib.get_close_matches(token, terms, FUZZY_ALTERNATIVES, FUZZY_CUTOFF)
+
+    def search(self, cursor, tokens, limit):
+        clauses = []
+        for token in tokens:
+            alternatives = [f'"{token}"*']
+            if len(token) >= MIN_FUZZY_LENGTH and not token.isdigit():
+                alternatives += [f'"{term}"' for term in self._close_terms(cursor, token)]
+            clauses.append('(' + ' OR '.join(alternatives) + ')')
+        cursor.execute(
+            f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s ORDER BY bm25({TABLE}, 1.0, 2.0) LIMIT %s',
+            [' AND '.join(clauses), limit]
+        )
+        return [member_id for (member_id,) in cursor.fetchall()]
+
+
+class PostgresBackend:
+    """tsvector index ranked with ts_rank, with pg_trgm similarity for misspellings"""
+
+    def create(self, cursor):
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+            f"member_id bigint PRIMARY KEY REFERENCES members_member (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            f"name text NOT NULL, numbers text NOT NULL, "
+            f"document tsvector GENERATED ALWAYS AS ("
+            f"setweight(to_tsvector('simple', numbers), 'A') || setweight(to_tsvector('simple', name), 'B')) STORED)"
+        )
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {TABLE}_document ON {TABLE} USING gin (document)')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {TABLE}_name_trgm ON {TABLE} USING gin (name gin_trgm_ops)')
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    def upsert(self, cursor, rows):
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (member_id, name, numbers) VALUES (%s, %s, %s) '
+            f'ON CONFLICT (member_id) DO UPDATE SET name = EXCLUDED.name, numbers = EXCLUDED.numbers',
+            list(rows)
+        )
+
+    def delete(self, cursor, member_ids):
+        cursor.execute(f'DELETE FROM {TABLE} WHERE member_id = ANY(%s)', [list(member_ids)])
+
+    def clear(self, cursor):
+        cursor.execute(f'TRUNCATE {TABLE}')
+
+    def search(self, cursor, tokens, limit):
+        prefix_query = ' & '.join(f"'{token}':*" for token in tokens)
+        text = ' '.join(tokens)
+        cursor.execute(
+            f"SELECT member_id FROM {TABLE}, to_tsquery('simple', %s) query "
+            f"WHERE document @@ query OR name %% %s "
+            f"ORDER BY ts_rank(document, query) + similarity(name, %s) DESC, member_id "
+            f"LIMIT %s",
+            [prefix_query, text, text, limit]
+        )
+        return [member_id for (member_id,) in cursor.fetchall()]
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'postgresql': PostgresBackend,
+}
+
+
+def get_backend(using=None):
+    """The index backend for a connection, or None when only ``icontains`` is available"""
+    backend = BACKENDS.get((using or connection).vendor)
+    return backend() if backend else None
+
+
+def _document_rows(members):
+    return [(member.id, *member_document(member)) for member in members]
+
+
+def index_members(member_ids):
+    """Write the index rows for members, removing any that no longer exist"""
+    backend = get_backend()
+    if backend is None:
+        return
+    member_ids = set(member_ids)
+    members = list(Member.objects.filter(id__in=member_ids).select_related('user'))
+    with connection.cursor() as cursor:
+        backend.upsert(cursor, _document_rows(members))
+        backend.delete(cursor, member_ids - {member.id for member in members})
+
+
+def remove_members(member_ids):
+    backend = get_backend()
+    if backend is not None:
+        with connection.cursor() as cursor:
+            backend.delete(cursor, member_ids)
+
+
+def rebuild_index(batch_size=2000):
+    """
+    Rebuild the whole index from the ``Member`` table.
+
+    Returns:
+        int: Number of members indexed
+    """
+    backend = get_backend()
+    if backend is None:
+        return 0
+    count = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        backend.create(cursor)
+        backend.clear(cursor)
+        members = Member.objects.select_related('user').order_by('id')
+        batch = []
+        for member in members.iterator(chunk_size=batch_size):
+            batch.append(member)
+            if len(batch) == batch_size:
+                backend.upsert(cursor, _document_rows(batch))
+                count += len(batch)
+                batch = []
+        backend.upsert(cursor, _document_rows(batch))
+        count += len(batch)
+    return count
+
+
+def search_members(query, queryset=None, limit=50):
+    """
+    Members matching a free-text query, best match first.
+
+    Every word must match the start of a name part, username, member number,
+    national ID or phone number. Words of four or more letters that start
+    no indexed word match close misspellings instead.
+
+    Args:
+        query: Text typed by the user
+        queryset: Members to search, all members by default
+        limit: Maximum number of members returned
+
+    Returns:
+        list: ``Member`` instances
+    """
+    tokens = tokenize(query)
+    if queryset is None:
+        queryset = Member.objects.all()
+    queryset = queryset.select_related('user', 'stage')
+    if not tokens:
+        return []
+
+    backend = get_backend()
+    if backend is None:
+        matches = Q()
+        for token in tokens:
+            matches &= (
+                Q(user__first_name__icontains=token) | Q(user__last_name__icontains=token)
+                | Q(member_number__icontains=token) | Q(national_id__icontains=token)
+                | Q(phone_number__icontains=token)
+            )
+        return list(queryset.filter(matches)[:limit])
+
+    with connection.cursor() as cursor:
+        # Over-fetch so that members filtered out by the queryset still leave a full page
+        member_ids = backend.search(cursor, tokens, limit * 4)
+    members = queryset.in_bulk(member_ids)
+    return [members[member_id] for member_id in member_ids if member_id in members][:limit]
@@ -0,0 +1,38 @@
+"""
+Django signals for the members app.
+Keep the member search index in step with members and their user names.
+"""
+
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Member
+from .search import index_members, remove_members
+
+SEARCHABLE_USER_FIELDS = {'first_name', 'last_name', 'username'}
+
+
+@receiver(post_save, sender=Member)
+def index_member(sender, instance, **kwargs):
+    """
+    Rewrite a member's search row in the same transaction as the save.
+    """
+    index_members([instance.id])
+
+
+@receiver(post_delete, sender=Member)
+def unindex_member(sender, instance, **kwargs):
+    remove_members([instance.id])
+
+
+@receiver(post_save, sender=User)
+def reindex_member_name(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Reindex the member behind a user whose name changed. Saves that only
+    touch other fields, such as ``last_login``, are skipped.
+    """
+    if created or (update_fields is not None and not SEARCHABLE_USER_FIELDS & set(update_fields)):
+        return
+    member_ids = list(Member.objects.filter(user_id=instance.id).values_list('id', flat=True))
+    if member_ids:
+        index_members(member_ids)
@@ -1,3 +1,255 @@
-from django.test import TestCase
+import csv
+import importlib
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
 
-# Create your tests here.
+from django.apps import apps
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from bodaboda_welfare.testing import create_member, make_members, make_stage
+from members import numbers, presence
+from members.importer import ImportFileError, REQUIRED_COLUMNS, import_members
+from members.models import Member, MemberNumberSequence
+from members.search import phone_forms, rebuild_index, search_members
+
+
+class PresenceFlushTests(TestCase):
+    def setUp(self):
+        presence.flush()
+
+    def test_flush_stamps_each_member_with_their_own_heartbeat(self):
+        first, second = make_members(2)
+        now = timezone.now()
+        earlier = now - timedelta(minutes=3)
+
+        presence.record_heartbeat(first.id, now=earlier)
+        presence.record_heartbeat(second.id, now=now)
+        self.assertEqual(presence.flush(), 2)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertTrue(first.is_online)
+        self.assertEqual(first.last_activity, earlier)
+        self.assertEqual(second.last_activity, now)
+
+    def test_flush_without_heartbeats_writes_nothing(self):
+        self.assertEqual(presence.flush(), 0)
+
+    def test_heartbeat_schedules_timer_flush(self):
+        member, = make_members(1)
+        with self.settings(PRESENCE_FLUSH_INTERVAL=3600):
+            presence.record_heartbeat(member.id)
+            self.assertIsNotNone(presence._timer)
+            timer = presence._timer
+            timer.cancel()
+            presence._timer = None
+        presence.flush()
+        self.assertTrue(Member.objects.get(id=member.id).is_online)
+
+
+def member_csv(*rows, encoding='utf-8'):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=REQUIRED_COLUMNS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return io.BytesIO(buffer.getvalue().encode(encoding))
+
+
+class MemberImportTests(TestCase):
+    def setUp(self):
+        self.stage = make_stage()
+
+    def row(self, national_id, **values):
+        row = {
+            'first_name': 'Juma', 'last_name': 'Otieno', 'national_id': national_id,
+            'phone_number': '0712 345 678', 'date_of_birth': '1990-01-31', 'address': 'Kibera',
+            'stage': self.stage.name, 'zone': 'North', 'next_of_kin_name': 'Achieng',
+            'next_of_kin_relationship': 'Wife', 'next_of_kin_phone': '254722000000', 'next_of_kin_id': '87654321',
+        }
+        row.update(values)
+        return row
+
+    def test_valid_rows_are_created(self):
+        result = import_members(member_csv(self.row('12345678'), self.row('12345679')), 'members.csv')
+        self.assertEqual((result.rows, result.created, result.errors), (2, 2, []))
+        member = Member.objects.get(national_id='12345678')
+        self.assertEqual((member.phone_number, member.next_of_kin_phone), ('+254712345678', '+254722000000'))
+        self.stage.refresh_from_db()
+        self.assertEqual(self.stage.member_count, 2)
+
+    def test_invalid_rows_are_reported_per_row(self):
+        result = import_members(member_csv(
+            self.row('12345678'),
+            self.row('12345679', phone_number='abc'),
+            self.row('12345680', next_of_kin_phone='07123'),
+            self.row('12345681', zone='Z' * 101),
+            self.row('12345678'),
+            self.row('1234', stage='Nowhere'),
+        ), 'members.csv')
+
+        self.assertEqual(result.created, 1)
+        errors = dict(result.errors)
+        self.assertEqual(sorted(errors), [3, 4, 5, 6, 7])
+        self.assertIn('phone number', errors[3])
+        self.assertIn('next of kin phone', errors[4])
+        self.assertIn('zone', errors[5])
+        self.assertIn('appears earlier', errors[6])
+        self.assertIn('8 digits', errors[7])
+        self.assertEqual(result.failed_rows[3]['phone_number'], 'abc')
+        self.assertEqual(Member.objects.count(), 1)
+
+    def test_file_that_is_not_utf8_imports_nothing(self):
+        rows = [self.row(str(12345678 + i)) for i in range(3)]
+        rows[-1]['address'] = 'Kisumu — Kondele'
+        with self.assertRaises(ImportFileError):
+            import_members(member_csv(*rows, encoding='cp1252'), 'members.csv', batch_size=1)
+        self.assertFalse(Member.objects.exists())
+
+    def test_corrupt_workbook_raises_import_file_error(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zipped:
+            zipped.writestr('notes.txt', 'not a workbook')
+        for content in (b'national_id\n12345678\n', archive.getvalue()):
+            with self.assertRaises(ImportFileError):
+                import_members(io.BytesIO(content), 'members.xlsx')
+        self.assertFalse(Member.objects.exists())
+
+    def test_command_writes_failed_rows_with_their_values(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        source = os.path.join(directory, 'members.csv')
+        report = os.path.join(directory, 'errors.csv')
+        with open(source, 'wb') as fileobj:
+            fileobj.write(member_csv(self.row('12345678'), self.row('12345679', phone_number='abc')).getvalue())
+
+        call_command('import_members', source, errors=report, stdout=io.StringIO())
+        with open(report, newline='', encoding='utf-8') as fileobj:
+            failed = list(csv.DictReader(fileobj))
+        self.assertEqual(len(failed), 1)
+        self.assertEqual((failed[0]['row'], failed[0]['national_id'], failed[0]['phone_number']), ('3', '12345679', 'abc'))
+
+        with open(source, 'wb') as fileobj:
+            fileobj.write(b'first_name,national_id\nJ\xfcma,12345670\n')
+        with self.assertRaises(CommandError):
+            call_command('import_members', source, stdout=io.StringIO())
+
+
+class MemberSearchTests(TestCase):
+    def setUp(self):
+        self.stage = make_stage()
+        self.juma = self.member('Juma', 'Otieno', '+254712345678')
+        self.wanjiku = self.member('Wanjiku', 'Kamau', '+254798765432')
+
+    def member(self, first_name, last_name, phone_number):
+        member = create_member(self.stage, phone_number=phone_number)
+        member.user.first_name, member.user.last_name = first_name, last_name
+        member.user.save()
+        return member
+
+    def assertFound(self, query, *members):
+        self.assertEqual([member.id for member in search_members(query)], [member.id for member in members], query)
+
+    def test_phone_forms(self):
+        self.assertEqual(phone_forms('+254 712-345678'), ['0712345678', '254712345678', '712345678'])
+        self.assertEqual(phone_forms(''), [])
+
+    def test_matches_names_numbers_and_misspellings(self):
+        self.assertFound('jum', self.juma)
+        self.assertFound('juma otieno', self.juma)
+        self.assertFound('0712 345 678', self.juma)
+        self.assertFound(self.wanjiku.national_id, self.wanjiku)
+        self.assertFound('Otieon', self.juma)
+        self.assertFound('juma kamau')
+        self.assertFound('')
+
+    def test_index_follows_renames_deletes_and_rebuilds(self):
+        self.juma.user.first_name = 'Baraka'
+        self.juma.user.save()
+        self.assertFound('juma')
+        self.assertFound('baraka', self.juma)
+
+        self.wanjiku.delete()
+        self.assertFound('wanjiku')
+
+        self.assertEqual(rebuild_index(), 1)
+        self.assertFound('baraka', self.juma)
+
+    def test_queryset_limits_results(self):
+        self.assertEqual(search_members('juma', queryset=Member.objects.exclude(id=self.juma.id)), [])
+
+
+def next_sequence_value(name=numbers.GLOBAL_SEQUENCE):
+    return MemberNumberSequence.objects.filter(name=name).values_list('next_value', flat=True).first()
+
+
+class MemberNumberTests(TestCase):
+    def setUp(self):
+        MemberNumberSequence.objects.all().delete()
+
+    def test_allocation_in_transaction_reserves_single_value(self):
+        with self.settings(MEMBER_NUMBER_BLOCK_SIZE=20):
+            self.assertEqual(numbers.allocate_member_number(), 'KWS000001')
+            self.assertEqual(numbers.allocate_member_number(), 'KWS000002')
+        self.assertEqual(next_sequence_value(), 3)
+        self.assertNotIn(numbers.GLOBAL_SEQUENCE, numbers._blocks)
+
+    def test_bulk_allocation_uses_one_reservation(self):
+        numbers.allocate_member_number()
+        with CaptureQueriesContext(connection) as queries:
+            allocated = numbers.allocate_member_numbers(3)
+        self.assertEqual(allocated, ['KWS000002', 'KWS000003', 'KWS000004'])
+        updates = [query for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(next_sequence_value(), 5)
+
+    def test_organization_scope_numbers_each_organization_separately(self):
+        with self.settings(MEMBER_NUMBER_SCOPE='organization', MEMBER_NUMBER_PREFIX='BB', MEMBER_NUMBER_DIGITS=4):
+            self.assertEqual(numbers.allocate_member_number(7), 'BB7-0001')
+            self.assertEqual(numbers.allocate_member_numbers(2, organization_id=7), ['BB7-0002', 'BB7-0003'])
+            self.assertEqual(numbers.allocate_member_number(8), 'BB8-0001')
+            self.assertEqual(numbers.allocate_member_number(), 'BB0001')
+        self.assertEqual(next_sequence_value('member:organization:7'), 4)
+        # The global scope ignores the organization
+        self.assertEqual(numbers.format_member_number(5, organization_id=7), 'KWS000005')
+
+    def test_migration_seeds_above_existing_numbers(self):
+        stage = make_stage()
+        for number in ('KWS000120', 'KWS000095', 'KWS7-000900', 'KWSX', 'ABC000500'):
+            create_member(stage, member_number=number)
+        migration = importlib.import_module('members.migrations.0009_membernumbersequence')
+
+        migration.seed_member_sequence(apps, None)
+        self.assertEqual(next_sequence_value(), 121)
+        self.assertEqual(numbers.allocate_member_number(), 'KWS000121')
+
+        with self.settings(MEMBER_NUMBER_PREFIX='ABC'):
+            migration.seed_member_sequence(apps, None)
+        self.assertEqual(next_sequence_value(), 501)
+
+
+class MemberNumberBlockTests(TransactionTestCase):
+    """Blocks are only used outside transactions, so these tests commit"""
+
+    def setUp(self):
+        numbers._blocks.clear()
+        self.addCleanup(numbers._blocks.clear)
+
+    def test_numbers_are_handed_out_from_reserved_block(self):
+        with self.settings(MEMBER_NUMBER_BLOCK_SIZE=3):
+            first = numbers.allocate_member_number()
+            self.assertEqual(next_sequence_value(), 4)
+            with self.assertNumQueries(0):
+                rest = [numbers.allocate_member_number(), numbers.allocate_member_number()]
+            self.assertEqual([first, *rest], ['KWS000001', 'KWS000002', 'KWS000003'])
+
+            # The exhausted block is replaced by the next one
+            self.assertEqual(numbers.allocate_member_number(), 'KWS000004')
+            self.assertEqual(next_sequence_value(), 7)
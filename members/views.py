@@ -2,9 +2,13 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
+from django.conf import settings
 from django.http import JsonResponse
 from .models import Member, MemberDocument
+from .numbers import allocate_member_number
+from .search import search_members
 from stages.models import Stage
+from stages.spatial import nearest_stages
 
 @login_required
 def member_list(request):
@@ -33,8 +37,8 @@ def member_profile(request):
     context = {'member': member}
     return render(request, 'members/profile.html', context)
 
-def create_new_stage(stage_name):
-    """Create a new stage with user-provided name"""
+def create_new_stage(stage_name, latitude=None, longitude=None):
+    """Create a new stage with user-provided name and optional GPS position"""
     from datetime import datetime
     from stages.models import Organization
     
@@ -67,11 +71,24 @@ def create_new_stage(stage_name):
         ward='Not Specified',
         registration_date=datetime.now().date(),
         description=f'User-created stage: {stage_name}',
+        latitude=latitude,
+        longitude=longitude,
         is_active=True
     )
     
     return stage
 
+def stage_position(data):
+    """The GPS position posted with a stage, or ``(None, None)``"""
+    try:
+        latitude = float(data.get('stage_latitude', ''))
+        longitude = float(data.get('stage_longitude', ''))
+    except ValueError:
+        return None, None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None, None
+    return round(latitude, 7), round(longitude, 7)
+
 @login_required
 def profile_setup(request):
     """Setup member profile for new users or update existing profile"""
@@ -170,14 +187,18 @@ def profile_setup(request):
                         stage = create_new_stage(stage_name)
                         messages.success(request, f'New stage "{stage_name}" has been created and will be available for other users.')
                 else:
-                    # New stage - check if it already exists by name
+                    # New stage - check if it already exists by name, then by position
+                    latitude, longitude = stage_position(request.POST)
                     existing_stage = Stage.objects.filter(name__iexact=stage_name).first()
+                    if not existing_stage and latitude is not None:
+                        nearby = nearest_stages(latitude, longitude, 1, settings.STAGES_MATCH_RADIUS_KM)
+                        existing_stage = nearby[0] if nearby else None
                     if existing_stage:
                         stage = existing_stage
                         messages.info(request, f'Found existing stage: "{stage.name}"')
                     else:
                         # Create completely new stage
-                        stage = create_new_stage(stage_name)
+                        stage = create_new_stage(stage_name, latitude, longitude)
                         messages.success(request, f'New stage "{stage_name}" has been created and will be available for other users.')
             
             if existing_member:
@@ -211,10 +232,7 @@ def profile_setup(request):
                 
             else:
                 # Generate member number for new member
-                import random
-                member_number = f"KWS{random.randint(1000, 9999)}"
-                while Member.objects.filter(member_number=member_number).exists():
-                    member_number = f"KWS{random.randint(1000, 9999)}"
+                member_number = allocate_member_number(stage.organization_id)
                 
                 # Create new member profile
                 member = Member.objects.create(
@@ -291,12 +309,8 @@ def member_documents(request):
 @login_required
 def member_search(request):
     """Search members"""
-    query = request.GET.get('q', '')
-    members = []
-    if query:
-        members = Member.objects.filter(
-            user__first_name__icontains=query
-        ).select_related('user', 'stage')
+    query = request.GET.get('q', '').strip()
+    members = search_members(query, limit=settings.MEMBER_SEARCH_LIMIT) if query else []
     context = {'members': members, 'query': query}
     return render(request, 'members/search.html', context)
 
@@ -0,0 +1,128 @@
+"""
+Management command to benchmark the payments dashboard.
+"""
+
+import random
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.utils import timezone
+from bodaboda_welfare.benchmarking import format_timing, rolled_back, timed
+from bodaboda_welfare.testing import make_members
+from payments.models import DigitalToken, EWallet, PaymentMethod, PaymentTransaction, WalletTransaction
+from payments.summary import CACHE_KEY_PREFIX, dashboard
+from payments.tokens import issue_tokens
+from payments.wallet import generate_transaction_id
+
+
+def legacy_dashboard(member):
+    """The queries the dashboard view and template used to run"""
+    ewallet, _ = EWallet.objects.get_or_create(member=member, defaults={'wallet_id': f'KW{member.id:06d}'})
+    recent_transactions = list(WalletTransaction.objects.filter(wallet=ewallet)[:5])
+    recent_payments = list(PaymentTransaction.objects.filter(member=member)[:5])
+    active_tokens = DigitalToken.objects.filter(
+        member=member, status='active', expiry_date__gt=timezone.now()
+    )[:5]
+    # The template counted the tokens, then listed them
+    token_count = active_tokens.count()
+    active_tokens = list(active_tokens)
+    payment_methods = [
+        (method, method.provider) for method in PaymentMethod.objects.filter(member=member, is_active=True)
+    ]
+    total_deposits = WalletTransaction.objects.filter(
+        wallet=ewallet, transaction_type='deposit', status='completed'
+    ).aggregate(total=Sum('amount'))['total'] or 0
+    total_payments = PaymentTransaction.objects.filter(
+        member=member, status='completed'
+    ).aggregate(total=Sum('amount'))['total'] or 0
+    return (ewallet, recent_transactions, recent_payments, token_count, active_tokens,
+            payment_methods, total_deposits, total_payments)
+
+
+class Command(BaseCommand):
+    help = 'Compare the old dashboard queries with the aggregated, cached dashboard (all data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--members',
+            type=int,
+            default=50,
+            help='Number of members to create (default: 50)'
+        )
+        parser.add_argument(
+            '--transactions',
+            type=int,
+            default=200,
+            help='Wallet and payment transactions per member (default: 200)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=200,
+            help='Dashboard loads to time (default: 200)'
+        )
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        per_member = options['transactions']
+        wallet_types = ['deposit', 'withdrawal', 'transfer_in', 'transfer_out', 'payment']
+        payment_types = [choice for choice, _ in PaymentTransaction.TRANSACTION_TYPES]
+        
+        with rolled_back():
+            members = make_members(options['members'])
+            EWallet.objects.bulk_create([
+                EWallet(member=member, wallet_id=f'BW{member.id:08d}') for member in members
+            ])
+            wallets = EWallet.objects.filter(member__in=members)
+            WalletTransaction.objects.bulk_create([
+                WalletTransaction(
+                    wallet=ewallet,
+                    transaction_id=generate_transaction_id('BWT'),
+                    transaction_type=random.choice(wallet_types),
+                    amount=Decimal(random.randint(10, 5000)),
+                    status=random.choice(['completed', 'completed', 'pending']),
+                    description='Benchmark',
+                    balance_before=0,
+                    balance_after=0
+                )
+                for ewallet in wallets for _ in range(per_member)
+            ], batch_size=2000)
+            PaymentTransaction.objects.bulk_create([
+                PaymentTransaction(
+                    member=member,
+                    transaction_id=generate_transaction_id('BPT'),
+                    transaction_type=random.choice(payment_types),
+                    amount=Decimal(random.randint(10, 5000)),
+                    status=random.choice(['completed', 'completed', 'initiated']),
+                    description='Benchmark'
+                )
+                for member in members for _ in range(per_member)
+            ], batch_size=2000)
+            issue_tokens([member.id for member in members], 'fuel_voucher', quantity=3)
+            
+            def pick():
+                return random.choice(members)
+            
+            def cold():
+                member = pick()
+                cache.delete(f'{CACHE_KEY_PREFIX}{member.id}')
+                dashboard(member)
+            
+            results = [
+                ('Before (separate queries)', timed(lambda: legacy_dashboard(pick()), repeat)),
+                ('After, cache miss', timed(cold, repeat)),
+                ('After, cache hit', timed(lambda: dashboard(pick()), repeat)),
+            ]
+            
+            # The rows are rolled back, so their dashboards must not outlive them
+            cache.delete_many([f'{CACHE_KEY_PREFIX}{member.id}' for member in members])
+        
+        for label, result in results:
+            self.stdout.write(format_timing(label, result))
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Benchmarked {repeat} dashboard loads over {len(members)} members '
+            f'with {per_member} wallet and payment transactions each'
+        ))
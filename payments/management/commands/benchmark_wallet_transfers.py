@@ -0,0 +1,65 @@
+"""
+Management command to benchmark wallet transfers.
+"""
+
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from bodaboda_welfare.benchmarking import format_timing, rolled_back, timed
+from bodaboda_welfare.testing import make_members
+from payments.models import EWallet
+from payments.wallet import post_transfers, transfer
+
+
+class Command(BaseCommand):
+    help = 'Compare one-at-a-time wallet transfers with batched postings (all data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--wallets',
+            type=int,
+            default=100,
+            help='Number of wallets to create (default: 100)'
+        )
+        parser.add_argument(
+            '--transfers',
+            type=int,
+            default=500,
+            help='Number of transfers to post in each run (default: 500)'
+        )
+
+    def handle(self, *args, **options):
+        wallet_count = max(options['wallets'], 2)
+        transfer_count = options['transfers']
+        
+        with rolled_back():
+            members = make_members(wallet_count)
+            EWallet.objects.bulk_create([
+                EWallet(member=member, wallet_id=f'BW{member.id:08d}', balance=Decimal('1000000.00'))
+                for member in members
+            ])
+            wallets = list(EWallet.objects.filter(member__in=members).order_by('id'))
+            pairs = [
+                (wallets[i % wallet_count], wallets[(i + 1) % wallet_count])
+                for i in range(transfer_count)
+            ]
+            
+            single = timed(lambda: [
+                transfer(sender, recipient, Decimal('10.00'), 'Benchmark transfer')
+                for sender, recipient in pairs
+            ])
+            batched = timed(lambda: post_transfers([
+                (sender.id, recipient.id, Decimal('10.00'), 'Benchmark transfer')
+                for sender, recipient in pairs
+            ], reference='BENCHMARK'))
+        
+        for label, result in (('Single transfers', single), ('Batched transfers', batched)):
+            rate = transfer_count / (result['total_ms'] / 1000) if result['total_ms'] else 0
+            self.stdout.write(format_timing(label, result))
+            self.stdout.write(
+                f'  {result["queries"] / max(transfer_count, 1):.1f} queries/transfer, {rate:.0f} transfers/s'
+            )
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Benchmarked {transfer_count} transfers across {wallet_count} wallets'
+        ))
@@ -0,0 +1,91 @@
+"""
+Management command to issue digital tokens to every member of a stage or organization.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from members.models import Member
+from payments.models import DigitalToken
+from payments.tokens import TOKEN_PRICES, TOKEN_VALIDITY_DAYS, issue_tokens
+
+
+class Command(BaseCommand):
+    help = 'Issue digital tokens (e.g. fuel vouchers) to all active members of a stage or organization'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'token_type',
+            choices=[choice for choice, _ in DigitalToken.TOKEN_TYPES],
+            help='Type of token to issue'
+        )
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument(
+            '--stage',
+            type=int,
+            help='Issue to the members of this stage id'
+        )
+        target.add_argument(
+            '--organization',
+            type=int,
+            help='Issue to the members of every stage in this organization id'
+        )
+        parser.add_argument(
+            '--quantity',
+            type=int,
+            default=1,
+            help='Tokens per member (default: 1)'
+        )
+        parser.add_argument(
+            '--value',
+            help='Face value of each token (default: the token price)'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=TOKEN_VALIDITY_DAYS,
+            help=f'Days until the tokens expire (default: {TOKEN_VALIDITY_DAYS})'
+        )
+        parser.add_argument(
+            '--issuer',
+            default='',
+            help='Issuer name stored on the tokens'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Tokens written per batch (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        token_type = options['token_type']
+        if options['value'] is None and token_type not in TOKEN_PRICES:
+            raise CommandError(f'{token_type} has no default price, pass --value')
+        
+        members = Member.objects.filter(status='active')
+        if options['stage']:
+            members = members.filter(stage_id=options['stage'])
+        else:
+            members = members.filter(stage__organization_id=options['organization'])
+        member_ids = list(members.values_list('id', flat=True))
+        
+        if not member_ids:
+            self.stdout.write(self.style.WARNING('No active members found'))
+            return
+        
+        def progress(issued, total):
+            self.stdout.write(f'Issued {issued}/{total} tokens')
+        
+        issued = issue_tokens(
+            member_ids,
+            token_type,
+            quantity=options['quantity'],
+            value=options['value'],
+            days=options['days'],
+            issuer=options['issuer'],
+            batch_size=options['batch_size'],
+            progress=progress
+        )
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Issued {issued} {token_type} tokens to {len(member_ids)} members'
+        ))
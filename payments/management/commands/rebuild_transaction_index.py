@@ -0,0 +1,33 @@
+"""
+Management command to rebuild or verify the transaction id registry.
+"""
+
+from django.core.management.base import BaseCommand
+from payments.registry import check_transaction_index, rebuild_transaction_index
+
+
+class Command(BaseCommand):
+    help = 'Index wallet, payment and mobile money transactions missing from the transaction registry'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report missing and stale registry rows, without changing them'
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            missing, stale = check_transaction_index()
+            if missing or stale:
+                self.stdout.write(self.style.ERROR(
+                    f'{missing} transactions are not indexed and {stale} index rows are stale'
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS('The transaction index is consistent'))
+            return
+
+        added, removed = rebuild_transaction_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt the transaction index ({added} rows added, {removed} stale rows removed)'
+        ))
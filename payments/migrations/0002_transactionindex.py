@@ -0,0 +1,62 @@
+# Generated by Django 5.2.4 on 2026-10-17 15:42
+
+import heapq
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_index(apps, schema_editor):
+    """
+    Index existing transactions of all kinds in one time-ordered pass, so that
+    index ids (which statements page on) follow created_at across kinds.
+    """
+    TransactionIndex = apps.get_model('payments', 'TransactionIndex')
+    sources = [
+        ('wallet', apps.get_model('payments', 'WalletTransaction'), 'wallet__member_id', 'created_at'),
+        ('payment', apps.get_model('payments', 'PaymentTransaction'), 'member_id', 'initiated_at'),
+        ('mobile_money', apps.get_model('payments', 'MobileMoneyTransaction'), 'wallet__member_id', 'initiated_at'),
+    ]
+
+    def rows(kind, model, member_field, created_field):
+        queryset = model.objects.values_list(created_field, 'pk', 'transaction_id', member_field).order_by(created_field, 'pk')
+        for created_at, pk, transaction_id, member_id in queryset.iterator(chunk_size=2000):
+            yield created_at, kind, pk, transaction_id, member_id
+
+    batch = []
+    merged = heapq.merge(*(rows(*source) for source in sources), key=lambda row: row[:3])
+    for created_at, kind, pk, transaction_id, member_id in merged:
+        batch.append(TransactionIndex(
+            kind=kind, object_id=pk, transaction_id=transaction_id, member_id=member_id, created_at=created_at
+        ))
+        if len(batch) == 1000:
+            TransactionIndex.objects.bulk_create(batch)
+            batch = []
+    TransactionIndex.objects.bulk_create(batch)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0007_memberprofile'),
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_id', models.CharField(db_index=True, max_length=50)),
+                ('kind', models.CharField(choices=[('wallet', 'Wallet Transaction'), ('payment', 'Payment Transaction'), ('mobile_money', 'Mobile Money Transaction')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('created_at', models.DateTimeField()),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transaction_index', to='members.member')),
+            ],
+            options={
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['member', '-id'], name='payments_txindex_member_id')],
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.RunPython(populate_index, migrations.RunPython.noop),
+    ]
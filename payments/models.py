@@ -58,36 +58,17 @@ class EWallet(models.Model):
     
     def add_funds(self, amount, description=""):
         """Add funds to wallet"""
-        self.balance += Decimal(str(amount))
-        self.total_deposits += Decimal(str(amount))
-        self.save()
-        
-        # Create transaction record
-        WalletTransaction.objects.create(
-            wallet=self,
-            transaction_type='deposit',
-            amount=amount,
-            description=description,
-            balance_after=self.balance
-        )
+        from .wallet import credit
+        return credit(self, amount, description)
     
     def deduct_funds(self, amount, description=""):
         """Deduct funds from wallet"""
-        if self.balance >= Decimal(str(amount)):
-            self.balance -= Decimal(str(amount))
-            self.total_withdrawals += Decimal(str(amount))
-            self.save()
-            
-            # Create transaction record
-            WalletTransaction.objects.create(
-                wallet=self,
-                transaction_type='withdrawal',
-                amount=amount,
-                description=description,
-                balance_after=self.balance
-            )
-            return True
-        return False
+        from .wallet import InsufficientFunds, debit
+        try:
+            debit(self, amount, description)
+        except InsufficientFunds:
+            return False
+        return True
 
 class WalletTransaction(models.Model):
     """
@@ -370,3 +351,30 @@ class PaymentTransaction(models.Model):
     
     def __str__(self):
         return f"{self.transaction_id} - {self.get_transaction_type_display()} (KES {self.amount})"
+
+class TransactionIndex(models.Model):
+    """
+    Registry of every transaction id across the wallet, payment and mobile
+    money tables, so any transaction resolves with one indexed lookup
+    """
+    KIND_CHOICES = [
+        ('wallet', 'Wallet Transaction'),
+        ('payment', 'Payment Transaction'),
+        ('mobile_money', 'Mobile Money Transaction'),
+    ]
+    
+    transaction_id = models.CharField(max_length=50, db_index=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='transaction_index')
+    object_id = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['-id']
+        unique_together = ['kind', 'object_id']
+        indexes = [
+            models.Index(fields=['member', '-id'], name='payments_txindex_member_id'),
+        ]
+    
+    def __str__(self):
+        return f"{self.transaction_id} ({self.get_kind_display()})"
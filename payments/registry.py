@@ -0,0 +1,202 @@
+"""
+Transaction id registry.
+
+``TransactionIndex`` maps every wallet, payment and mobile money transaction
+id to its kind, owning member and primary key. Rows are added when a
+transaction is created (by signal, or in bulk by the wallet engine), which
+lets ``resolve`` find any transaction with a single indexed query and lets
+``statement`` page through a member's transactions of all kinds with keyset
+pagination on the index id.
+"""
+
+import heapq
+
+from django.db.models import Q
+
+from .models import EWallet, MobileMoneyTransaction, PaymentTransaction, TransactionIndex, WalletTransaction
+
+KIND_MODELS = {
+    'wallet': WalletTransaction,
+    'payment': PaymentTransaction,
+    'mobile_money': MobileMoneyTransaction,
+}
+
+# Owning member and creation time lookups of each kind, for bulk indexing
+KIND_FIELDS = {
+    'wallet': ('wallet__member_id', 'created_at'),
+    'payment': ('member_id', 'initiated_at'),
+    'mobile_money': ('wallet__member_id', 'initiated_at'),
+}
+
+
+def kind_for(instance):
+    for kind, model in KIND_MODELS.items():
+        if isinstance(instance, model):
+            return kind
+    raise ValueError(f'{type(instance).__name__} is not an indexed transaction type')
+
+
+def owner_id(instance):
+    """Id of the member a transaction belongs to"""
+    if isinstance(instance, PaymentTransaction):
+        return instance.member_id
+    if type(instance).wallet.is_cached(instance):
+        return instance.wallet.member_id
+    # Look up only the owner rather than loading the whole wallet
+    return EWallet.objects.filter(pk=instance.wallet_id).values_list('member_id', flat=True).first()
+
+
+def index_entry(instance, member_id=None):
+    """Build (without saving) the index row for a transaction"""
+    return TransactionIndex(
+        transaction_id=instance.transaction_id,
+        kind=kind_for(instance),
+        member_id=member_id or owner_id(instance),
+        object_id=instance.pk,
+        created_at=getattr(instance, 'created_at', None) or instance.initiated_at
+    )
+
+
+def register(instance, member_id=None):
+    entry = index_entry(instance, member_id)
+    return TransactionIndex.objects.get_or_create(
+        kind=entry.kind,
+        object_id=entry.object_id,
+        defaults={
+            'transaction_id': entry.transaction_id,
+            'member_id': entry.member_id,
+            'created_at': entry.created_at,
+        }
+    )[0]
+
+
+def register_many(entries):
+    """Index many transactions at once; ``entries`` are ``(instance, member_id)`` pairs"""
+    return TransactionIndex.objects.bulk_create(
+        [index_entry(instance, member_id) for instance, member_id in entries],
+        batch_size=1000
+    )
+
+
+def resolve(transaction_id, member=None):
+    """
+    Find a transaction by id.
+
+    Returns:
+        tuple: ``(kind, transaction)``, or ``(None, None)`` if there is no
+        such transaction (or it belongs to another member)
+    """
+    entries = TransactionIndex.objects.filter(transaction_id=transaction_id)
+    if member is not None:
+        entries = entries.filter(member=member)
+    entry = entries.first()
+    if entry is None:
+        return None, None
+    transaction = KIND_MODELS[entry.kind].objects.filter(pk=entry.object_id).first()
+    return (entry.kind, transaction) if transaction else (None, None)
+
+
+def statement(member, before=None, limit=20, kinds=None):
+    """
+    One page of a member's transactions of every kind, newest first.
+
+    Args:
+        member: The member whose transactions to list
+        before (int): Cursor returned by the previous page
+        limit (int): Page size
+        kinds: Optional iterable restricting the transaction kinds
+
+    Returns:
+        tuple: ``(entries, next_cursor)``. Each entry has the underlying
+        transaction attached as ``entry.transaction``; ``next_cursor`` is
+        None on the last page.
+    """
+    entries = TransactionIndex.objects.filter(member=member)
+    if kinds:
+        entries = entries.filter(kind__in=kinds)
+    if before:
+        entries = entries.filter(id__lt=before)
+    entries = list(entries.order_by('-id')[:limit + 1])
+
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = entries[-1].id
+
+    # One query per kind present on the page
+    by_kind = {}
+    for entry in entries:
+        by_kind.setdefault(entry.kind, []).append(entry.object_id)
+    objects = {
+        (kind, obj.pk): obj
+        for kind, ids in by_kind.items()
+        for obj in KIND_MODELS[kind].objects.filter(pk__in=ids)
+    }
+    for entry in entries:
+        entry.transaction = objects.get((entry.kind, entry.object_id))
+
+    return [entry for entry in entries if entry.transaction is not None], next_cursor
+
+
+def _missing_rows(kind):
+    member_field, created_field = KIND_FIELDS[kind]
+    indexed = TransactionIndex.objects.filter(kind=kind).values('object_id')
+    queryset = (
+        KIND_MODELS[kind].objects.exclude(pk__in=indexed)
+        .values_list(created_field, 'pk', 'transaction_id', member_field)
+        .order_by(created_field, 'pk')
+    )
+    for created_at, pk, transaction_id, member_id in queryset.iterator(chunk_size=2000):
+        yield created_at, kind, pk, transaction_id, member_id
+
+
+def missing_entries():
+    """
+    Transactions that have no index row, oldest first across all kinds.
+
+    Rows are merged on ``(created_at, kind, pk)``, the order the migration
+    backfill uses, so index ids follow time whichever of the two wrote them.
+
+    Yields:
+        tuple: ``(created_at, kind, pk, transaction_id, member_id)``
+    """
+    return heapq.merge(*(_missing_rows(kind) for kind in KIND_MODELS), key=lambda row: row[:3])
+
+
+def stale_entries():
+    """Index rows whose transaction no longer exists"""
+    stale = Q()
+    for kind, model in KIND_MODELS.items():
+        stale |= Q(kind=kind) & ~Q(object_id__in=model.objects.values('pk'))
+    return TransactionIndex.objects.filter(stale)
+
+
+def rebuild_transaction_index():
+    """
+    Add index rows for unindexed transactions and drop rows whose
+    transaction no longer exists.
+
+    Returns:
+        tuple: ``(added, removed)`` row counts
+    """
+    added = 0
+    batch = []
+    for created_at, kind, pk, transaction_id, member_id in missing_entries():
+        batch.append(TransactionIndex(
+            kind=kind, object_id=pk, transaction_id=transaction_id, member_id=member_id, created_at=created_at
+        ))
+        if len(batch) == 1000:
+            added += len(TransactionIndex.objects.bulk_create(batch))
+            batch = []
+    added += len(TransactionIndex.objects.bulk_create(batch))
+
+    removed, _ = stale_entries().delete()
+    return added, removed
+
+
+def check_transaction_index():
+    """
+    Returns:
+        tuple: ``(missing, stale)`` row counts
+    """
+    return sum(1 for _ in missing_entries()), stale_entries().count()
@@ -0,0 +1,52 @@
+"""
+Django signals for the payments app.
+Keep the transaction id registry and the cached dashboards in step with the
+transaction, token and payment method tables.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import (
+    DigitalToken, MobileMoneyTransaction, PaymentMethod, PaymentTransaction, TransactionIndex,
+    WalletTransaction,
+)
+from .registry import kind_for, owner_id, register
+from .summary import invalidate_summaries
+
+
+@receiver(post_save, sender=WalletTransaction)
+@receiver(post_save, sender=PaymentTransaction)
+@receiver(post_save, sender=MobileMoneyTransaction)
+def transaction_saved(sender, instance, created, **kwargs):
+    """
+    Register new transactions and drop their owner's cached dashboard.
+    Bulk inserts bypass this and do both themselves (see payments.wallet).
+    """
+    if not created and sender is MobileMoneyTransaction:
+        return
+    member_id = owner_id(instance)
+    if created:
+        register(instance, member_id)
+    if sender is not MobileMoneyTransaction:
+        invalidate_summaries([member_id])
+
+
+@receiver(post_delete, sender=WalletTransaction)
+@receiver(post_delete, sender=PaymentTransaction)
+@receiver(post_delete, sender=MobileMoneyTransaction)
+def unindex_transaction(sender, instance, **kwargs):
+    TransactionIndex.objects.filter(kind=kind_for(instance), object_id=instance.pk).delete()
+
+
+@receiver(post_delete, sender=WalletTransaction)
+@receiver(post_delete, sender=PaymentTransaction)
+def invalidate_payment_summary(sender, instance, **kwargs):
+    invalidate_summaries([owner_id(instance)])
+
+
+@receiver(post_save, sender=DigitalToken)
+@receiver(post_save, sender=PaymentMethod)
+@receiver(post_delete, sender=DigitalToken)
+@receiver(post_delete, sender=PaymentMethod)
+def invalidate_dashboard(sender, instance, **kwargs):
+    invalidate_summaries([instance.member_id])
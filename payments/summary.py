@@ -0,0 +1,128 @@
+"""
+Payments dashboard statistics.
+
+``payment_summary`` computes a member's wallet and payment totals with one
+conditional-aggregate query per table. ``dashboard`` caches those totals
+together with the rest of the dashboard (recent wallet transactions and
+payments, active tokens and saved payment methods), so a cached dashboard
+costs one query for the wallet, whose balance is always read live.
+
+The cached dashboard is dropped whenever one of the member's transactions,
+tokens or payment methods is written (see ``payments.signals``,
+``payments.wallet`` and ``payments.tokens``), and never outlives the first
+of its tokens to expire.
+"""
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import DigitalToken, EWallet, PaymentMethod, PaymentTransaction, WalletTransaction
+
+CACHE_KEY_PREFIX = 'payments:summary:'
+# Rows shown in each dashboard list
+RECENT_ITEMS = 5
+
+
+def _cache_timeout():
+    return getattr(settings, 'PAYMENTS_SUMMARY_CACHE_TIMEOUT', 300)
+
+
+def _cache_key(member_id):
+    return f'{CACHE_KEY_PREFIX}{member_id}'
+
+
+def _total(condition):
+    return Coalesce(
+        Sum('amount', filter=condition),
+        Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=15, decimal_places=2)
+    )
+
+
+def compute_summary(member_id):
+    """Compute a member's payment statistics without the cache"""
+    completed = Q(status='completed')
+    summary = WalletTransaction.objects.filter(wallet__member_id=member_id).aggregate(
+        total_deposits=_total(completed & Q(transaction_type='deposit')),
+        total_withdrawals=_total(completed & Q(transaction_type='withdrawal')),
+        total_transfers_in=_total(completed & Q(transaction_type='transfer_in')),
+        total_transfers_out=_total(completed & Q(transaction_type='transfer_out')),
+        wallet_transaction_count=Count('id'),
+        pending_wallet_transactions=Count('id', filter=Q(status='pending')),
+    )
+    summary.update(PaymentTransaction.objects.filter(member_id=member_id).aggregate(
+        total_payments=_total(completed),
+        payment_count=Count('id'),
+        pending_payments=Count('id', filter=Q(status__in=['initiated', 'processing'])),
+    ))
+    return summary
+
+
+def compute_dashboard(member_id):
+    """Everything on a member's dashboard except the wallet, without the cache"""
+    return {
+        'summary': compute_summary(member_id),
+        'recent_transactions': list(WalletTransaction.objects.filter(wallet__member_id=member_id)[:RECENT_ITEMS]),
+        'recent_payments': list(PaymentTransaction.objects.filter(member_id=member_id)[:RECENT_ITEMS]),
+        'active_tokens': list(DigitalToken.objects.filter(
+            member_id=member_id, status='active', expiry_date__gt=timezone.now()
+        )[:RECENT_ITEMS]),
+        'payment_methods': list(
+            PaymentMethod.objects.filter(member_id=member_id, is_active=True).select_related('provider')
+        ),
+    }
+
+
+def _dashboard_timeout(data):
+    timeout = _cache_timeout()
+    if data['active_tokens']:
+        expires = min(token.expiry_date for token in data['active_tokens'])
+        timeout = min(timeout, max(1, int((expires - timezone.now()).total_seconds())))
+    return timeout
+
+
+def cached_dashboard(member_id):
+    """The dashboard lists and statistics, served from the cache when possible"""
+    key = _cache_key(member_id)
+    data = cache.get(key)
+    if data is None:
+        data = compute_dashboard(member_id)
+        cache.set(key, data, _dashboard_timeout(data))
+    return data
+
+
+def payment_summary(member_id):
+    """
+    A member's wallet and payment statistics, served from the cache when possible.
+
+    Returns:
+        dict: ``total_deposits``, ``total_withdrawals``, ``total_transfers_in``,
+        ``total_transfers_out``, ``wallet_transaction_count``,
+        ``pending_wallet_transactions``, ``total_payments``, ``payment_count``
+        and ``pending_payments``
+    """
+    return cached_dashboard(member_id)['summary']
+
+
+def dashboard(member):
+    """
+    Context for the payments dashboard.
+
+    Returns:
+        dict: ``ewallet`` (created on first visit), the lists from
+        ``compute_dashboard`` and the statistics as ``summary``
+    """
+    ewallet, _ = EWallet.objects.get_or_create(member=member, defaults={'wallet_id': f'KW{member.id:06d}'})
+    return {'ewallet': ewallet, **cached_dashboard(member.id)}
+
+
+def invalidate_summaries(member_ids):
+    """Drop cached summaries once the current transaction commits"""
+    keys = [_cache_key(member_id) for member_id in set(member_ids)]
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -1,3 +1,330 @@
+import importlib
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from bodaboda_welfare.testing import make_members
+from payments import registry, summary, tokens, wallet
+from payments.models import (
+    DigitalToken, EWallet, MobileMoneyProvider, MobileMoneyTransaction, PaymentMethod, PaymentTransaction,
+    TransactionIndex, WalletTransaction
+)
+
+
+def create_wallet(member, balance='0.00'):
+    return EWallet.objects.create(
+        member=member,
+        wallet_id=f'W{uuid.uuid4().hex[:10].upper()}',
+        balance=Decimal(balance),
+        pin='unused'
+    )
+
+
+class WalletPostingTests(TestCase):
+    def setUp(self):
+        first, second, third = make_members(3)
+        self.alice = create_wallet(first, '100.00')
+        self.bob = create_wallet(second, '20.00')
+        self.carol = create_wallet(third)
+
+    def balances(self):
+        return [
+            EWallet.objects.get(id=w.id).balance for w in (self.alice, self.bob, self.carol)
+        ]
+
+    def test_transfer_moves_funds_and_records_both_legs(self):
+        out_leg, in_leg = wallet.transfer(self.alice, self.bob, '30.00', 'Lunch')
+        self.assertEqual(self.balances(), [Decimal('70.00'), Decimal('50.00'), Decimal('0.00')])
+        self.assertEqual((out_leg.balance_before, out_leg.balance_after), (Decimal('100.00'), Decimal('70.00')))
+        self.assertEqual(in_leg.balance_after, Decimal('50.00'))
+        self.assertEqual(EWallet.objects.get(id=self.alice.id).total_transfers, Decimal('30.00'))
+        self.assertEqual(TransactionIndex.objects.filter(kind='wallet').count(), 2)
+
+    def test_overdraft_is_rejected(self):
+        with self.assertRaises(wallet.InsufficientFunds):
+            wallet.transfer(self.bob, self.alice, '20.01')
+        with self.assertRaises(wallet.InsufficientFunds):
+            wallet.debit(self.carol, '1.00')
+        self.assertEqual(self.balances(), [Decimal('100.00'), Decimal('20.00'), Decimal('0.00')])
+        self.assertFalse(WalletTransaction.objects.exists())
+
+    def test_batch_is_all_or_nothing(self):
+        with self.assertRaises(wallet.InsufficientFunds):
+            wallet.post_transfers([
+                (self.alice.id, self.carol.id, '50.00', 'Payout'),
+                (self.bob.id, self.carol.id, '50.00', 'Payout'),
+            ])
+        self.assertEqual(self.balances(), [Decimal('100.00'), Decimal('20.00'), Decimal('0.00')])
+        self.assertFalse(WalletTransaction.objects.exists())
+        self.assertFalse(TransactionIndex.objects.exists())
+
+    def test_batch_checks_running_balance(self):
+        # Each transfer alone is covered, together they overdraw the sender
+        with self.assertRaises(wallet.InsufficientFunds):
+            wallet.post_transfers([
+                (self.alice.id, self.bob.id, '60.00', 'First'),
+                (self.alice.id, self.carol.id, '60.00', 'Second'),
+            ])
+        self.assertEqual(self.balances(), [Decimal('100.00'), Decimal('20.00'), Decimal('0.00')])
+
+    def test_frozen_wallet_is_unavailable(self):
+        EWallet.objects.filter(id=self.bob.id).update(is_frozen=True)
+        with self.assertRaises(wallet.WalletUnavailable):
+            wallet.transfer(self.alice, self.bob, '10.00')
+        self.assertEqual(self.balances(), [Decimal('100.00'), Decimal('20.00'), Decimal('0.00')])
+
+    def test_amounts_must_be_positive(self):
+        for amount in ('-500', '0'):
+            with self.assertRaises(ValueError):
+                wallet.credit(self.alice, amount)
+            with self.assertRaises(ValueError):
+                wallet.debit(self.alice, amount)
+            with self.assertRaises(ValueError):
+                wallet.transfer(self.alice, self.bob, amount)
+        with self.assertRaises(ValueError):
+            wallet.transfer(self.alice, self.alice, '10.00')
+        self.assertEqual(self.balances(), [Decimal('100.00'), Decimal('20.00'), Decimal('0.00')])
+
+    def test_credit_and_debit_update_counters(self):
+        wallet.credit(self.carol, '40.00', 'Deposit')
+        wallet.debit(self.carol, '15.00', 'Withdrawal')
+        stored = EWallet.objects.get(id=self.carol.id)
+        self.assertEqual(stored.balance, Decimal('25.00'))
+        self.assertEqual(stored.total_deposits, Decimal('40.00'))
+        self.assertEqual(stored.total_withdrawals, Decimal('15.00'))
+        self.assertEqual(self.carol.balance, Decimal('25.00'))
+
+
+class WithdrawalViewTests(TestCase):
+    def setUp(self):
+        member, = make_members(1)
+        self.ewallet = create_wallet(member, '100.00')
+        self.provider = MobileMoneyProvider.objects.create(name='M-Pesa', code='MPESA')
+        self.client.force_login(member.user)
+        self.middleware = [m for m in settings.MIDDLEWARE if 'TwoFactor' not in m]
+
+    def withdraw(self, amount):
+        with self.settings(MIDDLEWARE=self.middleware):
+            return self.client.post(reverse('payments:withdraw'), {
+                'amount': amount, 'provider': self.provider.id, 'phone_number': '0712345678'
+            })
+
+    def test_withdrawal_debits_wallet_and_records_request(self):
+        response = self.withdraw('40.00')
+        self.assertRedirects(response, reverse('payments:wallet_transactions'), fetch_redirect_response=False)
+        self.assertEqual(EWallet.objects.get(id=self.ewallet.id).balance, Decimal('60.00'))
+        withdrawal = MobileMoneyTransaction.objects.get(wallet=self.ewallet)
+        self.assertEqual((withdrawal.amount, withdrawal.status), (Decimal('40.00'), 'initiated'))
+        self.assertEqual(WalletTransaction.objects.get(wallet=self.ewallet).reference, withdrawal.transaction_id)
+
+    def test_overdraft_creates_no_withdrawal(self):
+        response = self.withdraw('100.01')
+        self.assertContains(response, 'Insufficient funds')
+        self.assertFalse(MobileMoneyTransaction.objects.exists())
+        self.assertEqual(EWallet.objects.get(id=self.ewallet.id).balance, Decimal('100.00'))
+
+    def test_frozen_wallet_creates_no_withdrawal(self):
+        EWallet.objects.filter(id=self.ewallet.id).update(is_frozen=True)
+        response = self.withdraw('10.00')
+        self.assertContains(response, 'not available for transactions')
+        self.assertFalse(MobileMoneyTransaction.objects.exists())
+        self.assertFalse(WalletTransaction.objects.exists())
+
+
+class TokenIssueTests(TestCase):
+    def setUp(self):
+        self.members = make_members(3)
+
+    def test_tokens_are_written_in_one_insert(self):
+        progress = []
+        with CaptureQueriesContext(connection) as queries:
+            issued = tokens.issue_tokens(
+                [member.id for member in self.members], 'stage_pass', quantity=2,
+                progress=lambda done, total: progress.append((done, total))
+            )
+        self.assertEqual(issued, 6)
+        inserts = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('INSERT INTO "payments_digitaltoken"')
+        ]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(progress, [(6, 6)])
+
+        token_ids = list(DigitalToken.objects.values_list('token_id', flat=True))
+        self.assertEqual(len(set(token_ids)), 6)
+        self.assertTrue(all(token_id.startswith('STAGE_PASS') for token_id in token_ids))
+        self.assertEqual(DigitalToken.objects.filter(member=self.members[0]).count(), 2)
+        # QR codes wait until a token is first viewed
+        self.assertFalse(DigitalToken.objects.exclude(qr_code='').exists())
+
+    def test_progress_is_reported_per_batch(self):
+        progress = []
+        tokens.issue_tokens(
+            [member.id for member in self.members], 'fuel_voucher', quantity=3, batch_size=4,
+            progress=lambda done, total: progress.append((done, total))
+        )
+        self.assertEqual(progress, [(4, 9), (8, 9), (9, 9)])
+        self.assertEqual(set(DigitalToken.objects.values_list('value', flat=True)), {Decimal('100.00')})
+
+    def test_qr_code_is_rendered_on_first_view_only(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        tokens.issue_tokens([self.members[0].id], 'parking_token')
+        token = DigitalToken.objects.get()
+        url = reverse('payments:token_qr_code', args=[token.token_id])
+        middleware = [m for m in settings.MIDDLEWARE if 'TwoFactor' not in m]
+        self.client.force_login(self.members[0].user)
+
+        with self.settings(MEDIA_ROOT=media_root, MIDDLEWARE=middleware), \
+                mock.patch.object(tokens.qrcode, 'QRCode', wraps=tokens.qrcode.QRCode) as qr_code:
+            first = self.client.get(url)
+            second = self.client.get(url)
+
+        self.assertEqual(qr_code.call_count, 1)
+        token.refresh_from_db()
+        self.assertTrue(token.qr_code.name.endswith(f'{token.token_id}.png'))
+        self.assertEqual(first['Location'], second['Location'])
+
+
+class PaymentDashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.member, = make_members(1)
+        self.ewallet = create_wallet(self.member)
+
+    def test_cached_dashboard_only_reads_the_wallet(self):
+        # Wallet, two aggregates, two recent lists, tokens and payment methods
+        with self.assertNumQueries(7):
+            summary.dashboard(self.member)
+        with self.assertNumQueries(1):
+            data = summary.dashboard(self.member)
+        self.assertEqual(data['ewallet'], self.ewallet)
+        self.assertEqual(data['summary']['total_deposits'], Decimal('0.00'))
+
+    def test_view_renders_cached_dashboard(self):
+        middleware = [m for m in settings.MIDDLEWARE if 'TwoFactor' not in m]
+        self.client.force_login(self.member.user)
+        with self.settings(MIDDLEWARE=middleware):
+            self.client.get(reverse('payments:dashboard'))
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('payments:dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if 'payments_wallettransaction' in query['sql'] or 'payments_digitaltoken' in query['sql']
+        ])
+
+    def test_wallet_postings_invalidate_dashboard(self):
+        summary.dashboard(self.member)
+        with self.captureOnCommitCallbacks(execute=True):
+            wallet.credit(self.ewallet, '30.00', 'Deposit')
+        data = summary.dashboard(self.member)
+        self.assertEqual(data['summary']['total_deposits'], Decimal('30.00'))
+        self.assertEqual(len(data['recent_transactions']), 1)
+
+    def test_payments_invalidate_dashboard(self):
+        summary.dashboard(self.member)
+        with self.captureOnCommitCallbacks(execute=True):
+            PaymentTransaction.objects.create(
+                member=self.member, transaction_id='PAY1', transaction_type='service_fee',
+                amount=Decimal('15.00'), status='completed', description='Service fee'
+            )
+        data = summary.dashboard(self.member)
+        self.assertEqual(data['summary']['total_payments'], Decimal('15.00'))
+        self.assertEqual([payment.transaction_id for payment in data['recent_payments']], ['PAY1'])
+
+    def test_tokens_and_payment_methods_invalidate_dashboard(self):
+        summary.dashboard(self.member)
+        with self.captureOnCommitCallbacks(execute=True):
+            tokens.issue_tokens([self.member.id], 'stage_pass')
+        self.assertEqual(len(summary.dashboard(self.member)['active_tokens']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            DigitalToken.objects.update(status='used')
+            DigitalToken.objects.get().save()
+        self.assertEqual(summary.dashboard(self.member)['active_tokens'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            method = PaymentMethod.objects.create(
+                member=self.member, method_type='mobile_money', account_number='0712345678', account_name='Rider'
+            )
+        self.assertEqual(summary.dashboard(self.member)['payment_methods'], [method])
+
+    def test_dashboard_expires_with_first_token(self):
+        tokens.issue_tokens([self.member.id], 'stage_pass')
+        DigitalToken.objects.update(expiry_date=timezone.now() + timedelta(seconds=60))
+        data = summary.compute_dashboard(self.member.id)
+        self.assertLessEqual(summary._dashboard_timeout(data), 60)
+
+    def test_wallet_transaction_save_does_not_load_wallet(self):
+        transaction = WalletTransaction(
+            wallet_id=self.ewallet.id, transaction_id='WT1', transaction_type='deposit',
+            amount=Decimal('5.00'), status='completed', balance_before=0, balance_after=0
+        )
+        with CaptureQueriesContext(connection) as queries:
+            transaction.save()
+        self.assertFalse([query for query in queries.captured_queries if '"balance"' in query['sql']])
+        self.assertEqual(TransactionIndex.objects.get(transaction_id='WT1').member_id, self.member.id)
+
+
+class TransactionIndexBackfillTests(TestCase):
+    def setUp(self):
+        self.member, = make_members(1)
+        ewallet = create_wallet(self.member, '100.00')
+        provider = MobileMoneyProvider.objects.create(name='M-Pesa', code='MPESA')
+        now = timezone.now()
+
+        first = PaymentTransaction.objects.create(
+            member=self.member, transaction_id='PAY1', transaction_type='contribution',
+            amount=Decimal('10.00'), description='First'
+        )
+        self.second, = wallet.post_entries([{
+            'wallet_id': ewallet.id, 'amount': Decimal('5.00'), 'transaction_type': 'deposit',
+            'description': 'Second', 'counter': None,
+        }])
+        third = MobileMoneyTransaction.objects.create(
+            wallet=ewallet, provider=provider, transaction_id='MM1', transaction_type='deposit',
+            amount=Decimal('20.00'), phone_number='+254700000000'
+        )
+        fourth = PaymentTransaction.objects.create(
+            member=self.member, transaction_id='PAY2', transaction_type='contribution',
+            amount=Decimal('10.00'), description='Fourth'
+        )
+        for minutes, (model, obj, field) in enumerate([
+            (PaymentTransaction, first, 'initiated_at'),
+            (WalletTransaction, self.second, 'created_at'),
+            (MobileMoneyTransaction, third, 'initiated_at'),
+            (PaymentTransaction, fourth, 'initiated_at'),
+        ]):
+            model.objects.filter(pk=obj.pk).update(**{field: now - timedelta(minutes=10 - minutes)})
+        TransactionIndex.objects.all().delete()
+
+    def assertStatementOrder(self):
+        entries, _ = registry.statement(self.member)
+        self.assertEqual(
+            [entry.transaction_id for entry in entries],
+            ['PAY2', 'MM1', self.second.transaction_id, 'PAY1']
+        )
+
+    def test_backfill_orders_all_kinds_by_time(self):
+        migration = importlib.import_module('payments.migrations.0002_transactionindex')
+        migration.populate_index(apps, None)
+        self.assertStatementOrder()
 
-# Create your tests here.
+    def test_rebuild_orders_all_kinds_by_time(self):
+        self.assertEqual(registry.check_transaction_index(), (4, 0))
+        self.assertEqual(registry.rebuild_transaction_index(), (4, 0))
+        self.assertStatementOrder()
+        self.assertEqual(registry.check_transaction_index(), (0, 0))
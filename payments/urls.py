@@ -16,6 +16,7 @@ urlpatterns = [
     # Digital Tokens
     path('tokens/', views.digital_tokens, name='digital_tokens'),
     path('tokens/purchase/', views.purchase_token, name='purchase_token'),
+    path('tokens/<str:token_id>/qr/', views.token_qr_code, name='token_qr_code'),
     
     # Payment Methods
     path('methods/', views.payment_methods, name='payment_methods'),
@@ -23,5 +24,6 @@ urlpatterns = [
     
     # Payment History
     path('history/', views.payment_history, name='payment_history'),
+    path('statement/', views.transaction_statement, name='transaction_statement'),
     path('transaction/<str:transaction_id>/', views.transaction_details, name='transaction_details'),
 ]
@@ -2,17 +2,22 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
-from django.db.models import Q, Sum
-from django.utils import timezone
+from django.db import transaction
+from django.db.models import Q
 from django.core.paginator import Paginator
 from decimal import Decimal
 import uuid
 from members.models import Member
 
 from .models import (EWallet, WalletTransaction, MobileMoneyTransaction, 
-                    DigitalToken, PaymentMethod, PaymentTransaction, MobileMoneyProvider)
+                    DigitalToken, PaymentMethod, PaymentTransaction, MobileMoneyProvider,
+                    TransactionIndex)
 from .forms import (EWalletTopupForm, TransferForm, PaymentMethodForm, 
                    TokenPurchaseForm, WithdrawalForm)
+from . import wallet
+from .registry import resolve, statement
+from .summary import dashboard
+from .tokens import TOKEN_PRICES, ensure_qr_code, issue_tokens
 
 
 @login_required
@@ -23,46 +28,15 @@ def payments_dashboard(request):
     try:
         member = request.user.member
         
-        # Get or create e-wallet
-        ewallet, created = EWallet.objects.get_or_create(
-            member=member,
-            defaults={'wallet_id': f'KW{member.id:06d}'}
-        )
-        
-        # Recent transactions
-        recent_transactions = WalletTransaction.objects.filter(wallet=ewallet)[:5]
-        recent_payments = PaymentTransaction.objects.filter(member=member)[:5]
-        
-        # Active tokens
-        active_tokens = DigitalToken.objects.filter(
-            member=member,
-            status='active',
-            expiry_date__gt=timezone.now()
-        )[:5]
-        
-        # Payment methods
-        payment_methods = PaymentMethod.objects.filter(member=member, is_active=True)
-        
-        # Statistics
-        total_deposits = WalletTransaction.objects.filter(
-            wallet=ewallet,
-            transaction_type='deposit',
-            status='completed'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        total_payments = PaymentTransaction.objects.filter(
-            member=member,
-            status='completed'
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        # Wallet, lists and statistics; everything but the wallet is cached
+        data = dashboard(member)
+        summary = data['summary']
         
         context = {
-            'ewallet': ewallet,
-            'recent_transactions': recent_transactions,
-            'recent_payments': recent_payments,
-            'active_tokens': active_tokens,
-            'payment_methods': payment_methods,
-            'total_deposits': total_deposits,
-            'total_payments': total_payments,
+            **data,
+            'total_deposits': summary['total_deposits'],
+            'total_withdrawals': summary['total_withdrawals'],
+            'total_payments': summary['total_payments'],
         }
         
         return render(request, 'payments/dashboard.html', context)
@@ -186,21 +160,24 @@ def transfer_funds(request):
                     defaults={'wallet_id': f'KW{recipient_member.id:06d}'}
                 )
                 
-                # Check if sender has sufficient funds
-                if ewallet.balance >= amount:
-                    # Deduct from sender
-                    ewallet.deduct_funds(amount, f"Transfer to {recipient_member.user.get_full_name()}")
-                    
-                    # Add to recipient
-                    recipient_wallet.add_funds(amount, f"Transfer from {member.user.get_full_name()}")
-                    
-                    messages.success(request, f'Successfully transferred KES {amount} to {recipient_member.user.get_full_name()}')
-                    return redirect('payments:wallet_transactions')
-                else:
-                    messages.error(request, 'Insufficient funds in your wallet.')
+                # Move the funds in a single locked transaction
+                wallet.transfer(
+                    ewallet,
+                    recipient_wallet,
+                    amount,
+                    f"Transfer to {recipient_member.user.get_full_name()}",
+                    f"Transfer from {member.user.get_full_name()}"
+                )
+                
+                messages.success(request, f'Successfully transferred KES {amount} to {recipient_member.user.get_full_name()}')
+                return redirect('payments:wallet_transactions')
             
             except Member.DoesNotExist:
                 messages.error(request, 'Recipient not found. Please check the phone number.')
+            except wallet.InsufficientFunds:
+                messages.error(request, 'Insufficient funds in your wallet.')
+            except (wallet.WalletUnavailable, ValueError) as e:
+                messages.error(request, str(e))
     else:
         form = TransferForm()
     
@@ -227,28 +204,28 @@ def withdraw_funds(request):
             provider = form.cleaned_data['provider']
             phone_number = form.cleaned_data['phone_number']
             
-            # Check if user has sufficient funds
-            if ewallet.balance >= amount:
-                # Create mobile money transaction
-                transaction_id = f'WTH{uuid.uuid4().hex[:8].upper()}'
-                
-                mobile_transaction = MobileMoneyTransaction.objects.create(
-                    wallet=ewallet,
-                    provider=provider,
-                    transaction_id=transaction_id,
-                    transaction_type='withdrawal',
-                    amount=amount,
-                    phone_number=phone_number,
-                    status='initiated'
-                )
-                
-                # Deduct funds from wallet (pending confirmation)
-                ewallet.deduct_funds(amount, f"Withdrawal to {provider.name}")
-                
+            transaction_id = f'WTH{uuid.uuid4().hex[:8].upper()}'
+            try:
+                with transaction.atomic():
+                    # Hold the funds under the wallet lock first, so a withdrawal
+                    # row only exists for money that has left the wallet
+                    wallet.debit(ewallet, amount, f"Withdrawal to {provider.name}", reference=transaction_id)
+                    MobileMoneyTransaction.objects.create(
+                        wallet=ewallet,
+                        provider=provider,
+                        transaction_id=transaction_id,
+                        transaction_type='withdrawal',
+                        amount=amount,
+                        phone_number=phone_number,
+                        status='initiated'
+                    )
+            except wallet.InsufficientFunds:
+                messages.error(request, 'Insufficient funds in your wallet.')
+            except (wallet.WalletUnavailable, ValueError) as e:
+                messages.error(request, str(e))
+            else:
                 messages.success(request, f'Withdrawal request initiated. Transaction ID: {transaction_id}')
                 return redirect('payments:wallet_transactions')
-            else:
-                messages.error(request, 'Insufficient funds in your wallet.')
     else:
         form = WithdrawalForm()
     
@@ -315,38 +292,24 @@ def purchase_token(request):
             token_type = form.cleaned_data['token_type']
             quantity = form.cleaned_data['quantity']
             
-            # Token pricing (in a real app, this would be configurable)
-            token_prices = {
-                'stage_pass': Decimal('50.00'),
-                'parking_token': Decimal('20.00'),
-                'fuel_voucher': Decimal('100.00'),
-                'service_credit': Decimal('25.00'),
-            }
-            
-            if token_type in token_prices:
-                total_cost = token_prices[token_type] * quantity
+            if token_type in TOKEN_PRICES:
+                total_cost = TOKEN_PRICES[token_type] * quantity
                 
-                if ewallet.balance >= total_cost:
-                    # Deduct funds
-                    ewallet.deduct_funds(total_cost, f"Purchase {quantity}x {token_type}")
-                    
-                    # Create tokens
-                    for i in range(quantity):
-                        DigitalToken.objects.create(
-                            member=member,
-                            token_id=f'{token_type.upper()}{uuid.uuid4().hex[:8].upper()}',
-                            token_type=token_type,
-                            name=f"{token_type.replace('_', ' ').title()}",
-                            description=f"Digital {token_type.replace('_', ' ')} token",
-                            value=token_prices[token_type],
-                            remaining_value=token_prices[token_type],
-                            expiry_date=timezone.now() + timezone.timedelta(days=90)
+                try:
+                    # Charge the wallet and issue the tokens together
+                    with transaction.atomic():
+                        wallet.debit(
+                            ewallet, total_cost, f"Purchase {quantity}x {token_type}",
+                            transaction_type='payment'
                         )
+                        issue_tokens([member.id], token_type, quantity)
                     
                     messages.success(request, f'Successfully purchased {quantity} {token_type} token(s) for KES {total_cost}')
                     return redirect('payments:digital_tokens')
-                else:
+                except wallet.InsufficientFunds:
                     messages.error(request, 'Insufficient funds in your wallet.')
+                except wallet.WalletUnavailable as e:
+                    messages.error(request, str(e))
             else:
                 messages.error(request, 'Invalid token type.')
     else:
@@ -360,6 +323,16 @@ def purchase_token(request):
     return render(request, 'payments/purchase_token.html', context)
 
 
+@login_required
+def token_qr_code(request, token_id):
+    """
+    Show a token's QR code, rendering it on first view
+    """
+    member = request.user.member
+    token = get_object_or_404(DigitalToken, token_id=token_id, member=member)
+    return redirect(ensure_qr_code(token).url)
+
+
 @login_required
 def payment_methods(request):
     """
@@ -436,41 +409,43 @@ def payment_history(request):
 
 
 @login_required
-def transaction_details(request, transaction_id):
+def transaction_statement(request):
     """
-    View detailed transaction information
+    All of a member's transactions (wallet, payments and mobile money), newest first
     """
     member = request.user.member
     
-    # Try to find transaction in different models
-    transaction = None
-    transaction_type = None
+    kind_filter = request.GET.get('kind')
+    kinds = [kind_filter] if kind_filter else None
     
     try:
-        ewallet = EWallet.objects.get(member=member)
-        transaction = WalletTransaction.objects.get(
-            wallet=ewallet,
-            transaction_id=transaction_id
-        )
-        transaction_type = 'wallet'
-    except (WalletTransaction.DoesNotExist, EWallet.DoesNotExist):
-        try:
-            transaction = PaymentTransaction.objects.get(
-                member=member,
-                transaction_id=transaction_id
-            )
-            transaction_type = 'payment'
-        except PaymentTransaction.DoesNotExist:
-            try:
-                ewallet = EWallet.objects.get(member=member)
-                transaction = MobileMoneyTransaction.objects.get(
-                    wallet=ewallet,
-                    transaction_id=transaction_id
-                )
-                transaction_type = 'mobile_money'
-            except (MobileMoneyTransaction.DoesNotExist, EWallet.DoesNotExist):
-                messages.error(request, 'Transaction not found.')
-                return redirect('payments:dashboard')
+        before = int(request.GET.get('before', 0))
+    except ValueError:
+        before = 0
+    
+    entries, next_cursor = statement(member, before=before, limit=20, kinds=kinds)
+    
+    context = {
+        'entries': entries,
+        'next_cursor': next_cursor,
+        'kind_filter': kind_filter,
+        'kind_choices': TransactionIndex.KIND_CHOICES,
+    }
+    
+    return render(request, 'payments/transaction_statement.html', context)
+
+
+@login_required
+def transaction_details(request, transaction_id):
+    """
+    View detailed transaction information
+    """
+    member = request.user.member
+    
+    transaction_type, transaction = resolve(transaction_id, member)
+    if transaction is None:
+        messages.error(request, 'Transaction not found.')
+        return redirect('payments:dashboard')
     
     context = {
         'transaction': transaction,
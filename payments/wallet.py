@@ -0,0 +1,224 @@
+"""
+Wallet posting engine.
+
+Every balance change goes through ``post_transfers`` or ``post_entries``:
+the affected wallets are locked with ``select_for_update`` in id order, the
+balances are moved with a single F()-based UPDATE, and all
+``WalletTransaction`` legs and their ``TransactionIndex`` rows are written
+with ``bulk_create``. A batch is all-or-nothing, so a stage-wide payout
+either posts completely or not at all.
+"""
+
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, When
+from django.utils import timezone
+
+from .models import EWallet, WalletTransaction
+from .registry import register_many
+from .summary import invalidate_summaries
+
+
+class InsufficientFunds(Exception):
+    """Raised when a posting would take a wallet below zero"""
+
+
+class WalletUnavailable(Exception):
+    """Raised when a posting touches a frozen or inactive wallet"""
+
+
+def generate_transaction_id(prefix='WTX'):
+    return f'{prefix}{uuid.uuid4().hex[:12].upper()}'
+
+
+def _to_decimal(amount):
+    return Decimal(str(amount)).quantize(Decimal('0.01'))
+
+
+def _lock_wallets(wallet_ids):
+    """Lock wallets in id order so that concurrent batches cannot deadlock"""
+    wallets = EWallet.objects.select_for_update().filter(id__in=set(wallet_ids)).order_by('id')
+    return {wallet.id: wallet for wallet in wallets}
+
+
+def _apply(entries):
+    """
+    Post a list of ledger entries inside the current transaction.
+
+    Each entry is a dict with ``wallet_id``, ``amount`` (signed),
+    ``transaction_type``, ``description``, ``counter`` (the EWallet total to
+    increase, or None) and optionally ``related_wallet_id`` and ``reference``.
+    """
+    wallets = _lock_wallets(
+        [entry['wallet_id'] for entry in entries] +
+        [entry['related_wallet_id'] for entry in entries if entry.get('related_wallet_id')]
+    )
+
+    now = timezone.now()
+    running = {wallet_id: wallet.balance for wallet_id, wallet in wallets.items()}
+    deltas = defaultdict(Decimal)
+    counters = defaultdict(lambda: defaultdict(Decimal))
+    legs = []
+
+    for entry in entries:
+        wallet = wallets.get(entry['wallet_id'])
+        if wallet is None:
+            raise EWallet.DoesNotExist(f"Wallet {entry['wallet_id']} does not exist")
+        if not wallet.is_active or wallet.is_frozen:
+            raise WalletUnavailable(f'Wallet {wallet.wallet_id} is not available for transactions')
+
+        balance_before = running[wallet.id]
+        balance_after = balance_before + entry['amount']
+        if balance_after < 0:
+            raise InsufficientFunds(f'Insufficient funds in wallet {wallet.wallet_id}')
+
+        running[wallet.id] = balance_after
+        deltas[wallet.id] += entry['amount']
+        if entry.get('counter'):
+            counters[entry['counter']][wallet.id] += abs(entry['amount'])
+
+        legs.append(WalletTransaction(
+            wallet_id=wallet.id,
+            transaction_id=entry.get('transaction_id') or generate_transaction_id(),
+            transaction_type=entry['transaction_type'],
+            amount=abs(entry['amount']),
+            status='completed',
+            reference=entry.get('reference', ''),
+            description=entry['description'],
+            related_wallet_id=entry.get('related_wallet_id'),
+            balance_before=balance_before,
+            balance_after=balance_after,
+            processed_at=now
+        ))
+
+    updates = {
+        'balance': Case(
+            *[When(id=wallet_id, then=F('balance') + delta) for wallet_id, delta in deltas.items()],
+            default=F('balance'),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        ),
+        'updated_at': now,
+    }
+    for counter, amounts in counters.items():
+        updates[counter] = Case(
+            *[When(id=wallet_id, then=F(counter) + amount) for wallet_id, amount in amounts.items()],
+            default=F(counter),
+            output_field=DecimalField(max_digits=15, decimal_places=2)
+        )
+    EWallet.objects.filter(id__in=deltas.keys()).update(**updates)
+
+    WalletTransaction.objects.bulk_create(legs, batch_size=500)
+    register_many([(leg, wallets[leg.wallet_id].member_id) for leg in legs])
+    invalidate_summaries(wallets[wallet_id].member_id for wallet_id in deltas)
+    return legs
+
+
+def post_entries(entries):
+    """
+    Post single-wallet credits and debits as one transaction.
+
+    Returns:
+        list: The ``WalletTransaction`` rows written
+    """
+    with transaction.atomic():
+        return _apply(entries)
+
+
+def credit(wallet, amount, description='', transaction_type='deposit', reference=''):
+    """Add funds to a wallet and record the transaction"""
+    amount = _to_decimal(amount)
+    if amount <= 0:
+        raise ValueError('Credit amount must be positive')
+    counter = 'total_deposits' if transaction_type == 'deposit' else None
+    leg, = post_entries([{
+        'wallet_id': wallet.id,
+        'amount': amount,
+        'transaction_type': transaction_type,
+        'description': description,
+        'counter': counter,
+        'reference': reference,
+    }])
+    wallet.balance = leg.balance_after
+    return leg
+
+
+def debit(wallet, amount, description='', transaction_type='withdrawal', reference=''):
+    """Deduct funds from a wallet and record the transaction"""
+    amount = _to_decimal(amount)
+    if amount <= 0:
+        raise ValueError('Debit amount must be positive')
+    counter = 'total_withdrawals' if transaction_type == 'withdrawal' else None
+    leg, = post_entries([{
+        'wallet_id': wallet.id,
+        'amount': -amount,
+        'transaction_type': transaction_type,
+        'description': description,
+        'counter': counter,
+        'reference': reference,
+    }])
+    wallet.balance = leg.balance_after
+    return leg
+
+
+def post_transfers(transfers, reference=''):
+    """
+    Post many wallet-to-wallet transfers as one transaction.
+
+    Args:
+        transfers: Iterable of ``(sender_wallet_id, recipient_wallet_id,
+            amount, description)`` tuples, optionally followed by a separate
+            description for the recipient's leg
+        reference (str): Reference stored on every leg, e.g. a payout batch id
+
+    Returns:
+        list: The ``WalletTransaction`` rows written, two per transfer
+
+    Raises:
+        InsufficientFunds: If any sender would go below zero; nothing is posted
+    """
+    entries = []
+    for sender_id, recipient_id, amount, description, *incoming in transfers:
+        amount = _to_decimal(amount)
+        if amount <= 0:
+            raise ValueError('Transfer amount must be positive')
+        if sender_id == recipient_id:
+            raise ValueError('Cannot transfer to the same wallet')
+        entries.append({
+            'wallet_id': sender_id,
+            'amount': -amount,
+            'transaction_type': 'transfer_out',
+            'description': description,
+            'counter': 'total_transfers',
+            'related_wallet_id': recipient_id,
+            'reference': reference,
+        })
+        entries.append({
+            'wallet_id': recipient_id,
+            'amount': amount,
+            'transaction_type': 'transfer_in',
+            'description': incoming[0] if incoming else description,
+            'related_wallet_id': sender_id,
+            'reference': reference,
+        })
+
+    with transaction.atomic():
+        return _apply(entries)
+
+
+def transfer(sender_wallet, recipient_wallet, amount, description='', recipient_description=None):
+    """
+    Transfer funds between two wallets.
+
+    Returns:
+        tuple: The outgoing and incoming ``WalletTransaction`` legs
+    """
+    out_leg, in_leg = post_transfers([(
+        sender_wallet.id, recipient_wallet.id, amount,
+        description, recipient_description or description
+    )])
+    sender_wallet.balance = out_leg.balance_after
+    recipient_wallet.balance = in_leg.balance_after
+    return out_leg, in_leg
@@ -0,0 +1,15 @@
+from django.contrib import admin
+from django.utils import timezone
+from .models import SourceImage
+
+@admin.register(SourceImage)
+class SourceImageAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'width', 'height', 'attempts', 'processed_at', 'created_at']
+    list_filter = ['status']
+    search_fields = ['name']
+    readonly_fields = ['renditions', 'claimed_by', 'claimed_at', 'last_error', 'created_at', 'processed_at']
+    actions = ['reprocess']
+    
+    def reprocess(self, request, queryset):
+        queryset.update(status='pending', attempts=0, available_at=timezone.now(), claimed_by='', claimed_at=None)
+    reprocess.short_description = 'Render selected images again'
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class RenditionsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'renditions'
+
+    def ready(self):
+        """Import signals when app is ready."""
+        import renditions.signals
@@ -0,0 +1,56 @@
+"""
+Management command to queue existing uploads for rendering.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from renditions.pipeline import SOURCE_FIELDS, enqueue, requeue, source_fields
+
+
+class Command(BaseCommand):
+    help = 'Queue images uploaded before the rendition pipeline (or all images with --force) for the rendition worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            help=f"Only this model, e.g. social.Post (default: {', '.join(label for label, _ in SOURCE_FIELDS)})"
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Render images again even if they already have renditions'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Images queued per statement (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        fields = source_fields()
+        if options['model']:
+            fields = [(model, field_name) for model, field_name in fields if model._meta.label == options['model']]
+            if not fields:
+                raise CommandError(f"{options['model']} has no images with renditions")
+
+        queue = requeue if options['force'] else enqueue
+        total = 0
+        for model, field_name in fields:
+            names = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            batch = []
+            count = 0
+            for name in names.values_list(field_name, flat=True).iterator(chunk_size=options['batch_size']):
+                batch.append(name)
+                if len(batch) == options['batch_size']:
+                    queue(batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                queue(batch)
+                count += len(batch)
+            self.stdout.write(f'{model._meta.label}.{field_name}: {count} images')
+            total += count
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Queued {total} images; run manage.py process_renditions to render them'
+        ))
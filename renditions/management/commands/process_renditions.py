@@ -0,0 +1,68 @@
+"""
+Management command to render queued images.
+Run it as a long-lived worker, or with --once from a cron job.
+"""
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from renditions.pipeline import process_batch, requeue_stale, worker_id
+
+
+class Command(BaseCommand):
+    help = 'Render resized WebP and JPEG copies of queued image uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help='Images claimed per batch (default: 20)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of waiting for new images'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=5.0,
+            help='Seconds to wait when the queue is empty (default: 5)'
+        )
+        parser.add_argument(
+            '--stale-minutes',
+            type=int,
+            default=15,
+            help='Release images claimed longer ago than this by workers that died (default: 15)'
+        )
+
+    def handle(self, *args, **options):
+        worker = worker_id()
+        stale_after = timedelta(minutes=options['stale_minutes'])
+        processed = failed = 0
+
+        self.stdout.write(f'Rendition worker {worker} started')
+        try:
+            while True:
+                released = requeue_stale(stale_after)
+                if released:
+                    self.stdout.write(self.style.WARNING(f'Released {released} stale images'))
+
+                batch_processed, batch_failed = process_batch(worker, options['batch_size'])
+                processed += batch_processed
+                failed += batch_failed
+                if batch_failed:
+                    self.stdout.write(self.style.ERROR(f'{batch_failed} images failed and will be retried'))
+
+                if not batch_processed:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} images ({failed} failed)'
+        ))
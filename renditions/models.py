@@ -0,0 +1,45 @@
+from django.db import models
+from django.utils import timezone
+
+
+class SourceImage(models.Model):
+    """
+    An uploaded image and its resized renditions.
+    Rows are queued by renditions.signals when an image field is saved and
+    processed by the rendition worker (``manage.py process_renditions``).
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+    
+    # Storage name of the original upload
+    name = models.CharField(max_length=255, unique=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    
+    # Original dimensions and {size: {format: storage name}} for each rendition
+    width = models.PositiveIntegerField(blank=True, null=True)
+    height = models.PositiveIntegerField(blank=True, null=True)
+    renditions = models.JSONField(default=dict, blank=True)
+    
+    # Delivery state
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=64, blank=True)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='renditions_src_queue'),
+            models.Index(fields=['claimed_by'], name='renditions_src_claim'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.status})"
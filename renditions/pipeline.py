@@ -0,0 +1,298 @@
+"""
+Image rendition pipeline.
+
+Saving a model in ``SOURCE_FIELDS`` with a new image queues a
+``SourceImage`` row (see ``renditions.signals``); the request does no image
+work. The rendition worker (``manage.py process_renditions``) claims queued
+images in batches and writes, for every size in
+``MEDIA_RENDITION_SIZES``, a WebP and a JPEG copy scaled to fit that many
+pixels on the longest edge. Renditions are re-encoded from the decoded
+pixels, so EXIF metadata (including GPS position) is never copied, and the
+camera orientation is applied first. The worker also saves the original
+again without its metadata, so a rider's location never stays in storage.
+
+Templates pick renditions through the ``renditions`` template tags. Until
+the renditions are ready they show ``MEDIA_RENDITION_PLACEHOLDER`` rather
+than the original, which still carries its metadata at that point.
+"""
+
+import hashlib
+import io
+import os
+import socket
+import uuid
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import SourceImage
+
+# (model, image field) pairs whose uploads get renditions
+SOURCE_FIELDS = [
+    ('social.Post', 'image'),
+    ('social.ChatMessage', 'image'),
+    ('social.StageStory', 'image'),
+    ('members.Member', 'profile_photo'),
+    ('stages.InterOrgCommunication', 'image'),
+]
+
+FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+CACHE_KEY_PREFIX = 'renditions:'
+
+# Image info keys that can carry a location; originals with any of them are saved again without
+METADATA_KEYS = {'exif', 'xmp', 'XML:com.adobe.xmp'}
+
+# Formats the original is saved in again once its metadata is removed
+ORIGINAL_FORMATS = {'JPEG': 'JPEG', 'MPO': 'JPEG', 'PNG': 'PNG', 'WEBP': 'WEBP', 'GIF': 'GIF'}
+
+# A transparent pixel, shown while an image is waiting for its renditions
+DEFAULT_PLACEHOLDER = 'data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7'
+
+
+def sizes():
+    """Rendition name to the longest edge in pixels"""
+    return getattr(settings, 'MEDIA_RENDITION_SIZES', {'thumb': 160, 'feed': 720, 'full': 1600})
+
+
+def _quality():
+    return getattr(settings, 'MEDIA_RENDITION_QUALITY', 80)
+
+
+def placeholder_url():
+    """URL shown in place of an image whose renditions are not ready"""
+    return getattr(settings, 'MEDIA_RENDITION_PLACEHOLDER', DEFAULT_PLACEHOLDER)
+
+
+def _max_attempts():
+    return getattr(settings, 'MEDIA_RENDITION_MAX_ATTEMPTS', 3)
+
+
+def source_fields():
+    """The models and field names in ``SOURCE_FIELDS``"""
+    return [(apps.get_model(label), field_name) for label, field_name in SOURCE_FIELDS]
+
+
+def rendition_name(name, size, fmt):
+    """Storage name of one rendition of an original image"""
+    stem = os.path.splitext(name)[0]
+    return f'renditions/{stem}/{size}.{FORMATS[fmt][1]}'
+
+
+def _cache_key(name):
+    return CACHE_KEY_PREFIX + hashlib.md5(name.encode()).hexdigest()
+
+
+def enqueue(names):
+    """Queue images for rendering; images already known are left alone"""
+    names = {name for name in names if name}
+    SourceImage.objects.bulk_create([SourceImage(name=name) for name in names], ignore_conflicts=True)
+
+
+def requeue(names):
+    """Queue images to be rendered again, e.g. after the sizes changed"""
+    queued = SourceImage.objects.filter(name__in=names).update(
+        status='pending', attempts=0, available_at=timezone.now(), claimed_by='', claimed_at=None
+    )
+    enqueue(names)
+    return queued
+
+
+def _delete_files(renditions):
+    for formats in renditions.values():
+        for rendition in formats.values():
+            default_storage.delete(rendition)
+
+
+def discard(names):
+    """Forget images that were replaced or deleted, removing their renditions once committed"""
+    names = {name for name in names if name}
+    if not names:
+        return
+    sources = list(SourceImage.objects.filter(name__in=names).values_list('renditions', flat=True))
+    SourceImage.objects.filter(name__in=names).delete()
+
+    def cleanup():
+        cache.delete_many([_cache_key(name) for name in names])
+        for renditions in sources:
+            _delete_files(renditions)
+
+    transaction.on_commit(cleanup)
+
+
+def renditions_for(name):
+    """
+    The renditions of an original image, served from the cache when possible.
+
+    Returns:
+        dict: ``{size: {format: storage name}}``, empty until the image is processed
+    """
+    key = _cache_key(name)
+    renditions = cache.get(key)
+    if renditions is None:
+        source = SourceImage.objects.filter(name=name, status='ready').values_list('renditions', flat=True).first()
+        renditions = source or {}
+        # Images still in the queue are looked up again shortly
+        cache.set(key, renditions, None if source else 60)
+    return renditions
+
+
+def rendition_url(image, size, fmt='jpeg'):
+    """URL of a rendition of an image field, or the placeholder until it is ready"""
+    if not image:
+        return ''
+    rendition = renditions_for(image.name).get(size, {}).get(fmt)
+    return default_storage.url(rendition) if rendition else placeholder_url()
+
+
+def _encode(image, fmt):
+    pil_format, _ = FORMATS[fmt]
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        # JPEG has no alpha channel, so flatten transparent images onto white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+            image = image.convert('RGBA')
+            background.paste(image, mask=image.getchannel('A'))
+        else:
+            background.paste(image.convert('RGB'))
+        image = background
+    elif pil_format == 'WEBP' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    buffer = io.BytesIO()
+    options = {'quality': _quality()}
+    if pil_format == 'JPEG':
+        options.update(optimize=True, progressive=True)
+    else:
+        options['method'] = 4
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def _strip_original(name, image, pil_format):
+    """Save the original again from its decoded pixels; EXIF is only written when passed explicitly"""
+    pil_format = ORIGINAL_FORMATS.get(pil_format)
+    if pil_format is None:
+        raise ValueError(f'Cannot remove metadata from {name}: unsupported format')
+    if pil_format == 'JPEG' and image.mode not in ('RGB', 'L', 'CMYK'):
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    options = {'quality': 95} if pil_format == 'JPEG' else {}
+    image.save(buffer, pil_format, **options)
+    default_storage.delete(name)
+    default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def render(source):
+    """Strip the original's metadata, then write every rendition and record them on the row"""
+    with default_storage.open(source.name, 'rb') as original:
+        image = Image.open(original)
+        pil_format = image.format
+        has_metadata = bool(METADATA_KEYS & image.info.keys())
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if has_metadata:
+        _strip_original(source.name, image, pil_format)
+
+    renditions = {}
+    for size, edge in sizes().items():
+        scaled = image.copy()
+        scaled.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+        renditions[size] = {}
+        for fmt in FORMATS:
+            name = rendition_name(source.name, size, fmt)
+            default_storage.delete(name)
+            renditions[size][fmt] = default_storage.save(name, ContentFile(_encode(scaled, fmt)))
+
+    width, height = image.size
+    updated = SourceImage.objects.filter(pk=source.pk, claimed_by=source.claimed_by).update(
+        width=width, height=height, renditions=renditions, status='ready', processed_at=timezone.now(),
+        claimed_by='', claimed_at=None, last_error=''
+    )
+    if not updated:
+        # Released to another worker, or discarded while it was being rendered
+        if not SourceImage.objects.filter(pk=source.pk).exists():
+            _delete_files(renditions)
+        return
+
+    stale = source.renditions
+    # Drop files from an earlier run that were saved under other names
+    current = {name for formats in renditions.values() for name in formats.values()}
+    _delete_files({
+        size: {fmt: name for fmt, name in formats.items() if name not in current}
+        for size, formats in stale.items()
+    })
+    cache.set(_cache_key(source.name), renditions, None)
+
+
+def worker_id():
+    """Identifier for the current worker process, recorded on the images it claims"""
+    return f'{socket.gethostname()[:40]}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def requeue_stale(older_than):
+    """
+    Release images claimed by workers that stopped before finishing them.
+
+    Returns:
+        int: Number of images released
+    """
+    return SourceImage.objects.filter(
+        status='processing',
+        claimed_at__lt=timezone.now() - older_than
+    ).update(status='pending', claimed_by='', claimed_at=None)
+
+
+def claim(worker, limit):
+    """Claim up to ``limit`` queued images for a worker"""
+    now = timezone.now()
+    source_ids = list(
+        SourceImage.objects.filter(status='pending', available_at__lte=now)
+        .order_by('id').values_list('id', flat=True)[:limit]
+    )
+    if not source_ids:
+        return []
+    # Only rows still pending are claimed, so concurrent workers never share an image
+    SourceImage.objects.filter(id__in=source_ids, status='pending').update(
+        status='processing', claimed_by=worker, claimed_at=now, attempts=F('attempts') + 1
+    )
+    return list(SourceImage.objects.filter(claimed_by=worker, status='processing').order_by('id'))
+
+
+def _fail(source, error):
+    changes = {'last_error': str(error), 'claimed_by': '', 'claimed_at': None}
+    if source.attempts >= _max_attempts():
+        changes['status'] = 'failed'
+    else:
+        changes['status'] = 'pending'
+        changes['available_at'] = timezone.now() + timedelta(seconds=min(2 ** source.attempts * 30, 3600))
+    SourceImage.objects.filter(pk=source.pk, claimed_by=source.claimed_by).update(**changes)
+
+
+def process_batch(worker, batch_size=20):
+    """
+    Claim and render one batch of images.
+
+    Returns:
+        tuple: ``(images_processed, images_failed)``
+    """
+    sources = claim(worker, batch_size)
+    failed = 0
+    for source in sources:
+        try:
+            render(source)
+        except Exception as error:
+            _fail(source, error)
+            failed += 1
+    return len(sources), failed
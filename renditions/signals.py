@@ -0,0 +1,44 @@
+"""
+Django signals for the renditions app.
+Queue new uploads for the rendition worker and drop the renditions of
+images that were replaced or deleted.
+"""
+
+from django.db.models.signals import post_delete, post_init, post_save
+
+from .pipeline import discard, enqueue, source_fields
+
+
+def _image_name(value):
+    return getattr(value, 'name', value) or ''
+
+
+def _connect(model, field_name):
+    snapshot = f'_rendition_source_{field_name}'
+
+    def remember_image(sender, instance, **kwargs):
+        """Remember the loaded image; skipped for deferred loads so no query is issued"""
+        if field_name in instance.__dict__:
+            setattr(instance, snapshot, _image_name(instance.__dict__[field_name]))
+
+    def queue_image(sender, instance, created, **kwargs):
+        current = _image_name(instance.__dict__.get(field_name))
+        previous = '' if created else getattr(instance, snapshot, None)
+        if previous is None:
+            return
+        if current != previous:
+            discard([previous])
+            enqueue([current])
+        setattr(instance, snapshot, current)
+
+    def drop_image(sender, instance, **kwargs):
+        discard([_image_name(instance.__dict__.get(field_name))])
+
+    uid = f'renditions.{model._meta.label}.{field_name}'
+    post_init.connect(remember_image, sender=model, weak=False, dispatch_uid=f'{uid}.init')
+    post_save.connect(queue_image, sender=model, weak=False, dispatch_uid=f'{uid}.save')
+    post_delete.connect(drop_image, sender=model, weak=False, dispatch_uid=f'{uid}.delete')
+
+
+for model, field_name in source_fields():
+    _connect(model, field_name)
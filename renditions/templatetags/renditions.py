@@ -0,0 +1,45 @@
+"""
+Template tags for serving image renditions.
+
+    {% load renditions %}
+    <img src="{{ member.profile_photo|rendition_url:'thumb' }}" alt="">
+    {% picture post.image 'feed' alt='Post image' class='img-fluid' %}
+
+Both show ``MEDIA_RENDITION_PLACEHOLDER`` until the renditions are ready;
+the original upload is never linked, as it may still carry EXIF metadata.
+"""
+
+from django import template
+from django.core.files.storage import default_storage
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from renditions.pipeline import placeholder_url, renditions_for, rendition_url as _rendition_url
+
+register = template.Library()
+
+
+@register.filter
+def rendition_url(image, size='feed'):
+    """JPEG rendition URL of an image field"""
+    return _rendition_url(image, size)
+
+
+@register.simple_tag
+def picture(image, size='feed', **attrs):
+    """
+    A ``<picture>`` offering the WebP rendition with a JPEG fallback, or a
+    plain ``<img>`` of the placeholder while the renditions are pending.
+    """
+    if not image:
+        return ''
+    attrs.setdefault('loading', 'lazy')
+    formats = renditions_for(image.name).get(size)
+    if not formats:
+        return format_html('<img src="{}"{}>', placeholder_url(), flatatt(attrs))
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}"><img src="{}"{}></picture>',
+        default_storage.url(formats['webp']),
+        default_storage.url(formats['jpeg']),
+        flatatt(attrs)
+    )
@@ -0,0 +1,58 @@
+import io
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from renditions import pipeline
+from renditions.models import SourceImage
+from renditions.templatetags.renditions import picture
+
+GPS_IFD = 0x8825
+
+
+def jpeg_with_location():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Rotated 90 degrees
+    exif[GPS_IFD] = {1: 'S', 2: (1.0, 17.0, 30.0)}
+    buffer = io.BytesIO()
+    Image.new('RGB', (400, 200), 'red').save(buffer, 'JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+class RenditionPrivacyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root, MEDIA_RENDITION_SIZES={'thumb': 100})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.name = default_storage.save('profiles/rider.jpg', ContentFile(jpeg_with_location()))
+        self.image = SimpleNamespace(name=self.name, url=default_storage.url(self.name))
+        pipeline.enqueue([self.name])
+
+    def test_pending_image_shows_placeholder(self):
+        self.assertEqual(pipeline.rendition_url(self.image, 'thumb'), pipeline.placeholder_url())
+        self.assertNotIn(self.image.url, picture(self.image, 'thumb'))
+
+    def test_worker_strips_location_from_original(self):
+        self.assertEqual(pipeline.process_batch(pipeline.worker_id()), (1, 0))
+        self.assertEqual(SourceImage.objects.get(name=self.name).status, 'ready')
+
+        with default_storage.open(self.name) as stored:
+            original = Image.open(stored)
+            self.assertNotIn('exif', original.info)
+            self.assertEqual(original.getexif().get_ifd(GPS_IFD), {})
+            # The orientation is applied to the pixels before the tag is dropped
+            self.assertEqual(original.size, (200, 400))
+
+        url = pipeline.rendition_url(self.image, 'thumb')
+        self.assertTrue(url.endswith('/thumb.jpg'))
+        with default_storage.open(pipeline.rendition_name(self.name, 'thumb', 'jpeg')) as stored:
+            self.assertNotIn('exif', Image.open(stored).info)
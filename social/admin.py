@@ -1,8 +1,10 @@
 from django.contrib import admin
+from django.utils import timezone
+from .inbox import rebuild_unread_counts
 from .models import (
     Post, PostLike, Comment, CommentLike, Friendship, 
     GroupChat, ChatMessage, MessageRead, StageStory, 
-    StoryView, SocialNotification
+    StoryView, SocialNotification, NotificationJob
 )
 
 @admin.register(Post)
@@ -93,11 +95,15 @@ class SocialNotificationAdmin(admin.ModelAdmin):
     actions = ['mark_as_read', 'mark_as_unread']
     
     def mark_as_read(self, request, queryset):
+        recipient_ids = set(queryset.values_list('recipient_id', flat=True))
         queryset.update(is_read=True)
+        rebuild_unread_counts(recipient_ids)
     mark_as_read.short_description = 'Mark selected notifications as read'
     
     def mark_as_unread(self, request, queryset):
+        recipient_ids = set(queryset.values_list('recipient_id', flat=True))
         queryset.update(is_read=False)
+        rebuild_unread_counts(recipient_ids)
     mark_as_unread.short_description = 'Mark selected notifications as unread'
 
 # Inline admin classes for related models
@@ -112,6 +118,17 @@ class CommentInline(admin.TabularInline):
     readonly_fields = ['author', 'created_at']
     fields = ['author', 'content', 'created_at']
 
+@admin.register(NotificationJob)
+class NotificationJobAdmin(admin.ModelAdmin):
+    list_display = ['notification_type', 'recipient', 'sender', 'status', 'attempts', 'available_at', 'created_at']
+    list_filter = ['status', 'notification_type']
+    readonly_fields = ['claimed_by', 'claimed_at', 'last_error', 'created_at']
+    actions = ['retry_jobs']
+    
+    def retry_jobs(self, request, queryset):
+        queryset.update(status='pending', attempts=0, available_at=timezone.now(), claimed_by='', claimed_at=None)
+    retry_jobs.short_description = 'Retry selected jobs'
+
 # Register simple models without custom admin
 admin.site.register(PostLike)
 admin.site.register(CommentLike)
@@ -0,0 +1,139 @@
+"""
+Publish/subscribe brokers for real-time chat events.
+
+The broker named by the ``CHAT_BROKER`` setting carries chat events (new
+messages, typing and presence) from the process that produced them to every
+open chat socket. ``InMemoryBroker`` delivers within a single process and is
+meant for development and tests; ``RedisBroker`` uses Redis pub/sub (or any
+server speaking its protocol) at ``CHAT_BROKER_URL`` so that events reach
+sockets held by other workers. It needs the optional ``redis`` package.
+
+Brokers expose a synchronous ``publish`` (called from views and signals) and
+an asynchronous ``subscribe`` generator (consumed by ``social.consumers``).
+They also count each member's open sockets per channel (``connect`` and
+``disconnect``), so that presence changes only when a member's first socket
+opens or last socket closes, whichever worker holds them.
+"""
+
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def group_channel(group_id):
+    return f'chat.group.{group_id}'
+
+
+def connections_key(channel):
+    return f'{channel}.connections'
+
+
+class InMemoryBroker:
+    """Delivers events to subscribers in the current process"""
+
+    def __init__(self, url=None):
+        self._subscribers = defaultdict(set)
+        self._connections = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def connect(self, channel, member_id):
+        """Count a member's new socket; returns their open sockets on the channel"""
+        with self._lock:
+            self._connections[channel, member_id] += 1
+            return self._connections[channel, member_id]
+
+    def disconnect(self, channel, member_id):
+        """Count a member's closed socket; returns their sockets still open"""
+        with self._lock:
+            remaining = self._connections.pop((channel, member_id), 0) - 1
+            if remaining > 0:
+                self._connections[channel, member_id] = remaining
+            return max(remaining, 0)
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # The subscriber's event loop has already closed
+                pass
+
+    async def subscribe(self, channel):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers[channel].add(subscriber)
+        try:
+            while True:
+                yield await subscriber[1].get()
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(subscriber)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+
+class RedisBroker:
+    """Delivers events through Redis pub/sub"""
+
+    def __init__(self, url=None):
+        if not url:
+            raise ImproperlyConfigured('RedisBroker requires CHAT_BROKER_URL')
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('RedisBroker requires the redis package (pip install redis)')
+        self._redis = redis
+        self._url = url
+        self._client = redis.Redis.from_url(url)
+
+    def publish(self, channel, event):
+        self._client.publish(channel, json.dumps(event, cls=DjangoJSONEncoder))
+
+    def connect(self, channel, member_id):
+        return self._client.hincrby(connections_key(channel), member_id, 1)
+
+    def disconnect(self, channel, member_id):
+        key = connections_key(channel)
+        remaining = self._client.hincrby(key, member_id, -1)
+        if remaining <= 0:
+            self._client.hdel(key, member_id)
+        return max(remaining, 0)
+
+    async def subscribe(self, channel):
+        client = self._redis.asyncio.Redis.from_url(self._url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(channel)
+        try:
+            async for message in pubsub.listen():
+                if message['type'] == 'message':
+                    yield json.loads(message['data'])
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.aclose()
+            await client.aclose()
+
+
+def get_broker():
+    """The broker configured by ``CHAT_BROKER``, created on first use"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend = import_string(getattr(settings, 'CHAT_BROKER', 'social.broker.InMemoryBroker'))
+                _broker = backend(getattr(settings, 'CHAT_BROKER_URL', '') or None)
+    return _broker
+
+
+def publish_to_group(group_id, event):
+    get_broker().publish(group_channel(group_id), event)
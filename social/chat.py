@@ -0,0 +1,140 @@
+"""
+Group chat helpers shared by the chat views and the chat socket.
+
+Chat history is paged with keyset cursors on ``(created_at, id)`` so that
+every window is a bounded range scan of the ``social_chatmsg_history``
+index, however long the chat has been running.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db.models import Q
+
+from renditions.pipeline import rendition_url
+from .models import ChatMessage, GroupChat
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _history_page_size():
+    """Messages loaded per chat history window"""
+    return getattr(settings, 'CHAT_HISTORY_PAGE_SIZE', 50)
+
+
+def has_chat_access(member, chat):
+    """Whether a member may read and post in a group chat"""
+    if chat.stage_id == member.stage_id and chat.allow_all_members:
+        return True
+    return chat.members.filter(id=member.id).exists()
+
+
+def join_stage_group(stage, members):
+    """
+    Add members to their stage's main group chat, creating it if needed.
+    The first member of a new chat becomes its admin.
+    """
+    if not members:
+        return None
+    stage_group, created = GroupChat.objects.get_or_create(
+        stage=stage,
+        name=f"{stage.name} Main Chat",
+        defaults={
+            'description': f"Main group chat for {stage.name} stage members",
+            'allow_all_members': True,
+            'created_by': members[0],
+            'is_private': False,
+        }
+    )
+    was_empty = created or not stage_group.members.exists()
+    stage_group.members.add(*members)
+    if was_empty:
+        stage_group.admins.add(members[0])
+    return stage_group
+
+
+def serialize_message(message):
+    """JSON-ready representation of a chat message"""
+    sender = message.sender
+    return {
+        'id': message.id,
+        'group_id': message.group_id,
+        'sender_id': sender.id,
+        'sender_name': sender.user.get_full_name(),
+        'sender_photo': rendition_url(sender.profile_photo, 'thumb') or None,
+        'content': message.content,
+        'message_type': message.message_type,
+        'created_at': message.created_at.isoformat(),
+    }
+
+
+def messages_since(chat, after_id=0, limit=50):
+    """
+    Messages in a chat with an id greater than ``after_id``, oldest first.
+
+    Returns:
+        tuple: ``(messages, has_more)``
+    """
+    messages = list(
+        ChatMessage.objects.filter(group=chat, is_deleted=False, id__gt=after_id)
+        .select_related('sender__user')
+        .order_by('id')[:limit + 1]
+    )
+    return messages[:limit], len(messages) > limit
+
+
+def encode_cursor(message):
+    """Opaque history cursor for a message: ``<created_at in microseconds>.<id>``"""
+    return f'{(message.created_at - _EPOCH) // timedelta(microseconds=1)}.{message.id}'
+
+
+def decode_cursor(value):
+    """
+    Parse a cursor made by ``encode_cursor``.
+
+    Returns:
+        tuple: ``(created_at, id)``
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    micros, _, message_id = value.partition('.')
+    try:
+        return _EPOCH + timedelta(microseconds=int(micros)), int(message_id)
+    except OverflowError:
+        raise ValueError(f'Cursor timestamp out of range: {micros}')
+
+
+def history_window(chat, before=None, after=None, limit=None):
+    """
+    A window of a chat's history, oldest first.
+
+    Without a cursor the newest ``limit`` messages (``CHAT_HISTORY_PAGE_SIZE``
+    by default) are returned. With ``before`` the window ends just before that
+    cursor, and with ``after`` it starts just after it.
+
+    Returns:
+        tuple: ``(messages, has_more)``; ``has_more`` tells whether further
+        messages exist in the direction being paged
+    """
+    limit = limit or _history_page_size()
+    messages = ChatMessage.objects.filter(group=chat, is_deleted=False).select_related('sender__user')
+    if after:
+        created_at, message_id = decode_cursor(after)
+        messages = messages.filter(created_at__gte=created_at).exclude(
+            Q(created_at=created_at) & Q(id__lte=message_id)
+        ).order_by('created_at', 'id')
+    else:
+        if before:
+            created_at, message_id = decode_cursor(before)
+            messages = messages.filter(created_at__lte=created_at).exclude(
+                Q(created_at=created_at) & Q(id__gte=message_id)
+            )
+        messages = messages.order_by('-created_at', '-id')
+
+    window = list(messages[:limit + 1])
+    has_more = len(window) > limit
+    window = window[:limit]
+    if not after:
+        window.reverse()
+    return window, has_more
@@ -0,0 +1,170 @@
+"""
+WebSocket endpoint for group chats.
+
+``websocket_application`` is a plain ASGI application mounted by
+``bodaboda_welfare.asgi`` for ``/ws/chats/<chat_id>/``. A connected client
+receives every event published to the chat on the configured broker:
+
+* ``{"type": "message", "message": {...}}`` for each new ``ChatMessage``
+* ``{"type": "typing", "member_id": ..., "name": ...}``
+* ``{"type": "presence", "member_id": ..., "name": ..., "status": "online" | "offline"}``
+  when a member opens their first or closes their last socket on the chat
+
+and may send:
+
+* ``{"type": "message", "content": "..."}`` to post a message
+* ``{"type": "typing"}`` while composing
+* ``{"type": "read", "message_id": ...}`` to advance its read watermark
+
+The session cookie authenticates the socket, and the Origin header must name
+one of ``ALLOWED_HOSTS``.
+"""
+
+import asyncio
+import json
+import re
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import urlparse
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.http.cookie import parse_cookie
+from django.http.request import validate_host
+
+from members import presence
+from . import receipts
+from .broker import get_broker, group_channel, publish_to_group
+from .chat import has_chat_access
+
+CHAT_PATH = re.compile(r'^/ws/chats/(?P<chat_id>\d+)/$')
+
+# Close codes sent to the client
+NOT_FOUND = 4404
+FORBIDDEN = 4403
+
+
+def _headers(scope):
+    return {name.decode('latin1').lower(): value.decode('latin1') for name, value in scope.get('headers', [])}
+
+
+def _origin_allowed(headers):
+    origin = headers.get('origin')
+    if not origin:
+        return True
+    allowed_hosts = settings.ALLOWED_HOSTS or (['.localhost', '127.0.0.1', '[::1]'] if settings.DEBUG else [])
+    return validate_host(urlparse(origin).hostname or '', allowed_hosts)
+
+
+def _authorize(headers, chat_id):
+    """Resolve the member behind the session cookie and check chat access"""
+    from members.models import Member
+    from .models import GroupChat
+
+    session_key = parse_cookie(headers.get('cookie', '')).get(settings.SESSION_COOKIE_NAME)
+    if not session_key:
+        return None
+    session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+    user = get_user(SimpleNamespace(session=session))
+    if not user.is_authenticated:
+        return None
+    try:
+        member = Member.objects.select_related('user').get(user=user)
+        chat = GroupChat.objects.get(id=chat_id)
+    except (Member.DoesNotExist, GroupChat.DoesNotExist):
+        return None
+    return member if has_chat_access(member, chat) else None
+
+
+def _post_message(member, chat_id, content):
+    from .models import ChatMessage
+
+    message = ChatMessage.objects.create(group_id=chat_id, sender=member, content=content)
+    receipts.mark_read(member.id, chat_id, message.id)
+    presence.record_heartbeat(member.id)
+
+
+async def websocket_application(scope, receive, send):
+    match = CHAT_PATH.match(scope['path'])
+    event = await receive()
+    if event['type'] != 'websocket.connect':
+        return
+
+    headers = _headers(scope)
+    if not match:
+        await send({'type': 'websocket.close', 'code': NOT_FOUND})
+        return
+    chat_id = int(match.group('chat_id'))
+    member = await sync_to_async(_authorize)(headers, chat_id) if _origin_allowed(headers) else None
+    if member is None:
+        await send({'type': 'websocket.close', 'code': FORBIDDEN})
+        return
+
+    await send({'type': 'websocket.accept'})
+    await ChatSocket(member, chat_id, send).run(receive)
+
+
+class ChatSocket:
+    """One accepted chat connection"""
+
+    def __init__(self, member, chat_id, send):
+        self.member = member
+        self.chat_id = chat_id
+        self.send = send
+        self.name = member.user.get_full_name()
+
+    async def publish(self, event):
+        await sync_to_async(publish_to_group)(self.chat_id, event)
+
+    async def publish_presence(self, status):
+        await self.publish({'type': 'presence', 'member_id': self.member.id, 'name': self.name, 'status': status})
+
+    async def forward(self, subscription):
+        async for event in subscription:
+            await self.send({'type': 'websocket.send', 'text': json.dumps(event)})
+
+    async def run(self, receive):
+        broker = get_broker()
+        channel = group_channel(self.chat_id)
+        subscription = broker.subscribe(channel)
+        forwarder = asyncio.create_task(self.forward(subscription))
+        await sync_to_async(presence.record_heartbeat)(self.member.id)
+        if await sync_to_async(broker.connect)(channel, self.member.id) == 1:
+            await self.publish_presence('online')
+        try:
+            while True:
+                event = await receive()
+                if event['type'] == 'websocket.disconnect':
+                    break
+                if event['type'] == 'websocket.receive' and event.get('text'):
+                    await self.handle(event['text'])
+        finally:
+            forwarder.cancel()
+            await asyncio.gather(forwarder, return_exceptions=True)
+            await subscription.aclose()
+            # The member may still have the chat open in another tab
+            if not await sync_to_async(broker.disconnect)(channel, self.member.id):
+                await self.publish_presence('offline')
+
+    async def handle(self, text):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return
+        if not isinstance(data, dict):
+            return
+
+        kind = data.get('type')
+        if kind == 'message':
+            content = str(data.get('content', '')).strip()
+            if content:
+                await sync_to_async(_post_message)(self.member, self.chat_id, content)
+        elif kind == 'typing':
+            await self.publish({'type': 'typing', 'member_id': self.member.id, 'name': self.name})
+        elif kind == 'read':
+            try:
+                message_id = int(data.get('message_id'))
+            except (TypeError, ValueError):
+                return
+            await sync_to_async(receipts.mark_read)(self.member.id, self.chat_id, message_id)
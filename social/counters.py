@@ -0,0 +1,78 @@
+"""
+Engagement counters on posts and comments.
+
+``Post.likes_count``, ``Post.comments_count`` and ``Comment.likes_count`` are
+adjusted with F() updates by the signal handlers in ``social.signals`` as
+like and comment rows come and go, so concurrent likes are never lost and
+the post row is not rewritten. ``rebuild_engagement_counts`` recomputes them
+from the ``PostLike``, ``Comment`` and ``CommentLike`` tables.
+"""
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, CommentLike, Post, PostLike
+
+# (counted model, counter field, source model, source foreign key)
+COUNTERS = [
+    (Post, 'likes_count', PostLike, 'post'),
+    (Post, 'comments_count', Comment, 'post'),
+    (Comment, 'likes_count', CommentLike, 'comment'),
+]
+
+
+def adjust_counter(model, pk, field, delta):
+    """Add ``delta`` to a counter without reading the row"""
+    model.objects.filter(pk=pk).update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def liked_post_ids(member, post_ids):
+    """Which of ``post_ids`` the member has liked, in one query"""
+    return set(
+        PostLike.objects.filter(user=member, post_id__in=post_ids).values_list('post_id', flat=True)
+    )
+
+
+def _actual_count(source, foreign_key):
+    counts = (
+        source.objects.filter(**{foreign_key: OuterRef('pk')})
+        .order_by()
+        .values(foreign_key)
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def _drifted(model, field, source, foreign_key):
+    return model.objects.annotate(actual=_actual_count(source, foreign_key)).exclude(**{field: F('actual')})
+
+
+def rebuild_engagement_counts():
+    """
+    Recompute every engagement counter from the like and comment tables.
+
+    Returns:
+        int: Number of counters corrected
+    """
+    corrected = 0
+    for model, field, source, foreign_key in COUNTERS:
+        drifted_ids = list(_drifted(model, field, source, foreign_key).values_list('pk', flat=True))
+        corrected += model.objects.filter(pk__in=drifted_ids).update(
+            **{field: _actual_count(source, foreign_key)}
+        )
+    return corrected
+
+
+def check_engagement_counts():
+    """
+    Compare stored counters with the like and comment tables.
+
+    Returns:
+        list: ``(model_name, pk, field, stored, actual)`` for every counter that drifted
+    """
+    problems = []
+    for model, field, source, foreign_key in COUNTERS:
+        for pk, stored, actual in _drifted(model, field, source, foreign_key).values_list('pk', field, 'actual'):
+            problems.append((model.__name__, pk, field, stored, actual))
+    return problems
@@ -0,0 +1,135 @@
+"""
+Friendship graph.
+
+Each member's adjacency sets are cached: their accepted friends and everyone
+they have any friendship row with (pending, accepted or blocked). Both are
+built with one query per direction so each side reads its own index, and
+they are dropped whenever one of the member's friendships is written or
+deleted (see ``social.signals``).
+
+Invalidation only reaches other processes through a shared cache backend.
+With a per-process backend such as ``LocMemCache`` the sets are kept for
+``SOCIAL_FRIENDS_LOCAL_CACHE_TIMEOUT`` seconds instead, so other workers see
+a changed friendship, and fan out new posts to it, within that time.
+
+``suggest_friends`` ranks friends of friends by the number of friends they
+share with the member, reading all the adjacency sets it needs in one batch.
+"""
+
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Friendship
+
+FRIENDS_KEY_PREFIX = 'social:friends:'
+CONNECTIONS_KEY_PREFIX = 'social:connections:'
+
+
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def _cache_timeout():
+    if settings.CACHES['default']['BACKEND'] in PROCESS_LOCAL_BACKENDS:
+        return getattr(settings, 'SOCIAL_FRIENDS_LOCAL_CACHE_TIMEOUT', 30)
+    return getattr(settings, 'SOCIAL_FRIENDS_CACHE_TIMEOUT', 3600)
+
+
+def _adjacency(member_ids, prefix, statuses=None):
+    """
+    Cached adjacency sets for several members.
+
+    Returns:
+        dict: Member id to a set of neighbouring member ids
+    """
+    member_ids = set(member_ids)
+    keys = {f'{prefix}{member_id}': member_id for member_id in member_ids}
+    found = cache.get_many(keys)
+    result = {keys[key]: neighbours for key, neighbours in found.items()}
+
+    missing = member_ids - result.keys()
+    if missing:
+        computed = {member_id: set() for member_id in missing}
+        sent = Friendship.objects.filter(requester_id__in=missing)
+        received = Friendship.objects.filter(receiver_id__in=missing)
+        if statuses:
+            sent = sent.filter(status__in=statuses)
+            received = received.filter(status__in=statuses)
+        for requester_id, receiver_id in sent.values_list('requester_id', 'receiver_id'):
+            computed[requester_id].add(receiver_id)
+        for receiver_id, requester_id in received.values_list('receiver_id', 'requester_id'):
+            computed[receiver_id].add(requester_id)
+        cache.set_many(
+            {f'{prefix}{member_id}': neighbours for member_id, neighbours in computed.items()},
+            _cache_timeout()
+        )
+        result.update(computed)
+    return result
+
+
+def friend_ids_many(member_ids):
+    """Accepted friend ids for several members, keyed by member id"""
+    return _adjacency(member_ids, FRIENDS_KEY_PREFIX, statuses=['accepted'])
+
+
+def friend_ids(member_id):
+    """Ids of a member's accepted friends"""
+    return set(friend_ids_many([member_id])[member_id])
+
+
+def connected_ids(member_id):
+    """Ids of every member with a friendship row to or from this member, in any status"""
+    return set(_adjacency([member_id], CONNECTIONS_KEY_PREFIX)[member_id])
+
+
+def invalidate_friends(member_ids):
+    """Drop cached adjacency sets now and again once the current transaction commits"""
+    keys = [
+        f'{prefix}{member_id}'
+        for member_id in set(member_ids)
+        for prefix in (FRIENDS_KEY_PREFIX, CONNECTIONS_KEY_PREFIX)
+    ]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def suggest_friends(member, limit=5):
+    """
+    Members the given member may know, most mutual friends first.
+
+    Friends of friends are ranked by mutual-friend count. When there are not
+    enough of them, the list is topped up with active members of the same
+    stage.
+
+    Returns:
+        list: ``Member`` objects with a ``mutual_friends`` attribute
+    """
+    from members.models import Member
+
+    friends = friend_ids(member.id)
+    excluded = connected_ids(member.id) | {member.id}
+
+    mutual = Counter()
+    for neighbours in friend_ids_many(friends).values():
+        mutual.update(neighbours - excluded)
+
+    # Rank a few spares so that inactive candidates can be dropped
+    ranked = sorted(mutual, key=lambda member_id: (-mutual[member_id], member_id))[:limit * 2]
+    candidates = Member.objects.filter(status='active').select_related('user', 'stage')
+    by_id = {candidate.id: candidate for candidate in candidates.filter(id__in=ranked)}
+    suggestions = [by_id[member_id] for member_id in ranked if member_id in by_id][:limit]
+
+    if len(suggestions) < limit and member.stage_id:
+        excluded.update(suggestion.id for suggestion in suggestions)
+        suggestions.extend(
+            candidates.filter(stage_id=member.stage_id).exclude(id__in=excluded)[:limit - len(suggestions)]
+        )
+
+    for suggestion in suggestions:
+        suggestion.mutual_friends = mutual.get(suggestion.id, 0)
+    return suggestions
@@ -0,0 +1,125 @@
+"""
+Unread social notification counters.
+
+Each member's ``NotificationInbox`` row holds how many of their social
+notifications are unread. It is created from a COUNT the first time it is
+needed and then kept current: the notification worker adds the rows it
+inserts, signals cover notifications saved or deleted one at a time, and
+``mark_read`` subtracts the rows it marks. ``manage.py
+reconcile_notification_counts`` repairs any drift.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import NotificationInbox, SocialNotification
+
+
+def count_unread(member_id):
+    """Count a member's unread notifications without the counter"""
+    return SocialNotification.objects.filter(recipient_id=member_id, is_read=False).count()
+
+
+def _create_inbox(member_id):
+    """
+    Create a member's inbox from the notifications table.
+
+    Returns:
+        NotificationInbox: The new row, or None if another request created it first
+    """
+    try:
+        with transaction.atomic():
+            return NotificationInbox.objects.create(member_id=member_id, unread_count=count_unread(member_id))
+    except IntegrityError:
+        return None
+
+
+def adjust_unread(member_id, delta):
+    """Add ``delta`` to a member's unread counter without reading it"""
+    def apply():
+        return NotificationInbox.objects.filter(member_id=member_id).update(
+            unread_count=Greatest(F('unread_count') + delta, 0),
+            updated_at=timezone.now()
+        )
+
+    # A new inbox is counted from the table, which already includes the change
+    if not apply() and _create_inbox(member_id) is None:
+        apply()
+
+
+def add_unread(counts):
+    """Add newly delivered notifications, given as ``{member_id: count}``"""
+    for member_id, count in counts.items():
+        if count:
+            adjust_unread(member_id, count)
+
+
+def unread_count(member_id):
+    """A member's unread notification count, read from their inbox"""
+    count = NotificationInbox.objects.filter(member_id=member_id).values_list('unread_count', flat=True).first()
+    if count is None:
+        inbox = _create_inbox(member_id)
+        count = inbox.unread_count if inbox else unread_count(member_id)
+    return count
+
+
+def latest_notification_id(member_id):
+    return SocialNotification.objects.filter(recipient_id=member_id).order_by('-id').values_list('id', flat=True).first()
+
+
+def mark_read(member_id, up_to_id=None):
+    """
+    Mark a member's notifications read up to and including ``up_to_id``
+    (default: all of them).
+
+    Returns:
+        int: Number of notifications marked read
+    """
+    notifications = SocialNotification.objects.filter(recipient_id=member_id, is_read=False)
+    if up_to_id is not None:
+        notifications = notifications.filter(id__lte=up_to_id)
+    marked = notifications.update(is_read=True)
+    if marked:
+        adjust_unread(member_id, -marked)
+    return marked
+
+
+def _actual_unread():
+    counts = (
+        SocialNotification.objects.filter(recipient_id=OuterRef('member_id'), is_read=False)
+        .order_by()
+        .values('recipient_id')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def _drifted(member_ids=None):
+    inboxes = NotificationInbox.objects.all()
+    if member_ids is not None:
+        inboxes = inboxes.filter(member_id__in=member_ids)
+    return inboxes.annotate(actual=_actual_unread()).exclude(unread_count=F('actual'))
+
+
+def rebuild_unread_counts(member_ids=None):
+    """
+    Recompute unread counters from the notifications table.
+
+    Returns:
+        int: Number of counters corrected
+    """
+    drifted_ids = list(_drifted(member_ids).values_list('pk', flat=True))
+    return NotificationInbox.objects.filter(pk__in=drifted_ids).update(unread_count=_actual_unread())
+
+
+def check_unread_counts():
+    """
+    Compare stored unread counters with the notifications table.
+
+    Returns:
+        list: ``(member_id, stored, actual)`` for every counter that drifted
+    """
+    return list(_drifted().values_list('member_id', 'unread_count', 'actual'))
@@ -0,0 +1,99 @@
+"""
+Management command to benchmark loading chat history.
+"""
+
+import random
+
+from django.core.management.base import BaseCommand
+from bodaboda_welfare.benchmarking import format_timing, rolled_back, timed
+from bodaboda_welfare.testing import make_members, make_stage
+from members.models import Member
+from social.chat import encode_cursor, history_window
+from social.models import ChatMessage, GroupChat
+
+
+class Command(BaseCommand):
+    help = 'Compare loading a whole chat with keyset history windows (all data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--messages',
+            type=int,
+            default=1000000,
+            help='Number of messages to create in the chat (default: 1000000)'
+        )
+        parser.add_argument(
+            '--members',
+            type=int,
+            default=50,
+            help='Number of members posting in the chat (default: 50)'
+        )
+        parser.add_argument(
+            '--window',
+            type=int,
+            default=50,
+            help='Messages per history window (default: 50)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=50,
+            help='Window loads to time per scenario (default: 50)'
+        )
+        parser.add_argument(
+            '--full-repeat',
+            type=int,
+            default=3,
+            help='Full chat loads to time (default: 3)'
+        )
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        window = options['window']
+
+        with rolled_back():
+            stage = make_stage()
+            make_members(options['members'], stage)
+            members = list(Member.objects.filter(stage=stage))
+            chat = GroupChat.objects.create(name=f'{stage.name} Main Chat', stage=stage)
+
+            self.stdout.write(f"Creating {options['messages']} messages...")
+            batch = []
+            for i in range(options['messages']):
+                batch.append(ChatMessage(
+                    group=chat,
+                    sender=random.choice(members),
+                    content='Benchmark message',
+                    is_deleted=random.random() < 0.01
+                ))
+                if len(batch) == 10000:
+                    ChatMessage.objects.bulk_create(batch)
+                    batch = []
+            ChatMessage.objects.bulk_create(batch)
+
+            message_ids = list(ChatMessage.objects.filter(group=chat).values_list('id', flat=True))
+            cursors = [
+                encode_cursor(message)
+                for message in ChatMessage.objects.filter(id__in=random.sample(message_ids, min(repeat, len(message_ids))))
+            ]
+
+            def full_load():
+                return list(chat.messages.filter(is_deleted=False).select_related('sender__user'))
+
+            results = [
+                ('Before, whole chat', timed(full_load, options['full_repeat'])),
+                ('After, newest window', timed(lambda: history_window(chat, limit=window), repeat)),
+                ('After, older window', timed(
+                    lambda: history_window(chat, before=random.choice(cursors), limit=window), repeat
+                )),
+                ('After, newer window', timed(
+                    lambda: history_window(chat, after=random.choice(cursors), limit=window), repeat
+                )),
+            ]
+
+        for label, result in results:
+            self.stdout.write(format_timing(label, result))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Benchmarked {window}-message windows over a chat of {options['messages']} messages"
+        ))
@@ -0,0 +1,135 @@
+"""
+Management command to benchmark the social feed.
+"""
+
+import random
+
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db.models import Q
+from bodaboda_welfare.benchmarking import format_timing, rolled_back, timed
+from bodaboda_welfare.testing import make_members, make_stage
+from members.models import Member
+from social.friends import friend_ids
+from social.models import Friendship, Post
+from social.timelines import rebuild_timelines, timeline_page
+
+PAGE_SIZE = 10
+
+
+def legacy_feed_page(member, page_number):
+    """The OR query and OFFSET pagination the feed used to run"""
+    friends = friend_ids(member.id)
+    posts = Post.objects.filter(
+        Q(author__in=friends) |
+        Q(stage=member.stage) |
+        Q(stage__isnull=True) |
+        Q(post_type='announcement')
+    ).select_related('author__user', 'stage').prefetch_related('likes', 'comments')
+    return list(Paginator(posts, PAGE_SIZE).get_page(page_number))
+
+
+class Command(BaseCommand):
+    help = 'Compare the OR-query feed with precomputed timelines (all data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts',
+            type=int,
+            default=100000,
+            help='Number of posts to create (default: 100000)'
+        )
+        parser.add_argument(
+            '--members',
+            type=int,
+            default=400,
+            help='Number of members to create (default: 400)'
+        )
+        parser.add_argument(
+            '--stages',
+            type=int,
+            default=4,
+            help='Number of stages to spread members over (default: 4)'
+        )
+        parser.add_argument(
+            '--friends',
+            type=int,
+            default=10,
+            help='Friends per member (default: 10)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=50,
+            help='Feed loads to time per scenario (default: 50)'
+        )
+        parser.add_argument(
+            '--depth',
+            type=int,
+            default=50,
+            help='Page number used for the deep-page scenario (default: 50)'
+        )
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        depth = options['depth']
+        
+        with rolled_back():
+            stages = [make_stage() for _ in range(options['stages'])]
+            per_stage = max(options['members'] // len(stages), 1)
+            for stage in stages:
+                make_members(per_stage, stage)
+            members = list(Member.objects.filter(stage__in=stages).select_related('stage'))
+            
+            Friendship.objects.bulk_create([
+                Friendship(requester=member, receiver=friend, status='accepted')
+                for member in members
+                for friend in random.sample(members, min(options['friends'], len(members)))
+                if friend.id > member.id
+            ], ignore_conflicts=True)
+            
+            post_types = ['text'] * 8 + ['safety_tip', 'announcement']
+            self.stdout.write(f"Creating {options['posts']} posts...")
+            authors = [random.choice(members) for _ in range(options['posts'])]
+            Post.objects.bulk_create([
+                Post(
+                    author=author,
+                    content='Benchmark post',
+                    post_type=random.choice(post_types),
+                    stage_id=None if random.random() < 0.05 else author.stage_id
+                )
+                for author in authors
+            ], batch_size=5000)
+            
+            self.stdout.write('Building timelines...')
+            rebuild_timelines(Member.objects.filter(stage__in=stages))
+            
+            def deep_cursor(member):
+                before = None
+                for _ in range(depth - 1):
+                    _, before = timeline_page(member, before=before, limit=PAGE_SIZE)
+                return before
+            
+            sample = random.sample(members, min(repeat, len(members)))
+            cursors = {member.id: deep_cursor(member) for member in sample[:10]}
+            deep_sample = [member for member in sample if member.id in cursors]
+            
+            def pick(pool):
+                return random.choice(pool)
+            
+            results = [
+                ('Before, first page', timed(lambda: legacy_feed_page(pick(sample), 1), repeat)),
+                ('After, first page', timed(lambda: timeline_page(pick(sample), limit=PAGE_SIZE), repeat)),
+                (f'Before, page {depth}', timed(lambda: legacy_feed_page(pick(deep_sample), depth), repeat)),
+                (f'After, page {depth}', timed(
+                    lambda: (lambda member: timeline_page(member, before=cursors[member.id], limit=PAGE_SIZE))(pick(deep_sample)),
+                    repeat
+                )),
+            ]
+        
+        for label, result in results:
+            self.stdout.write(format_timing(label, result))
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Benchmarked {repeat} feed loads per scenario over {options['posts']} posts and {len(members)} members"
+        ))
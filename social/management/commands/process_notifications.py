@@ -0,0 +1,68 @@
+"""
+Management command to deliver queued social notifications.
+Run it as a long-lived worker, or with --once from a cron job.
+"""
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from social.notifications import process_batch, requeue_stale_jobs, worker_id
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued social notifications in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Jobs claimed per batch (default: 500)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of waiting for new jobs'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=2.0,
+            help='Seconds to wait when the queue is empty (default: 2)'
+        )
+        parser.add_argument(
+            '--stale-minutes',
+            type=int,
+            default=5,
+            help='Release jobs claimed longer ago than this by workers that died (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        worker = worker_id()
+        stale_after = timedelta(minutes=options['stale_minutes'])
+        processed = failed = 0
+
+        self.stdout.write(f'Notification worker {worker} started')
+        try:
+            while True:
+                released = requeue_stale_jobs(stale_after)
+                if released:
+                    self.stdout.write(self.style.WARNING(f'Released {released} stale jobs'))
+
+                batch_processed, batch_failed = process_batch(worker, options['batch_size'])
+                processed += batch_processed
+                failed += batch_failed
+                if batch_failed:
+                    self.stdout.write(self.style.ERROR(f'{batch_failed} jobs failed and will be retried'))
+
+                if not batch_processed:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} notification jobs ({failed} failed)'
+        ))
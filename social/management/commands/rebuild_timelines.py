@@ -0,0 +1,38 @@
+"""
+Management command to rebuild the precomputed social feed timelines.
+"""
+
+from django.core.management.base import BaseCommand
+from members.models import Member
+from social.timelines import rebuild_timelines
+
+
+class Command(BaseCommand):
+    help = 'Rebuild member feed timelines from recent friend, own and stage posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--member',
+            type=int,
+            help='Only rebuild the timeline of this member id'
+        )
+        parser.add_argument(
+            '--stage',
+            type=int,
+            help='Only rebuild the timelines of members of this stage id'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Posts to keep per timeline (default: SOCIAL_TIMELINE_BACKFILL)'
+        )
+
+    def handle(self, *args, **options):
+        members = Member.objects.only('id', 'stage_id')
+        if options['member']:
+            members = members.filter(id=options['member'])
+        if options['stage']:
+            members = members.filter(stage_id=options['stage'])
+        
+        rebuilt = rebuild_timelines(members, options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} timelines'))
@@ -0,0 +1,33 @@
+"""
+Management command to reconcile the unread notification counters.
+"""
+
+from django.core.management.base import BaseCommand
+from social.inbox import check_unread_counts, rebuild_unread_counts
+
+
+class Command(BaseCommand):
+    help = 'Recompute the unread notification counters from the SocialNotification table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report counters that differ from the notifications table, without changing them'
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            problems = check_unread_counts()
+            for member_id, stored, actual in problems:
+                self.stdout.write(
+                    self.style.WARNING(f'Member #{member_id} unread notifications: stored {stored}, actual {actual}')
+                )
+            if problems:
+                self.stdout.write(self.style.ERROR(f'{len(problems)} counters are out of date'))
+            else:
+                self.stdout.write(self.style.SUCCESS('All unread notification counters are consistent'))
+            return
+
+        corrected = rebuild_unread_counts()
+        self.stdout.write(self.style.SUCCESS(f'Reconciled unread notification counters ({corrected} corrected)'))
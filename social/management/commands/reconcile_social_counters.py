@@ -0,0 +1,33 @@
+"""
+Management command to reconcile the like and comment counters on posts and comments.
+"""
+
+from django.core.management.base import BaseCommand
+from social.counters import check_engagement_counts, rebuild_engagement_counts
+
+
+class Command(BaseCommand):
+    help = 'Recompute post and comment like/comment counters from the PostLike, Comment and CommentLike tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report counters that differ from the source tables, without changing them'
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            problems = check_engagement_counts()
+            for model_name, pk, field, stored, actual in problems:
+                self.stdout.write(
+                    self.style.WARNING(f'{model_name} #{pk} {field}: stored {stored}, actual {actual}')
+                )
+            if problems:
+                self.stdout.write(self.style.ERROR(f'{len(problems)} counters are out of date'))
+            else:
+                self.stdout.write(self.style.SUCCESS('All engagement counters are consistent'))
+            return
+
+        corrected = rebuild_engagement_counts()
+        self.stdout.write(self.style.SUCCESS(f'Reconciled engagement counters ({corrected} corrected)'))
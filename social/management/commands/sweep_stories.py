@@ -0,0 +1,51 @@
+"""
+Management command to delete expired stage stories.
+Run this periodically (e.g., hourly) via cron job.
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from social.stories import sweep_expired_stories
+
+
+class Command(BaseCommand):
+    help = 'Delete expired stage stories together with their views and images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours',
+            type=int,
+            default=0,
+            help='Keep stories for this many hours after they expire (default: 0)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Stories deleted per transaction (default: 500)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report what would be deleted'
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(hours=options['grace_hours'])
+        stories, views, images = sweep_expired_stories(
+            before=before,
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run']
+        )
+        
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f'Would delete {stories} expired stories, {views} story views and {images} images'
+            ))
+            return
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {stories} expired stories, {views} story views and {images} images'
+        ))
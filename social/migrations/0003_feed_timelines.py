@@ -0,0 +1,77 @@
+# Generated by Django 5.2.4 on 2026-10-17 15:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def populate_timelines(apps, schema_editor):
+    Member = apps.get_model('members', 'Member')
+    Friendship = apps.get_model('social', 'Friendship')
+    Post = apps.get_model('social', 'Post')
+    Stage = apps.get_model('stages', 'Stage')
+    TimelineEntry = apps.get_model('social', 'TimelineEntry')
+
+    limit = getattr(settings, 'SOCIAL_TIMELINE_BACKFILL', 200)
+    fanout_limit = getattr(settings, 'SOCIAL_FANOUT_STAGE_LIMIT', 500)
+    fanned_out_stages = set(Stage.objects.filter(member_count__lte=fanout_limit).values_list('id', flat=True))
+    posts = Post.objects.exclude(stage__isnull=True).exclude(post_type='announcement')
+
+    for member in Member.objects.only('id', 'stage_id').iterator(chunk_size=500):
+        pairs = Friendship.objects.filter(
+            Q(requester_id=member.id) | Q(receiver_id=member.id), status='accepted'
+        ).values_list('requester_id', 'receiver_id')
+        sources = Q(author_id=member.id) | Q(author_id__in={a if b == member.id else b for a, b in pairs})
+        if member.stage_id in fanned_out_stages:
+            sources |= Q(stage_id=member.stage_id)
+        post_ids = posts.filter(sources).order_by('-id').values_list('id', flat=True)[:limit]
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(member_id=member.id, post_id=post_id) for post_id in post_ids],
+            ignore_conflicts=True
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0007_memberprofile'),
+        ('social', '0002_add_created_by_to_groupchat'),
+        ('stages', '0006_organization_member_count_stage_member_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['stage', '-id'], name='social_post_stage_id'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['post_type', '-id'], name='social_post_type_id'),
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='member',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to='members.member'),
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='social.post'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['member', '-post'], name='social_timeline_member_post'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='timelineentry',
+            unique_together={('member', 'post')},
+        ),
+        migrations.RunPython(populate_timelines, migrations.RunPython.noop),
+    ]
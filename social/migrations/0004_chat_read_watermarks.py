@@ -0,0 +1,58 @@
+# Generated by Django 5.2.4 on 2026-10-17 15:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def watermarks_from_receipts(apps, schema_editor):
+    MessageRead = apps.get_model('social', 'MessageRead')
+    ChatReadWatermark = apps.get_model('social', 'ChatReadWatermark')
+
+    rows = (
+        MessageRead.objects.values('user_id', 'message__group_id')
+        .annotate(last_read=Max('message_id'))
+        .order_by()
+    )
+    ChatReadWatermark.objects.bulk_create([
+        ChatReadWatermark(member_id=row['user_id'], group_id=row['message__group_id'], last_read_message_id=row['last_read'])
+        for row in rows.iterator(chunk_size=2000)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0007_memberprofile'),
+        ('social', '0003_feed_timelines'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatReadWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_message_id', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['group', 'id'], name='social_chatmessage_group_id'),
+        ),
+        migrations.AddField(
+            model_name='chatreadwatermark',
+            name='group',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_watermarks', to='social.groupchat'),
+        ),
+        migrations.AddField(
+            model_name='chatreadwatermark',
+            name='member',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_read_watermarks', to='members.member'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='chatreadwatermark',
+            unique_together={('member', 'group')},
+        ),
+        migrations.RunPython(watermarks_from_receipts, migrations.RunPython.noop),
+    ]
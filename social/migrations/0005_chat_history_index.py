@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0007_memberprofile'),
+        ('social', '0004_chat_read_watermarks'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['group', 'created_at', 'id'], name='social_chatmsg_history'),
+        ),
+    ]
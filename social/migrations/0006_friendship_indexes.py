@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-17 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0007_memberprofile'),
+        ('social', '0005_chat_history_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(fields=['requester', 'status', 'receiver'], name='social_friendship_sent'),
+        ),
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(fields=['receiver', 'status', 'requester'], name='social_friendship_received'),
+        ),
+    ]
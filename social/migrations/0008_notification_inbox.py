@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-17 16:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0007_memberprofile'),
+        ('social', '0007_notification_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationInbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='socialnotification',
+            index=models.Index(fields=['recipient', '-created_at'], name='social_notif_recipient'),
+        ),
+        migrations.AddIndex(
+            model_name='socialnotification',
+            index=models.Index(fields=['recipient', 'is_read', 'id'], name='social_notif_unread'),
+        ),
+        migrations.AddField(
+            model_name='notificationinbox',
+            name='member',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='notification_inbox', to='members.member'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-17 16:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0007_memberprofile'),
+        ('social', '0008_notification_inbox'),
+        ('stages', '0006_organization_member_count_stage_member_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stagestory',
+            index=models.Index(fields=['stage', 'expires_at'], name='social_story_stage_expiry'),
+        ),
+        migrations.AddIndex(
+            model_name='stagestory',
+            index=models.Index(fields=['expires_at'], name='social_story_expiry'),
+        ),
+    ]
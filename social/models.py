@@ -1,6 +1,8 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from members.models import Member
+from bodaboda_welfare.models_utils import counter_safe_save_kwargs
 from stages.models import Stage
 
 class Post(models.Model):
@@ -40,9 +42,34 @@ class Post(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['stage', '-id'], name='social_post_stage_id'),
+            models.Index(fields=['post_type', '-id'], name='social_post_type_id'),
+        ]
     
     def __str__(self):
         return f"{self.author.user.get_full_name()}: {self.content[:50]}..."
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **counter_safe_save_kwargs(
+            self, kwargs, counters=('likes_count', 'comments_count', 'shares_count')
+        ))
+
+class TimelineEntry(models.Model):
+    """
+    A post fanned out to a member's precomputed feed timeline
+    """
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    
+    class Meta:
+        unique_together = ('member', 'post')
+        indexes = [
+            models.Index(fields=['member', '-post'], name='social_timeline_member_post'),
+        ]
+    
+    def __str__(self):
+        return f"Post #{self.post_id} in timeline of member #{self.member_id}"
 
 class PostLike(models.Model):
     """
@@ -73,6 +100,9 @@ class Comment(models.Model):
     
     class Meta:
         ordering = ['created_at']
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **counter_safe_save_kwargs(self, kwargs, counters=('likes_count',)))
 
 class CommentLike(models.Model):
     """
@@ -104,6 +134,11 @@ class Friendship(models.Model):
     
     class Meta:
         unique_together = ('requester', 'receiver')
+        indexes = [
+            # One index per direction, covering the adjacency lookups in social.friends
+            models.Index(fields=['requester', 'status', 'receiver'], name='social_friendship_sent'),
+            models.Index(fields=['receiver', 'status', 'requester'], name='social_friendship_received'),
+        ]
     
     def __str__(self):
         return f"{self.requester} -> {self.receiver} ({self.status})"
@@ -158,10 +193,19 @@ class ChatMessage(models.Model):
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['group', 'id'], name='social_chatmessage_group_id'),
+            models.Index(
+                fields=['group', 'created_at', 'id'],
+                condition=models.Q(is_deleted=False),
+                name='social_chatmsg_history'
+            ),
+        ]
 
 class MessageRead(models.Model):
     """
-    Track which messages have been read by which users
+    Track which messages have been read by which users.
+    Superseded by ChatReadWatermark; kept for the existing receipts.
     """
     message = models.ForeignKey(ChatMessage, on_delete=models.CASCADE, related_name='read_receipts')
     user = models.ForeignKey(Member, on_delete=models.CASCADE)
@@ -170,6 +214,22 @@ class MessageRead(models.Model):
     class Meta:
         unique_together = ('message', 'user')
 
+class ChatReadWatermark(models.Model):
+    """
+    The newest message a member has read in a group chat.
+    Every message with a higher id is unread.
+    """
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='chat_read_watermarks')
+    group = models.ForeignKey(GroupChat, on_delete=models.CASCADE, related_name='read_watermarks')
+    last_read_message_id = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('member', 'group')
+    
+    def __str__(self):
+        return f"Member #{self.member_id} read {self.group} up to #{self.last_read_message_id}"
+
 class StageStory(models.Model):
     """
     Stories/updates from different stages (like Instagram stories)
@@ -190,6 +250,10 @@ class StageStory(models.Model):
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = "Stage Stories"
+        indexes = [
+            models.Index(fields=['stage', 'expires_at'], name='social_story_stage_expiry'),
+            models.Index(fields=['expires_at'], name='social_story_expiry'),
+        ]
 
 class StoryView(models.Model):
     """
@@ -228,7 +292,72 @@ class SocialNotification(models.Model):
     message = models.TextField()
     is_read = models.BooleanField(default=False)
     
+    # Members behind an aggregated notification ("Jane and 11 others liked your post");
+    # sender is the most recent of them
+    actor_ids = models.JSONField(default=list, blank=True)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipient', '-created_at'], name='social_notif_recipient'),
+            models.Index(fields=['recipient', 'is_read', 'id'], name='social_notif_unread'),
+        ]
+    
+    @property
+    def actor_count(self):
+        return len(self.actor_ids) or 1
+
+
+class NotificationInbox(models.Model):
+    """
+    Number of unread social notifications per member, kept up to date as
+    notifications are delivered and read so the badge needs no COUNT.
+    """
+    member = models.OneToOneField(Member, on_delete=models.CASCADE, related_name='notification_inbox')
+    unread_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Member #{self.member_id}: {self.unread_count} unread"
+
+
+class NotificationJob(models.Model):
+    """
+    Outbox of social notifications waiting for the notification worker
+    (``manage.py process_notifications``). Rows are written in the same
+    transaction as the action that caused them and deleted once delivered.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('failed', 'Failed'),
+    ]
+    
+    recipient = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='+')
+    sender = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='+')
+    notification_type = models.CharField(max_length=20, choices=SocialNotification.NOTIFICATION_TYPES)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, blank=True, null=True, related_name='+')
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, blank=True, null=True, related_name='+')
+    group = models.ForeignKey(GroupChat, on_delete=models.CASCADE, blank=True, null=True, related_name='+')
+    
+    # Delivery state
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=64, blank=True)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='social_notifjob_queue'),
+            models.Index(fields=['claimed_by'], name='social_notifjob_claim'),
+        ]
+    
+    def __str__(self):
+        return f"{self.notification_type} for {self.recipient_id} ({self.status})"
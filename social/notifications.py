@@ -0,0 +1,253 @@
+"""
+Social notification dispatch.
+
+Views call ``enqueue_notification``, which only writes a ``NotificationJob``
+row in the request's transaction. The notification worker
+(``manage.py process_notifications``) claims pending jobs in batches and
+turns them into ``SocialNotification`` rows:
+
+* likes, comments and story views are aggregated into one unread
+  notification per recipient and post ("Jane and 11 others liked your
+  post"), and each member is only counted once per notification;
+* other notifications are deduplicated within the batch and bulk inserted.
+
+New notifications are added to the recipients' unread counters
+(``social.inbox``) in the same transaction.
+
+A batch that fails is retried job by job so that one bad job cannot hold
+back the rest; failing jobs are retried with backoff until
+``SOCIAL_NOTIFICATION_MAX_ATTEMPTS`` is reached and then left as failed.
+"""
+
+import os
+import socket
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .inbox import add_unread
+from .models import NotificationJob, SocialNotification
+
+AGGREGATED_TYPES = {'like', 'comment', 'story_view'}
+
+MESSAGES = {
+    'like': '{name} liked your post',
+    'comment': '{name} commented on your post',
+    'story_view': '{name} viewed your story',
+    'friend_request': '{name} sent you a friend request',
+    'friend_accepted': '{name} accepted your friend request',
+    'mention': '{name} mentioned you',
+    'group_invite': '{name} invited you to a group chat',
+}
+
+
+def _max_attempts():
+    return getattr(settings, 'SOCIAL_NOTIFICATION_MAX_ATTEMPTS', 5)
+
+
+def worker_id():
+    """Identifier for the current worker process, recorded on the jobs it claims"""
+    return f'{socket.gethostname()[:40]}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def enqueue_notification(recipient, sender, notification_type, post=None, comment=None, group=None):
+    """Queue a notification for the worker. Members are not notified of their own actions."""
+    if recipient.pk == sender.pk:
+        return None
+    return NotificationJob.objects.create(
+        recipient=recipient,
+        sender=sender,
+        notification_type=notification_type,
+        post=post,
+        comment=comment,
+        group=group
+    )
+
+
+def render_message(notification_type, name, actor_count=1):
+    """Notification text, naming the most recent actor and counting the rest"""
+    others = actor_count - 1
+    if others:
+        name = f"{name} and {others} other{'s' if others > 1 else ''}"
+    return MESSAGES[notification_type].format(name=name)
+
+
+def requeue_stale_jobs(older_than):
+    """
+    Release jobs claimed by workers that stopped before finishing them.
+
+    Returns:
+        int: Number of jobs released
+    """
+    return NotificationJob.objects.filter(
+        status='processing',
+        claimed_at__lt=timezone.now() - older_than
+    ).update(status='pending', claimed_by='', claimed_at=None)
+
+
+def claim_jobs(worker, limit):
+    """Claim up to ``limit`` due jobs for a worker"""
+    now = timezone.now()
+    job_ids = list(
+        NotificationJob.objects.filter(status='pending', available_at__lte=now)
+        .order_by('id').values_list('id', flat=True)[:limit]
+    )
+    if not job_ids:
+        return []
+    # Only rows still pending are claimed, so concurrent workers never share a job
+    NotificationJob.objects.filter(id__in=job_ids, status='pending').update(
+        status='processing', claimed_by=worker, claimed_at=now, attempts=F('attempts') + 1
+    )
+    return list(
+        NotificationJob.objects.filter(claimed_by=worker, status='processing')
+        .select_related('sender__user').order_by('id')
+    )
+
+
+def _aggregate_key(job):
+    return (job.recipient_id, job.notification_type, job.post_id, job.group_id)
+
+
+def _plain_key(job):
+    return (job.recipient_id, job.sender_id, job.notification_type, job.post_id, job.comment_id, job.group_id)
+
+
+def _deliver_aggregated(jobs, now):
+    """Fold like, comment and story view jobs into unread aggregate notifications"""
+    groups = {}
+    for job in jobs:
+        groups.setdefault(_aggregate_key(job), []).append(job)
+
+    existing = {}
+    candidates = SocialNotification.objects.filter(
+        is_read=False,
+        recipient_id__in={key[0] for key in groups},
+        notification_type__in={key[1] for key in groups}
+    ).order_by('id')
+    for notification in candidates:
+        key = (notification.recipient_id, notification.notification_type, notification.post_id, notification.group_id)
+        if key in groups:
+            existing[key] = notification
+
+    created, updated = [], []
+    for key, group_jobs in groups.items():
+        # Distinct actors, oldest first, so the last one is the most recent
+        actors = {}
+        for job in group_jobs:
+            actors.pop(job.sender_id, None)
+            actors[job.sender_id] = job
+        latest = group_jobs[-1]
+        notification = existing.get(key)
+
+        if notification is None:
+            created.append(SocialNotification(
+                recipient_id=latest.recipient_id,
+                sender_id=latest.sender_id,
+                notification_type=latest.notification_type,
+                post_id=latest.post_id,
+                comment_id=latest.comment_id,
+                group_id=latest.group_id,
+                actor_ids=list(actors),
+                message=render_message(latest.notification_type, latest.sender.user.get_full_name(), len(actors))
+            ))
+            continue
+
+        known = set(notification.actor_ids or [notification.sender_id])
+        new_actors = [sender_id for sender_id in actors if sender_id not in known]
+        if not new_actors:
+            continue
+        notification.actor_ids = list(known) + new_actors
+        notification.sender_id = latest.sender_id
+        notification.comment_id = latest.comment_id or notification.comment_id
+        notification.message = render_message(
+            latest.notification_type, latest.sender.user.get_full_name(), notification.actor_count
+        )
+        notification.created_at = now
+        updated.append(notification)
+
+    SocialNotification.objects.bulk_create(created)
+    add_unread(Counter(notification.recipient_id for notification in created))
+    SocialNotification.objects.bulk_update(
+        updated, ['sender', 'comment', 'actor_ids', 'message', 'created_at'], batch_size=500
+    )
+    return len(created) + len(updated)
+
+
+def _deliver_plain(jobs):
+    """Insert the remaining notifications, dropping duplicates within the batch"""
+    unique = {}
+    for job in jobs:
+        unique.setdefault(_plain_key(job), job)
+    SocialNotification.objects.bulk_create([
+        SocialNotification(
+            recipient_id=job.recipient_id,
+            sender_id=job.sender_id,
+            notification_type=job.notification_type,
+            post_id=job.post_id,
+            comment_id=job.comment_id,
+            group_id=job.group_id,
+            message=render_message(job.notification_type, job.sender.user.get_full_name())
+        )
+        for job in unique.values()
+    ], batch_size=500)
+    add_unread(Counter(job.recipient_id for job in unique.values()))
+    return len(unique)
+
+
+def deliver(jobs):
+    """
+    Write the notifications for a list of claimed jobs and delete the jobs.
+
+    Returns:
+        int: Number of notifications created or updated
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        written = _deliver_aggregated([job for job in jobs if job.notification_type in AGGREGATED_TYPES], now)
+        written += _deliver_plain([job for job in jobs if job.notification_type not in AGGREGATED_TYPES])
+        NotificationJob.objects.filter(id__in=[job.id for job in jobs]).delete()
+    return written
+
+
+def _fail(job, error):
+    job.last_error = str(error)
+    job.claimed_by = ''
+    job.claimed_at = None
+    if job.attempts >= _max_attempts():
+        job.status = 'failed'
+    else:
+        job.status = 'pending'
+        job.available_at = timezone.now() + timedelta(seconds=min(2 ** job.attempts * 10, 3600))
+    job.save(update_fields=['status', 'available_at', 'claimed_by', 'claimed_at', 'last_error'])
+
+
+def process_batch(worker, batch_size=500):
+    """
+    Claim and deliver one batch of jobs.
+
+    Returns:
+        tuple: ``(jobs_processed, jobs_failed)``
+    """
+    jobs = claim_jobs(worker, batch_size)
+    if not jobs:
+        return 0, 0
+    try:
+        deliver(jobs)
+        return len(jobs), 0
+    except Exception:
+        # Fall back to one job at a time to isolate the job that failed
+        pass
+
+    failed = 0
+    for job in jobs:
+        try:
+            deliver([job])
+        except Exception as error:
+            _fail(job, error)
+            failed += 1
+    return len(jobs), failed
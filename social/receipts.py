@@ -0,0 +1,74 @@
+"""
+Chat read tracking.
+
+Instead of one ``MessageRead`` row per message and reader, each member keeps
+a single ``ChatReadWatermark`` per group chat holding the id of the newest
+message they have read. Opening a chat moves the watermark forward with one
+UPDATE, and a member's unread count in every chat is the number of messages
+above their watermark, computed for all chats in one query.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import ChatMessage, ChatReadWatermark
+
+
+def latest_message_id(group_id):
+    return ChatMessage.objects.filter(group_id=group_id).order_by('-id').values_list('id', flat=True).first()
+
+
+def last_read_message_id(member_id, group_id):
+    watermark = ChatReadWatermark.objects.filter(member_id=member_id, group_id=group_id)
+    return watermark.values_list('last_read_message_id', flat=True).first() or 0
+
+
+def mark_read(member_id, group_id, message_id=None):
+    """
+    Mark a chat as read up to ``message_id`` (default: its newest message).
+    The watermark only ever moves forward.
+    """
+    message_id = message_id or latest_message_id(group_id)
+    if not message_id:
+        return
+
+    def advance():
+        return ChatReadWatermark.objects.filter(member_id=member_id, group_id=group_id).update(
+            last_read_message_id=Greatest(F('last_read_message_id'), message_id),
+            updated_at=timezone.now()
+        )
+
+    if advance():
+        return
+    try:
+        with transaction.atomic():
+            ChatReadWatermark.objects.create(
+                member_id=member_id, group_id=group_id, last_read_message_id=message_id
+            )
+    except IntegrityError:
+        # Created by a concurrent request in the meantime
+        advance()
+
+
+def unread_counts(member, group_ids):
+    """
+    Unread message counts for a member across several chats, in one query.
+
+    Returns:
+        dict: ``{group_id: unread_count}``, omitting chats with nothing unread
+    """
+    watermark = ChatReadWatermark.objects.filter(
+        member=member, group_id=OuterRef('group_id')
+    ).values('last_read_message_id')
+    rows = (
+        ChatMessage.objects.filter(group_id__in=list(group_ids), is_deleted=False)
+        .exclude(sender=member)
+        .filter(id__gt=Coalesce(Subquery(watermark), Value(0)))
+        .order_by()
+        .values('group_id')
+        .annotate(unread=Count('id'))
+    )
+    return {row['group_id']: row['unread'] for row in rows}
+
@@ -1,12 +1,22 @@
 """
 Django signals for the social app.
-Auto-add members to stage group chats when they join.
+Auto-add members to stage group chats when they join, keep the feed
+timelines and the cached friend graph in step with posts, friendships and
+stage membership, keep the like, comment and unread notification counters up to
+date, and push new chat messages to the chat broker.
 """
 
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
 from django.dispatch import receiver
 from members.models import Member
-from .models import GroupChat
+from .broker import publish_to_group
+from .chat import join_stage_group, serialize_message
+from .counters import adjust_counter
+from .friends import invalidate_friends
+from .inbox import adjust_unread
+from .models import ChatMessage, Comment, CommentLike, Friendship, GroupChat, Post, PostLike, SocialNotification
+from . import timelines
 
 
 @receiver(post_save, sender=Member)
@@ -16,25 +26,7 @@ def add_member_to_stage_group(sender, instance, created, **kwargs):
     """
     if created and instance.stage:
         try:
-            # Get or create the stage's main group chat
-            stage_group, group_created = GroupChat.objects.get_or_create(
-                stage=instance.stage,
-                name=f"{instance.stage.name} Main Chat",
-                defaults={
-                    'description': f"Main group chat for {instance.stage.name} stage members",
-                    'allow_all_members': True,
-                    'created_by': instance,
-                    'is_private': False,
-                }
-            )
-            
-            # Add the new member to the group
-            stage_group.members.add(instance)
-            
-            # If this is the first member, add them as admin
-            if stage_group.members.count() == 1:
-                stage_group.admins.add(instance)
-                
+            join_stage_group(instance.stage, [instance])
         except Exception as e:
             # Log error but don't break member creation
             import logging
@@ -52,3 +44,176 @@ def update_member_activity(sender, instance, **kwargs):
         Member.objects.filter(id=instance.id).update(
             last_activity=instance.updated_at
         )
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    """
+    Add new posts to the timelines of the author's friends and stage.
+    """
+    if created:
+        timelines.fan_out(instance)
+
+
+@receiver(post_init, sender=Friendship)
+def remember_friendship_status(sender, instance, **kwargs):
+    if 'status' in instance.__dict__:
+        instance._was_accepted = instance.status == 'accepted'
+
+
+@receiver(pre_save, sender=Friendship)
+def load_friendship_status(sender, instance, **kwargs):
+    if instance._state.adding:
+        instance._was_accepted = False
+    elif not hasattr(instance, '_was_accepted'):
+        instance._was_accepted = Friendship.objects.filter(pk=instance.pk, status='accepted').exists()
+
+
+@receiver(post_save, sender=Friendship)
+def update_friend_timelines(sender, instance, **kwargs):
+    """
+    Share recent posts between new friends, and withdraw them when a
+    friendship ends.
+    """
+    invalidate_friends([instance.requester_id, instance.receiver_id])
+    accepted = instance.status == 'accepted'
+    if accepted and not instance._was_accepted:
+        timelines.add_friend_posts(instance.requester_id, instance.receiver_id)
+        timelines.add_friend_posts(instance.receiver_id, instance.requester_id)
+    elif instance._was_accepted and not accepted:
+        timelines.remove_friend_posts(instance.requester_id, instance.receiver_id)
+        timelines.remove_friend_posts(instance.receiver_id, instance.requester_id)
+    instance._was_accepted = accepted
+
+
+@receiver(post_delete, sender=Friendship)
+def clear_friend_timelines(sender, instance, **kwargs):
+    invalidate_friends([instance.requester_id, instance.receiver_id])
+    if instance.status == 'accepted':
+        timelines.remove_friend_posts(instance.requester_id, instance.receiver_id)
+        timelines.remove_friend_posts(instance.receiver_id, instance.requester_id)
+
+
+@receiver(post_init, sender=Member)
+def remember_timeline_stage(sender, instance, **kwargs):
+    """
+    Remember a loaded member's stage and status.
+    Skipped for deferred loads so that no extra query is issued.
+    """
+    if 'stage_id' in instance.__dict__ and 'status' in instance.__dict__:
+        instance._timeline_state = (instance.stage_id, instance.status)
+
+
+@receiver(pre_save, sender=Member)
+def load_timeline_stage(sender, instance, **kwargs):
+    if instance._state.adding or hasattr(instance, '_timeline_state'):
+        return
+    stored = Member.objects.filter(pk=instance.pk).values_list('stage_id', 'status').first()
+    if stored:
+        instance._timeline_state = stored
+
+
+@receiver(post_save, sender=Member)
+def update_member_timeline(sender, instance, created, **kwargs):
+    """
+    Fill the timeline of a new member, of a member who moved stage, and of
+    a member who became active, since stage posts are only fanned out to
+    active members. A stage an active member left may now be small enough to
+    fan out again.
+    """
+    old_stage_id, old_status = (None, None) if created else getattr(
+        instance, '_timeline_state', (instance.stage_id, instance.status)
+    )
+    moved = old_stage_id != instance.stage_id
+    activated = old_status != 'active' and instance.status == 'active'
+    if created or moved or activated:
+        if old_stage_id and moved:
+            timelines.leave_stage(instance.id, old_stage_id)
+        timelines.backfill_timeline(instance)
+    if old_stage_id and old_status == 'active' and (moved or instance.status != 'active'):
+        # The stage counters (stages.signals) are already updated
+        timelines.stage_shrunk(old_stage_id)
+    instance._timeline_state = (instance.stage_id, instance.status)
+
+
+@receiver(post_delete, sender=Member)
+def update_stage_timelines(sender, instance, **kwargs):
+    if instance.stage_id and instance.status == 'active':
+        timelines.stage_shrunk(instance.stage_id)
+
+
+@receiver(post_save, sender=PostLike)
+def count_post_like(sender, instance, created, **kwargs):
+    if created:
+        adjust_counter(Post, instance.post_id, 'likes_count', 1)
+
+
+@receiver(post_delete, sender=PostLike)
+def uncount_post_like(sender, instance, **kwargs):
+    adjust_counter(Post, instance.post_id, 'likes_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        adjust_counter(Post, instance.post_id, 'comments_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    adjust_counter(Post, instance.post_id, 'comments_count', -1)
+
+
+@receiver(post_save, sender=CommentLike)
+def count_comment_like(sender, instance, created, **kwargs):
+    if created:
+        adjust_counter(Comment, instance.comment_id, 'likes_count', 1)
+
+
+@receiver(post_delete, sender=CommentLike)
+def uncount_comment_like(sender, instance, **kwargs):
+    adjust_counter(Comment, instance.comment_id, 'likes_count', -1)
+
+
+@receiver(post_save, sender=ChatMessage)
+def broadcast_chat_message(sender, instance, created, **kwargs):
+    """
+    Push new messages to the chat's open sockets once they are committed.
+    """
+    if created:
+        transaction.on_commit(
+            lambda: publish_to_group(instance.group_id, {'type': 'message', 'message': serialize_message(instance)})
+        )
+
+
+@receiver(post_init, sender=SocialNotification)
+def remember_notification_read(sender, instance, **kwargs):
+    if 'is_read' in instance.__dict__:
+        instance._was_unread = not instance.is_read
+
+
+@receiver(pre_save, sender=SocialNotification)
+def load_notification_read(sender, instance, **kwargs):
+    if instance._state.adding:
+        instance._was_unread = False
+    elif not hasattr(instance, '_was_unread'):
+        instance._was_unread = SocialNotification.objects.filter(pk=instance.pk, is_read=False).exists()
+
+
+@receiver(post_save, sender=SocialNotification)
+def count_notification(sender, instance, created, **kwargs):
+    """
+    Keep the recipient's unread counter in step with notifications saved
+    one at a time. The notification worker counts its bulk inserts itself.
+    """
+    was_unread = instance._was_unread
+    unread = not instance.is_read
+    if unread != was_unread:
+        adjust_unread(instance.recipient_id, 1 if unread else -1)
+    instance._was_unread = unread
+
+
+@receiver(post_delete, sender=SocialNotification)
+def uncount_notification(sender, instance, **kwargs):
+    if not instance.is_read:
+        adjust_unread(instance.recipient_id, -1)
@@ -0,0 +1,100 @@
+"""
+Stage stories.
+
+Stories are visible for 24 hours. ``record_views`` stores the views of every
+story on a page in one batch, and ``sweep_expired_stories`` (run by
+``manage.py sweep_stories``) deletes expired stories, their views and their
+images in batches so that the tables only hold recent stories.
+"""
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import StageStory, StoryView
+
+
+def active_stories(stage_id):
+    """Unexpired stories of a stage, newest first"""
+    return StageStory.objects.filter(
+        stage_id=stage_id,
+        expires_at__gt=timezone.now()
+    ).select_related('author__user', 'stage')
+
+
+def _view_count():
+    counts = (
+        StoryView.objects.filter(story_id=OuterRef('pk'))
+        .order_by()
+        .values('story_id')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def record_views(member, stories):
+    """
+    Record that a member has seen the given stories, skipping their own.
+
+    Views are inserted in one statement; ``views_count`` is then recounted
+    in a single UPDATE for the stories that gained a view, so concurrent
+    viewers can never lose or double count a view.
+
+    Returns:
+        set: Ids of the stories viewed for the first time
+    """
+    story_ids = {story.id for story in stories if story.author_id != member.id}
+    if not story_ids:
+        return set()
+
+    seen = set(StoryView.objects.filter(viewer=member, story_id__in=story_ids).values_list('story_id', flat=True))
+    new_ids = story_ids - seen
+    if new_ids:
+        with transaction.atomic():
+            StoryView.objects.bulk_create(
+                [StoryView(story_id=story_id, viewer=member) for story_id in new_ids],
+                ignore_conflicts=True
+            )
+            StageStory.objects.filter(id__in=new_ids).update(views_count=_view_count())
+    return new_ids
+
+
+def _delete_files(storage, names):
+    for name in names:
+        storage.delete(name)
+
+
+def sweep_expired_stories(before=None, batch_size=500, dry_run=False):
+    """
+    Delete stories that expired before ``before`` (default: now), with their
+    views and images, one batch per transaction.
+
+    Returns:
+        tuple: ``(stories, views, images)`` deleted, or that would be deleted with ``dry_run``
+    """
+    before = before or timezone.now()
+    expired = StageStory.objects.filter(expires_at__lte=before)
+    if dry_run:
+        return (
+            expired.count(),
+            StoryView.objects.filter(story__expires_at__lte=before).count(),
+            expired.exclude(image='').exclude(image__isnull=True).count(),
+        )
+
+    stories = views = images = 0
+    storage = StageStory._meta.get_field('image').storage
+    while True:
+        batch = list(expired.order_by('expires_at', 'id').values_list('id', 'image')[:batch_size])
+        if not batch:
+            break
+        story_ids = [story_id for story_id, _ in batch]
+        image_names = [image for _, image in batch if image]
+        with transaction.atomic():
+            views += StoryView.objects.filter(story_id__in=story_ids).delete()[0]
+            stories += StageStory.objects.filter(id__in=story_ids).delete()[0]
+            # Files are only removed once the rows are gone for good
+            transaction.on_commit(lambda names=image_names: _delete_files(storage, names))
+        images += len(image_names)
+    return stories, views, images
@@ -1,3 +1,566 @@
+import asyncio
+import importlib
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from bodaboda_welfare.testing import create_member, make_stage
+from members.models import Member
+from social import broker, friends, notifications, receipts, stories, timelines
+from social.chat import decode_cursor, encode_cursor, history_window
+from social.consumers import FORBIDDEN, NOT_FOUND, websocket_application
+from social.counters import check_engagement_counts, rebuild_engagement_counts
+from social.inbox import check_unread_counts, mark_read, rebuild_unread_counts, unread_count
+from social.models import (
+    ChatMessage, ChatReadWatermark, Comment, CommentLike, Friendship, GroupChat, MessageRead,
+    NotificationInbox, NotificationJob, Post, PostLike, SocialNotification, StageStory, StoryView, TimelineEntry
+)
+
+
+def timeline_post_ids(member):
+    return set(TimelineEntry.objects.filter(member=member).values_list('post_id', flat=True))
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.stage = make_stage()
+        self.author = create_member(self.stage)
+
+    def post(self, **kwargs):
+        return Post.objects.create(author=self.author, content='Hello', stage=self.stage, **kwargs)
+
+    def test_stage_post_is_fanned_out_to_active_members(self):
+        reader = create_member(self.stage)
+        post = self.post()
+        self.assertIn(post.id, timeline_post_ids(reader))
+        self.assertIn(post.id, timeline_post_ids(self.author))
+
+    def test_member_who_becomes_active_gets_earlier_stage_posts(self):
+        reader = create_member(self.stage, status='inactive')
+        post = self.post()
+        self.assertNotIn(post.id, timeline_post_ids(reader))
+
+        reader.status = 'active'
+        reader.save()
+        self.assertIn(post.id, timeline_post_ids(reader))
+
+        posts, _ = timelines.timeline_page(reader)
+        self.assertIn(post, posts)
+
+    def test_activation_on_deferred_load_backfills(self):
+        reader = create_member(self.stage, status='suspended')
+        post = self.post()
+
+        reader = Member.objects.only('id').get(id=reader.id)
+        reader.status = 'active'
+        reader.save()
+        self.assertIn(post.id, timeline_post_ids(reader))
+
+    def test_stage_shrinking_to_limit_backfills_pulled_posts(self):
+        reader = create_member(self.stage)
+        leaver = create_member(self.stage)
+        with self.settings(SOCIAL_FANOUT_STAGE_LIMIT=2):
+            post = self.post()
+            self.assertNotIn(post.id, timeline_post_ids(reader))
+
+            leaver.status = 'inactive'
+            leaver.save()
+            self.assertIn(post.id, timeline_post_ids(reader))
+            posts, _ = timelines.timeline_page(reader)
+            self.assertIn(post, posts)
+
+    def test_deleting_member_backfills_pulled_posts(self):
+        reader = create_member(self.stage)
+        leaver = create_member(self.stage)
+        with self.settings(SOCIAL_FANOUT_STAGE_LIMIT=2):
+            post = self.post()
+            leaver.delete()
+            self.assertIn(post.id, timeline_post_ids(reader))
+
+
+class EngagementCounterTests(TestCase):
+    def setUp(self):
+        self.stage = make_stage()
+        self.author = create_member(self.stage)
+        self.reader = create_member(self.stage)
+        self.post = Post.objects.create(author=self.author, content='Hello', stage=self.stage)
+
+    def test_likes_and_comments_are_counted(self):
+        like = PostLike.objects.create(post=self.post, user=self.reader)
+        PostLike.objects.create(post=self.post, user=self.author)
+        comment = Comment.objects.create(post=self.post, author=self.reader, content='Hi')
+        CommentLike.objects.create(comment=comment, user=self.author)
+
+        self.post.refresh_from_db()
+        comment.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (2, 1))
+        self.assertEqual(comment.likes_count, 1)
+
+        like.delete()
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (1, 0))
+
+    def test_counter_never_goes_negative(self):
+        like = PostLike.objects.create(post=self.post, user=self.reader)
+        Post.objects.filter(id=self.post.id).update(likes_count=0)
+        like.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+
+    def test_rebuild_repairs_drift(self):
+        PostLike.objects.create(post=self.post, user=self.reader)
+        Post.objects.filter(id=self.post.id).update(likes_count=7, comments_count=3)
+        self.assertEqual(len(check_engagement_counts()), 2)
+
+        self.assertEqual(rebuild_engagement_counts(), 2)
+        self.assertEqual(check_engagement_counts(), [])
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (1, 0))
+
+
+class ChatCursorTests(TestCase):
+    def setUp(self):
+        self.stage = make_stage()
+        self.member = create_member(self.stage)
+        self.chat = GroupChat.objects.get(stage=self.stage)
+        self.messages = [
+            ChatMessage.objects.create(group=self.chat, sender=self.member, content=f'Message {i}')
+            for i in range(5)
+        ]
+        # Two messages share a timestamp, so paging must fall back to the id
+        same_time = self.messages[2].created_at
+        ChatMessage.objects.filter(id=self.messages[3].id).update(created_at=same_time)
+        self.messages[3].created_at = same_time
+
+    def test_cursor_round_trip(self):
+        message = self.messages[1]
+        self.assertEqual(decode_cursor(encode_cursor(message)), (message.created_at, message.id))
+
+    def test_malformed_cursors_raise_value_error(self):
+        for cursor in ('', 'abc', '12', '12.x', '99999999999999999999.1', '-99999999999999999999.1'):
+            with self.assertRaises(ValueError, msg=cursor):
+                decode_cursor(cursor)
+
+    def test_history_pages_backwards_and_forwards(self):
+        window, has_more = history_window(self.chat, limit=2)
+        self.assertEqual(window, self.messages[3:])
+        self.assertTrue(has_more)
+
+        window, has_more = history_window(self.chat, before=encode_cursor(self.messages[3]), limit=2)
+        self.assertEqual(window, self.messages[1:3])
+        self.assertTrue(has_more)
+
+        window, has_more = history_window(self.chat, after=encode_cursor(self.messages[2]), limit=5)
+        self.assertEqual(window, self.messages[3:])
+        self.assertFalse(has_more)
+
+    def test_history_view_rejects_out_of_range_cursor(self):
+        middleware = [m for m in settings.MIDDLEWARE if 'TwoFactor' not in m]
+        self.client.force_login(self.member.user)
+        with self.settings(MIDDLEWARE=middleware):
+            response = self.client.get(
+                reverse('social:chat_history', args=[self.chat.id]), {'before': '99999999999999999999.1'}
+            )
+        self.assertEqual(response.status_code, 400)
+
+
+class ChatReceiptTests(TestCase):
+    def setUp(self):
+        self.stage = make_stage()
+        self.sender = create_member(self.stage)
+        self.reader = create_member(self.stage)
+        self.chat = GroupChat.objects.get(stage=self.stage)
+        self.other_chat = GroupChat.objects.create(name='Other', stage=self.stage)
+        self.messages = [
+            ChatMessage.objects.create(group=self.chat, sender=self.sender, content=f'Message {i}')
+            for i in range(4)
+        ]
+
+    def test_unread_counts_messages_above_watermark(self):
+        ChatMessage.objects.create(group=self.other_chat, sender=self.sender, content='Elsewhere')
+        ChatMessage.objects.create(group=self.chat, sender=self.reader, content='Own message')
+        chats = [self.chat.id, self.other_chat.id]
+        self.assertEqual(receipts.unread_counts(self.reader, chats), {self.chat.id: 4, self.other_chat.id: 1})
+
+        receipts.mark_read(self.reader.id, self.chat.id, self.messages[1].id)
+        self.assertEqual(receipts.unread_counts(self.reader, chats), {self.chat.id: 2, self.other_chat.id: 1})
+
+        ChatMessage.objects.filter(id=self.messages[3].id).update(is_deleted=True)
+        self.assertEqual(receipts.unread_counts(self.reader, [self.chat.id]), {self.chat.id: 1})
+
+        receipts.mark_read(self.reader.id, self.chat.id)
+        self.assertEqual(receipts.unread_counts(self.reader, chats), {self.other_chat.id: 1})
+
+    def test_watermark_only_moves_forward(self):
+        receipts.mark_read(self.reader.id, self.chat.id, self.messages[2].id)
+        receipts.mark_read(self.reader.id, self.chat.id, self.messages[0].id)
+        self.assertEqual(receipts.last_read_message_id(self.reader.id, self.chat.id), self.messages[2].id)
+        self.assertEqual(ChatReadWatermark.objects.filter(member=self.reader).count(), 1)
+
+    def test_empty_chat_is_not_marked(self):
+        receipts.mark_read(self.reader.id, self.other_chat.id)
+        self.assertFalse(ChatReadWatermark.objects.exists())
+
+    def test_migration_builds_watermarks_from_receipts(self):
+        for message in self.messages[:3]:
+            MessageRead.objects.create(message=message, user=self.reader)
+        MessageRead.objects.create(message=self.messages[0], user=self.sender)
+
+        migration = importlib.import_module('social.migrations.0004_chat_read_watermarks')
+        migration.watermarks_from_receipts(apps, None)
+
+        self.assertEqual(
+            set(ChatReadWatermark.objects.values_list('member_id', 'group_id', 'last_read_message_id')),
+            {(self.reader.id, self.chat.id, self.messages[2].id), (self.sender.id, self.chat.id, self.messages[0].id)}
+        )
+        self.assertEqual(receipts.unread_counts(self.reader, [self.chat.id]), {self.chat.id: 1})
+
+
+class InMemoryBrokerTests(TestCase):
+    async def test_events_reach_subscribers_of_the_channel(self):
+        chat_broker = broker.InMemoryBroker()
+        subscription = chat_broker.subscribe('chat.group.1')
+        other = chat_broker.subscribe('chat.group.2')
+        received = asyncio.ensure_future(subscription.__anext__())
+        unrelated = asyncio.ensure_future(other.__anext__())
+        await asyncio.sleep(0)
+
+        chat_broker.publish('chat.group.1', {'type': 'typing'})
+        self.assertEqual(await asyncio.wait_for(received, 1), {'type': 'typing'})
+        await asyncio.sleep(0)
+        self.assertFalse(unrelated.done())
+
+        unrelated.cancel()
+        await asyncio.gather(unrelated, return_exceptions=True)
+        await subscription.aclose()
+        await other.aclose()
+        self.assertFalse(chat_broker._subscribers)
+
+    def test_connections_are_counted_per_member_and_channel(self):
+        chat_broker = broker.InMemoryBroker()
+        self.assertEqual(chat_broker.connect('chat.group.1', 7), 1)
+        self.assertEqual(chat_broker.connect('chat.group.1', 7), 2)
+        self.assertEqual(chat_broker.connect('chat.group.2', 7), 1)
+        self.assertEqual(chat_broker.disconnect('chat.group.1', 7), 1)
+        self.assertEqual(chat_broker.disconnect('chat.group.1', 7), 0)
+        self.assertEqual(chat_broker.disconnect('chat.group.1', 7), 0)
+        self.assertEqual(chat_broker.connect('chat.group.1', 7), 1)
+
+
+class ChatSocketTests(TestCase):
+    def setUp(self):
+        self.stage = make_stage()
+        self.member = create_member(self.stage)
+        self.chat = GroupChat.objects.get(stage=self.stage)
+        self.client.force_login(self.member.user)
+        self.cookie = f'{settings.SESSION_COOKIE_NAME}={self.client.cookies[settings.SESSION_COOKIE_NAME].value}'
+        self.broker = broker.InMemoryBroker()
+        patcher = mock.patch.object(broker, '_broker', self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def scope(self, path=None, cookie=None, origin=None):
+        headers = [(b'cookie', (self.cookie if cookie is None else cookie).encode())]
+        if origin:
+            headers.append((b'origin', origin.encode()))
+        return {'type': 'websocket', 'path': path or f'/ws/chats/{self.chat.id}/', 'headers': headers}
+
+    async def open(self, scope):
+        """Start a socket; returns its receive queue, sent events and task"""
+        incoming, sent = asyncio.Queue(), []
+
+        async def send(event):
+            sent.append(event)
+
+        task = asyncio.ensure_future(websocket_application(scope, incoming.get, send))
+        await incoming.put({'type': 'websocket.connect'})
+        for _ in range(200):
+            if sent or task.done():
+                break
+            await asyncio.sleep(0.01)
+        return incoming, sent, task
+
+    async def rejected_with(self, scope):
+        _, sent, task = await self.open(scope)
+        await asyncio.wait_for(task, 1)
+        return sent
+
+    async def test_rejects_foreign_origin(self):
+        sent = await self.rejected_with(self.scope(origin='https://evil.example'))
+        self.assertEqual(sent, [{'type': 'websocket.close', 'code': FORBIDDEN}])
+
+    async def test_rejects_missing_or_unknown_session(self):
+        for cookie in ('', f'{settings.SESSION_COOKIE_NAME}=unknown'):
+            sent = await self.rejected_with(self.scope(cookie=cookie))
+            self.assertEqual(sent, [{'type': 'websocket.close', 'code': FORBIDDEN}], cookie)
+
+    async def test_rejects_unknown_path(self):
+        sent = await self.rejected_with(self.scope(path='/ws/chats/abc/'))
+        self.assertEqual(sent, [{'type': 'websocket.close', 'code': NOT_FOUND}])
+
+    async def test_offline_is_published_when_last_socket_closes(self):
+        events = self.broker.subscribe(broker.group_channel(self.chat.id))
+        first_event = asyncio.ensure_future(events.__anext__())
+        await asyncio.sleep(0)
+        sockets = []
+        for _ in range(2):
+            incoming, sent, task = await self.open(self.scope())
+            self.assertEqual(sent[:1], [{'type': 'websocket.accept'}])
+            sockets.append((incoming, task))
+        self.assertEqual((await asyncio.wait_for(first_event, 1))['status'], 'online')
+
+        for incoming, task in sockets:
+            await incoming.put({'type': 'websocket.disconnect'})
+            await asyncio.wait_for(task, 1)
+        # Only the second close announces the member as offline
+        self.assertEqual((await asyncio.wait_for(events.__anext__(), 1))['status'], 'offline')
+        await events.aclose()
+
+
+class FriendGraphTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.stage = make_stage()
+        self.member, self.friend, self.mutual, self.stranger = [create_member(self.stage) for _ in range(4)]
+
+    def befriend(self, requester, receiver, status='accepted'):
+        return Friendship.objects.create(requester=requester, receiver=receiver, status=status)
+
+    def test_cached_sets_follow_friendship_changes(self):
+        self.assertEqual(friends.friend_ids(self.member.id), set())
+        friendship = self.befriend(self.member, self.friend, status='pending')
+        self.assertEqual(friends.friend_ids(self.member.id), set())
+        self.assertEqual(friends.connected_ids(self.member.id), {self.friend.id})
+
+        friendship.status = 'accepted'
+        friendship.save()
+        self.assertEqual(friends.friend_ids(self.friend.id), {self.member.id})
+
+        friendship.delete()
+        self.assertEqual(friends.friend_ids(self.friend.id), set())
+
+    def test_suggestions_rank_mutual_friends_first(self):
+        self.befriend(self.member, self.friend)
+        self.befriend(self.friend, self.mutual)
+        suggestions = friends.suggest_friends(self.member, limit=2)
+        self.assertEqual([s.id for s in suggestions], [self.mutual.id, self.stranger.id])
+        self.assertEqual(suggestions[0].mutual_friends, 1)
+
+    def test_process_local_cache_uses_short_timeout(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://'}}
+        with self.settings(CACHES=locmem, SOCIAL_FRIENDS_LOCAL_CACHE_TIMEOUT=30):
+            self.assertEqual(friends._cache_timeout(), 30)
+        with self.settings(CACHES=shared, SOCIAL_FRIENDS_CACHE_TIMEOUT=3600):
+            self.assertEqual(friends._cache_timeout(), 3600)
+
+
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        stage = make_stage()
+        self.member = create_member(stage)
+        self.sender = create_member(stage)
+
+    def notify(self, **kwargs):
+        return SocialNotification.objects.create(
+            recipient=self.member, sender=self.sender, notification_type='like', message='Liked your post', **kwargs
+        )
+
+    def test_inbox_is_created_from_existing_notifications(self):
+        SocialNotification.objects.bulk_create([
+            SocialNotification(
+                recipient=self.member, sender=self.sender, notification_type='like', message='Liked', is_read=is_read
+            )
+            for is_read in (False, True, False)
+        ])
+        self.assertFalse(NotificationInbox.objects.filter(member=self.member).exists())
+        self.assertEqual(unread_count(self.member.id), 2)
+
+    def test_counter_follows_saves_deletes_and_mark_read(self):
+        self.assertEqual(unread_count(self.member.id), 0)
+        first = self.notify()
+        second = self.notify()
+        third = self.notify()
+        self.assertEqual(unread_count(self.member.id), 3)
+
+        first.is_read = True
+        first.save()
+        self.assertEqual(unread_count(self.member.id), 2)
+
+        second.delete()
+        self.assertEqual(unread_count(self.member.id), 1)
+
+        self.assertEqual(mark_read(self.member.id, up_to_id=third.id), 1)
+        self.assertEqual(unread_count(self.member.id), 0)
+
+    def test_rebuild_repairs_drift(self):
+        self.notify()
+        self.assertEqual(unread_count(self.member.id), 1)
+        NotificationInbox.objects.filter(member=self.member).update(unread_count=9)
+        self.assertEqual(check_unread_counts(), [(self.member.id, 9, 1)])
+
+        self.assertEqual(rebuild_unread_counts(), 1)
+        self.assertEqual(unread_count(self.member.id), 1)
+
+
+class NotificationOutboxTests(TestCase):
+    def setUp(self):
+        stage = make_stage()
+        self.author = create_member(stage, user=User.objects.create(username='author', first_name='Asha'))
+        self.readers = [
+            create_member(stage, user=User.objects.create(username=f'reader{i}', first_name=name))
+            for i, name in enumerate(['Jane', 'Otieno'])
+        ]
+        self.post = Post.objects.create(author=self.author, content='Hello', stage=stage)
+        self.middleware = [m for m in settings.MIDDLEWARE if 'TwoFactor' not in m]
+
+    def like(self, member):
+        self.client.force_login(member.user)
+        with self.settings(MIDDLEWARE=self.middleware):
+            return self.client.post(reverse('social:like_post', args=[self.post.id]))
+
+    def test_like_and_comment_views_enqueue_jobs(self):
+        self.like(self.readers[0])
+        self.like(self.author)
+        with self.settings(MIDDLEWARE=self.middleware):
+            self.client.post(reverse('social:add_comment', args=[self.post.id]), {'content': 'Nice'})
+        self.assertEqual(
+            list(NotificationJob.objects.order_by('id').values_list('sender_id', 'notification_type', 'status')),
+            [(self.readers[0].id, 'like', 'pending')]
+        )
+        self.client.force_login(self.readers[1].user)
+        with self.settings(MIDDLEWARE=self.middleware):
+            self.client.post(reverse('social:add_comment', args=[self.post.id]), {'content': 'Nice'})
+        self.assertEqual(NotificationJob.objects.filter(notification_type='comment').count(), 1)
+        self.assertFalse(SocialNotification.objects.exists())
+
+    def test_likes_are_aggregated_into_one_notification(self):
+        self.like(self.readers[0])
+        self.assertEqual(notifications.process_batch('worker'), (1, 0))
+        self.like(self.readers[1])
+        call_command('process_notifications', '--once', stdout=StringIO())
+
+        notification = SocialNotification.objects.get()
+        self.assertEqual(notification.actor_ids, [self.readers[0].id, self.readers[1].id])
+        self.assertEqual(notification.message, 'Otieno and 1 other liked your post')
+        self.assertEqual(unread_count(self.author.id), 1)
+        self.assertFalse(NotificationJob.objects.exists())
+
+        # A repeated like from a counted member changes nothing
+        notifications.enqueue_notification(self.author, self.readers[0], 'like', post=self.post)
+        notifications.process_batch('worker')
+        self.assertEqual(SocialNotification.objects.get().actor_count, 2)
+
+    def test_failing_job_is_retried_with_backoff_then_failed(self):
+        notifications.enqueue_notification(self.author, self.readers[0], 'like', post=self.post)
+        job = notifications.enqueue_notification(self.author, self.readers[1], 'friend_request')
+        deliver_plain = notifications._deliver_plain
+
+        def fail_plain(jobs):
+            if jobs:
+                raise RuntimeError('down')
+            return deliver_plain(jobs)
+
+        with self.settings(SOCIAL_NOTIFICATION_MAX_ATTEMPTS=2), \
+                mock.patch.object(notifications, '_deliver_plain', side_effect=fail_plain):
+            self.assertEqual(notifications.process_batch('worker'), (2, 1))
+            # The like is delivered on its own; the failing job waits
+            self.assertEqual(SocialNotification.objects.get().notification_type, 'like')
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.last_error, job.claimed_by), ('pending', 1, 'down', ''))
+            self.assertGreater(job.available_at, timezone.now() + timedelta(seconds=15))
+            self.assertEqual(notifications.claim_jobs('worker', 10), [])
+
+            NotificationJob.objects.filter(id=job.id).update(available_at=timezone.now())
+            self.assertEqual(notifications.process_batch('worker'), (1, 1))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ('failed', 2))
+            self.assertEqual(notifications.claim_jobs('worker', 10), [])
+
+    def test_stale_claims_are_requeued(self):
+        job = notifications.enqueue_notification(self.author, self.readers[0], 'friend_request')
+        self.assertEqual(notifications.claim_jobs('dead-worker', 10), [job])
+        self.assertEqual(notifications.claim_jobs('other-worker', 10), [])
+        self.assertEqual(notifications.requeue_stale_jobs(timedelta(minutes=5)), 0)
+
+        NotificationJob.objects.filter(id=job.id).update(claimed_at=timezone.now() - timedelta(minutes=10))
+        self.assertEqual(notifications.requeue_stale_jobs(timedelta(minutes=5)), 1)
+        claimed, = notifications.claim_jobs('other-worker', 10)
+        self.assertEqual((claimed.claimed_by, claimed.attempts), ('other-worker', 2))
+
+
+class StoryTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = self.settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.stage = make_stage()
+        self.author = create_member(self.stage)
+        self.viewer = create_member(self.stage)
+
+    def story(self, hours, image=None):
+        if image:
+            image = default_storage.save(f'stage_stories/{image}', ContentFile(b'image'))
+        return StageStory.objects.create(
+            stage=self.stage, author=self.author, content='Story', image=image,
+            expires_at=timezone.now() + timedelta(hours=hours)
+        )
+
+    def test_views_are_counted_once_per_member(self):
+        story = self.story(24)
+        self.assertEqual(stories.record_views(self.viewer, [story]), {story.id})
+        self.assertEqual(stories.record_views(self.viewer, [story]), set())
+        self.assertEqual(stories.record_views(self.author, [story]), set())
+
+        story.refresh_from_db()
+        self.assertEqual(story.views_count, 1)
+        self.assertEqual(list(StoryView.objects.values_list('viewer_id', flat=True)), [self.viewer.id])
+
+    def test_sweep_deletes_only_expired_stories(self):
+        expired = self.story(-1, image='old.jpg')
+        current = self.story(1, image='new.jpg')
+        stories.record_views(self.viewer, [expired, current])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(stories.sweep_expired_stories(batch_size=1), (1, 1, 1))
+
+        self.assertEqual(list(StageStory.objects.all()), [current])
+        self.assertEqual(list(StoryView.objects.values_list('story_id', flat=True)), [current.id])
+        self.assertFalse(default_storage.exists(expired.image.name))
+        self.assertTrue(default_storage.exists(current.image.name))
+
+    def test_dry_run_deletes_nothing(self):
+        expired = self.story(-1, image='old.jpg')
+        stories.record_views(self.viewer, [expired])
+        output = StringIO()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('sweep_stories', '--dry-run', stdout=output)
+
+        self.assertIn('Would delete 1 expired stories, 1 story views and 1 images', output.getvalue())
+        self.assertTrue(StageStory.objects.filter(id=expired.id).exists())
+        self.assertEqual(StoryView.objects.count(), 1)
+        self.assertTrue(default_storage.exists(expired.image.name))
 
-# Create your tests here.
+    def test_command_honours_grace_period(self):
+        self.story(-2)
+        recent = self.story(-0.5)
+        call_command('sweep_stories', '--grace-hours', '1', stdout=StringIO())
+        self.assertEqual(list(StageStory.objects.all()), [recent])
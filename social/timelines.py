@@ -0,0 +1,211 @@
+"""
+Precomputed feed timelines.
+
+When a post is created it is written to the ``TimelineEntry`` rows of the
+members who should see it: the author, the author's friends and the members
+of the post's stage. Two kinds of post are never fanned out and are pulled
+at read time instead:
+
+* public posts (no stage) and announcements, which every member sees, and
+* posts in stages with more than ``SOCIAL_FANOUT_STAGE_LIMIT`` active
+  members, which are read straight from the stage's posts. When such a stage
+  shrinks back to the limit its recent posts are copied into its members'
+  timelines (``stage_shrunk``), since they are no longer pulled.
+
+``timeline_page`` merges the member's timeline with the pulled posts and
+pages through the result with a post id cursor, so no page needs an OFFSET
+or a COUNT.
+"""
+
+from django.conf import settings
+from django.db.models import Prefetch, Q
+
+from stages.models import Stage
+from .friends import friend_ids
+from .models import Comment, Post, TimelineEntry
+
+
+def _fanout_stage_limit():
+    """Stages with more active members than this are pulled instead of fanned out"""
+    return getattr(settings, 'SOCIAL_FANOUT_STAGE_LIMIT', 500)
+
+
+def _backfill_size():
+    """Posts copied into a timeline when a member joins a stage or makes a friend"""
+    return getattr(settings, 'SOCIAL_TIMELINE_BACKFILL', 200)
+
+
+def is_pulled(post):
+    """Whether a post is read at feed time rather than fanned out"""
+    return post.stage_id is None or post.post_type == 'announcement'
+
+
+def stage_fans_out(stage_id):
+    """Whether posts in a stage are fanned out to its members"""
+    if stage_id is None:
+        return False
+    member_count = Stage.objects.filter(id=stage_id).values_list('member_count', flat=True).first()
+    return member_count is not None and member_count <= _fanout_stage_limit()
+
+
+def _write(pairs):
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(member_id=member_id, post_id=post_id) for member_id, post_id in pairs],
+        batch_size=1000,
+        ignore_conflicts=True
+    )
+
+
+def fan_out(post):
+    """Add a new post to the timelines of the members who follow it"""
+    from members.models import Member
+
+    if is_pulled(post):
+        return
+
+    recipients = friend_ids(post.author_id)
+    recipients.add(post.author_id)
+    if stage_fans_out(post.stage_id):
+        recipients.update(
+            Member.objects.filter(stage_id=post.stage_id, status='active').values_list('id', flat=True)
+        )
+    _write((member_id, post.id) for member_id in recipients)
+
+
+def _fanned_out_posts():
+    return Post.objects.exclude(stage__isnull=True).exclude(post_type='announcement')
+
+
+def add_friend_posts(member_id, friend_id):
+    """Copy a new friend's recent posts into a member's timeline"""
+    post_ids = _fanned_out_posts().filter(author_id=friend_id).order_by('-id').values_list('id', flat=True)
+    _write((member_id, post_id) for post_id in post_ids[:_backfill_size()])
+
+
+def remove_friend_posts(member_id, friend_id):
+    """Drop a former friend's posts, except those from the member's own stage"""
+    from members.models import Member
+
+    stage_id = Member.objects.filter(id=member_id).values_list('stage_id', flat=True).first()
+    entries = TimelineEntry.objects.filter(member_id=member_id, post__author_id=friend_id)
+    if stage_fans_out(stage_id):
+        entries = entries.exclude(post__stage_id=stage_id)
+    entries.delete()
+
+
+def backfill_timeline(member, limit=None):
+    """
+    Fill a member's timeline with the most recent posts they should see.
+
+    Returns:
+        int: Number of posts considered
+    """
+    limit = limit or _backfill_size()
+    sources = Q(author_id=member.id) | Q(author_id__in=friend_ids(member.id))
+    if stage_fans_out(member.stage_id):
+        sources |= Q(stage_id=member.stage_id)
+    post_ids = list(_fanned_out_posts().filter(sources).order_by('-id').values_list('id', flat=True)[:limit])
+    _write((member.id, post_id) for post_id in post_ids)
+    return len(post_ids)
+
+
+def backfill_new_stage_members(member_ids, stage_id, limit=None):
+    """
+    Fill the timelines of members who just joined a stage and have no
+    friends or posts yet, reading the stage's posts once for all of them.
+
+    Returns:
+        int: Number of posts copied into each timeline
+    """
+    if not member_ids or not stage_fans_out(stage_id):
+        return 0
+    limit = limit or _backfill_size()
+    post_ids = list(_fanned_out_posts().filter(stage_id=stage_id).order_by('-id').values_list('id', flat=True)[:limit])
+    _write((member_id, post_id) for member_id in member_ids for post_id in post_ids)
+    return len(post_ids)
+
+
+def stage_shrunk(stage_id):
+    """
+    Called after an active member leaves a stage. If that brings the stage
+    down to the fan-out limit, its posts were pulled until now and never
+    fanned out, so copy its recent posts into its members' timelines.
+
+    Returns:
+        int: Number of posts copied into each timeline
+    """
+    from members.models import Member
+
+    member_count = Stage.objects.filter(id=stage_id).values_list('member_count', flat=True).first()
+    if member_count != _fanout_stage_limit():
+        return 0
+    member_ids = list(Member.objects.filter(stage_id=stage_id, status='active').values_list('id', flat=True))
+    return backfill_new_stage_members(member_ids, stage_id)
+
+
+def leave_stage(member_id, stage_id):
+    """Drop a stage's posts from a member who moved away, keeping friends' posts"""
+    TimelineEntry.objects.filter(member_id=member_id, post__stage_id=stage_id).exclude(
+        post__author_id__in=friend_ids(member_id) | {member_id}
+    ).delete()
+
+
+def rebuild_timelines(members, limit=None):
+    """
+    Rebuild the timelines of the given members from scratch.
+
+    Returns:
+        int: Number of members rebuilt
+    """
+    rebuilt = 0
+    for member in members.iterator(chunk_size=500):
+        TimelineEntry.objects.filter(member=member).delete()
+        backfill_timeline(member, limit)
+        rebuilt += 1
+    return rebuilt
+
+
+def _pulled_post_ids(member, before, limit):
+    """Ids of the newest posts the member reads at feed time, one indexed query each"""
+    sources = [Q(stage__isnull=True), Q(post_type='announcement')]
+    if member.stage_id and not stage_fans_out(member.stage_id):
+        sources.append(Q(stage_id=member.stage_id))
+
+    post_ids = set()
+    for source in sources:
+        posts = Post.objects.filter(source)
+        if before:
+            posts = posts.filter(id__lt=before)
+        post_ids.update(posts.order_by('-id').values_list('id', flat=True)[:limit])
+    return post_ids
+
+
+def timeline_page(member, before=None, limit=10):
+    """
+    One page of a member's feed, newest first.
+
+    Args:
+        member: The member reading the feed
+        before (int): Cursor returned by the previous page
+        limit (int): Page size
+
+    Returns:
+        tuple: ``(posts, next_cursor)``; ``next_cursor`` is None on the last page
+    """
+    entries = TimelineEntry.objects.filter(member=member)
+    if before:
+        entries = entries.filter(post_id__lt=before)
+    post_ids = set(entries.order_by('-post_id').values_list('post_id', flat=True)[:limit + 1])
+    post_ids |= _pulled_post_ids(member, before, limit + 1)
+
+    page_ids = sorted(post_ids, reverse=True)[:limit + 1]
+    next_cursor = None
+    if len(page_ids) > limit:
+        page_ids = page_ids[:limit]
+        next_cursor = page_ids[-1]
+
+    recent_comments = Comment.objects.select_related('author__user').order_by('created_at')[:3]
+    posts = Post.objects.filter(id__in=page_ids).select_related('author__user', 'stage').prefetch_related(
+        Prefetch('comments', queryset=recent_comments, to_attr='recent_comments')
+    ).order_by('-id')
+    return list(posts), next_cursor
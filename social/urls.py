@@ -19,10 +19,13 @@ urlpatterns = [
     # Group chats
     path('chats/', views.group_chats, name='group_chats'),
     path('chats/<int:chat_id>/', views.chat_detail, name='chat_detail'),
+    path('chats/<int:chat_id>/messages/', views.chat_messages, name='chat_messages'),
+    path('chats/<int:chat_id>/history/', views.chat_history, name='chat_history'),
     path('chats/create/', views.create_chat, name='create_chat'),
     
     # Notifications
     path('notifications/', views.notifications, name='notifications'),
+    path('notifications/count/', views.notification_count, name='notification_count'),
     
     # Stories
     path('stories/', views.stories, name='stories'),
@@ -7,13 +7,20 @@ from django.db.models import Q, Count
 from django.utils import timezone
 from datetime import timedelta
 from members.models import Member
+from members import presence
 from stages.models import Stage
 from .models import (
     Post, PostLike, Comment, CommentLike, Friendship, 
-    GroupChat, ChatMessage, MessageRead, StageStory, 
-    StoryView, SocialNotification
+    GroupChat, ChatMessage, StageStory, 
+    StoryView
 )
 from .forms import PostForm, CommentForm, GroupChatForm, ChatMessageForm
+from . import inbox, receipts, timelines
+from .chat import encode_cursor, has_chat_access, history_window, messages_since, serialize_message
+from .counters import liked_post_ids
+from .friends import friend_ids, suggest_friends
+from .notifications import enqueue_notification
+from .stories import active_stories, record_views
 import json
 
 @login_required
@@ -24,24 +31,6 @@ def feed(request):
     try:
         member = request.user.member
         
-        # Get posts from friends and same stage
-        friends = Friendship.objects.filter(
-            Q(requester=member) | Q(receiver=member),
-            status='accepted'
-        ).values_list('requester', 'receiver')
-        
-        friend_ids = set()
-        for req, rec in friends:
-            friend_ids.add(req if req != member.id else rec)
-        
-        # Posts from friends, same stage, or public announcements
-        posts = Post.objects.filter(
-            Q(author__in=friend_ids) |  # Friends' posts
-            Q(stage=member.stage) |     # Same stage posts
-            Q(stage__isnull=True) |     # Public posts
-            Q(post_type='announcement') # All announcements
-        ).select_related('author__user', 'stage').prefetch_related('likes', 'comments')
-        
         # Handle new post submission
         if request.method == 'POST':
             form = PostForm(request.POST, request.FILES)
@@ -54,28 +43,26 @@ def feed(request):
         else:
             form = PostForm()
         
-        # Pagination
-        paginator = Paginator(posts, 10)
-        page_number = request.GET.get('page')
-        page_posts = paginator.get_page(page_number)
+        # Posts from the member's timeline, paged by post id
+        try:
+            before = int(request.GET.get('before', 0))
+        except ValueError:
+            before = 0
+        posts, next_cursor = timelines.timeline_page(member, before=before, limit=10)
+        liked = liked_post_ids(member, [post.id for post in posts])
+        for post in posts:
+            post.is_liked = post.id in liked
         
         # Get active stories
-        stories = StageStory.objects.filter(
-            expires_at__gt=timezone.now(),
-            stage=member.stage
-        ).select_related('author__user', 'stage')
-        
-        # Get friend suggestions
-        existing_friends = friend_ids
-        existing_friends.add(member.id)
+        stories = active_stories(member.stage_id)
         
-        friend_suggestions = Member.objects.filter(
-            stage=member.stage,
-            status='active'
-        ).exclude(id__in=existing_friends)[:5]
+        # Get friend suggestions, ranked by mutual friends
+        friend_suggestions = suggest_friends(member, limit=5)
         
         context = {
-            'posts': page_posts,
+            'posts': posts,
+            'next_cursor': next_cursor,
+            'before': before,
             'form': form,
             'stories': stories,
             'friend_suggestions': friend_suggestions,
@@ -110,22 +97,14 @@ def like_post(request, post_id):
             if not created:
                 like.delete()
                 liked = False
-                post.likes_count = max(0, post.likes_count - 1)
             else:
                 liked = True
-                post.likes_count += 1
                 
-                # Create notification for post author
-                if post.author != member:
-                    SocialNotification.objects.create(
-                        recipient=post.author,
-                        sender=member,
-                        notification_type='like',
-                        post=post,
-                        message=f"{member.user.get_full_name()} liked your post"
-                    )
+                # Queue notification for post author
+                enqueue_notification(post.author, member, 'like', post=post)
             
-            post.save()
+            # The counter is maintained by signals; read back the stored value
+            post.refresh_from_db(fields=['likes_count'])
             
             return JsonResponse({
                 'liked': liked,
@@ -159,20 +138,11 @@ def add_comment(request, post_id):
                 content=content
             )
             
-            # Update post comment count
-            post.comments_count += 1
-            post.save()
+            # The counter is maintained by signals; read back the stored value
+            post.refresh_from_db(fields=['comments_count'])
             
-            # Create notification for post author
-            if post.author != member:
-                SocialNotification.objects.create(
-                    recipient=post.author,
-                    sender=member,
-                    notification_type='comment',
-                    post=post,
-                    comment=comment,
-                    message=f"{member.user.get_full_name()} commented on your post"
-                )
+            # Queue notification for post author
+            enqueue_notification(post.author, member, 'comment', post=post, comment=comment)
             
             return JsonResponse({
                 'success': True,
@@ -201,15 +171,9 @@ def friends(request):
         member = request.user.member
         
         # Get current friends
-        friendships = Friendship.objects.filter(
-            Q(requester=member) | Q(receiver=member),
-            status='accepted'
-        ).select_related('requester__user', 'receiver__user', 'requester__stage', 'receiver__stage')
-        
-        friends = []
-        for friendship in friendships:
-            friend = friendship.receiver if friendship.requester == member else friendship.requester
-            friends.append(friend)
+        friends = list(Member.objects.filter(
+            id__in=friend_ids(member.id)
+        ).select_related('user', 'stage'))
         
         # Get pending friend requests (received)
         pending_requests = Friendship.objects.filter(
@@ -223,25 +187,12 @@ def friends(request):
             status='pending'
         ).select_related('receiver__user', 'receiver__stage')
         
-        # Get friend suggestions (same stage, not already friends)
-        existing_connections = set()
-        for friendship in Friendship.objects.filter(
-            Q(requester=member) | Q(receiver=member)
-        ):
-            if friendship.requester == member:
-                existing_connections.add(friendship.receiver.id)
-            else:
-                existing_connections.add(friendship.requester.id)
-        
-        existing_connections.add(member.id)
-        
-        suggested_friends = Member.objects.filter(
-            stage=member.stage,
-            status='active'
-        ).exclude(id__in=existing_connections).select_related('user', 'stage')[:10]
+        # Get friend suggestions (friends of friends, then same stage)
+        suggested_friends = suggest_friends(member, limit=10)
         
-        # Get online friends (mock for now)
-        online_friends = friends[:5]  # Mock implementation
+        # Get online friends from the presence tracker
+        online_ids = presence.online_member_ids(friend.id for friend in friends)
+        online_friends = [friend for friend in friends if friend.id in online_ids][:5]
         
         # Get available members for creating chats
         available_members = Member.objects.filter(
@@ -297,13 +248,8 @@ def send_friend_request(request, member_id):
                 receiver=receiver
             )
             
-            # Create notification
-            SocialNotification.objects.create(
-                recipient=receiver,
-                sender=sender,
-                notification_type='friend_request',
-                message=f"{sender.user.get_full_name()} sent you a friend request"
-            )
+            # Queue notification
+            enqueue_notification(receiver, sender, 'friend_request')
             
             return JsonResponse({'success': True, 'message': 'Friend request sent!'})
             
@@ -332,13 +278,8 @@ def accept_friend_request(request, friendship_id):
             friendship.status = 'accepted'
             friendship.save()
             
-            # Create notification for requester
-            SocialNotification.objects.create(
-                recipient=friendship.requester,
-                sender=member,
-                notification_type='friend_accepted',
-                message=f"{member.user.get_full_name()} accepted your friend request"
-            )
+            # Queue notification for requester
+            enqueue_notification(friendship.requester, member, 'friend_accepted')
             
             return JsonResponse({'success': True, 'message': 'Friend request accepted!'})
             
@@ -360,29 +301,25 @@ def group_chats(request):
         # Get member's group chats
         group_chats = GroupChat.objects.filter(
             Q(members=member) | Q(stage=member.stage, allow_all_members=True)
-        ).distinct().select_related('stage').prefetch_related('members')
+        ).distinct().select_related('stage').prefetch_related('members__user')
+        
+        # Resolve online members for all chats with one presence lookup
+        online_ids = presence.online_member_ids(
+            chat_member.id for chat in group_chats for chat_member in chat.members.all()
+        )
+        
+        # Unread counts for all chats in one query
+        unread = receipts.unread_counts(member, [chat.id for chat in group_chats])
         
         # Add last message, unread count, and online members to each chat
         for chat in group_chats:
             chat.last_message = chat.messages.filter(is_deleted=False).order_by('-created_at').first()
-            chat.unread_count = chat.messages.filter(
-                is_deleted=False
-            ).exclude(read_receipts__user=member).count()
-            
-            # Count online members (active in last 5 minutes)
-            from django.utils import timezone
-            from datetime import timedelta
-            five_minutes_ago = timezone.now() - timedelta(minutes=5)
-            chat.online_count = chat.members.filter(
-                is_online=True,
-                last_activity__gte=five_minutes_ago
-            ).count()
+            chat.unread_count = unread.get(chat.id, 0)
             
-            # Get online members list
-            chat.online_members = chat.members.filter(
-                is_online=True,
-                last_activity__gte=five_minutes_ago
-            ).select_related('user')[:10]  # Limit to 10 for performance
+            # Online members list, limited to 10 for display
+            online_members = [m for m in chat.members.all() if m.id in online_ids]
+            chat.online_count = len(online_members)
+            chat.online_members = online_members[:10]
             
         # Get stage's default group
         stage_group, created = GroupChat.objects.get_or_create(
@@ -397,6 +334,7 @@ def group_chats(request):
         
         if created or member not in stage_group.members.all():
             stage_group.members.add(member)
+        stage_group.unread_count = unread.get(stage_group.id, 0)
             
         # Get available members for creating chats
         available_members = Member.objects.filter(
@@ -430,19 +368,12 @@ def chat_detail(request, chat_id):
         chat = get_object_or_404(GroupChat, id=chat_id)
         
         # Check if member has access to this chat
-        has_access = (
-            member in chat.members.all() or 
-            (chat.stage == member.stage and chat.allow_all_members)
-        )
-        
-        if not has_access:
+        if not has_chat_access(member, chat):
             messages.error(request, "You don't have access to this chat.")
             return redirect('social:group_chats')
         
-        # Get messages
-        messages_list = chat.messages.filter(
-            is_deleted=False
-        ).select_related('sender__user')
+        # Get the most recent window of messages; older ones load on scroll
+        messages_list, has_older = history_window(chat)
         
         # Handle new message
         if request.method == 'POST':
@@ -455,26 +386,19 @@ def chat_detail(request, chat_id):
                 )
                 
                 # Mark as read by sender
-                MessageRead.objects.create(
-                    message=message,
-                    user=member
-                )
+                receipts.mark_read(member.id, chat.id, message.id)
                 
                 return redirect('social:chat_detail', chat_id=chat.id)
         
         # Mark messages as read
-        unread_messages = messages_list.exclude(
-            read_receipts__user=member
-        )
-        for message in unread_messages:
-            MessageRead.objects.get_or_create(
-                message=message,
-                user=member
-            )
+        receipts.mark_read(member.id, chat.id)
         
         context = {
             'chat': chat,
             'messages': messages_list,
+            'messages_list': messages_list,
+            'last_message_id': receipts.latest_message_id(chat.id) or 0,
+            'older_cursor': encode_cursor(messages_list[0]) if has_older else '',
             'member': member,
         }
         
@@ -484,6 +408,73 @@ def chat_detail(request, chat_id):
         messages.error(request, "Please complete your member profile first.")
         return redirect('members:profile_setup')
 
+
+@login_required
+def chat_messages(request, chat_id):
+    """
+    JSON endpoint returning the messages posted after a given id, for
+    clients that cannot keep a chat socket open
+    """
+    try:
+        member = request.user.member
+    except Member.DoesNotExist:
+        return JsonResponse({'error': 'Member profile required'}, status=400)
+    
+    chat = get_object_or_404(GroupChat, id=chat_id)
+    if not has_chat_access(member, chat):
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    try:
+        after_id = int(request.GET.get('after', 0))
+        limit = min(max(int(request.GET.get('limit', 50)), 1), 200)
+    except ValueError:
+        return JsonResponse({'error': 'after and limit must be integers'}, status=400)
+    
+    new_messages, has_more = messages_since(chat, after_id, limit)
+    if new_messages:
+        receipts.mark_read(member.id, chat.id, new_messages[-1].id)
+    
+    return JsonResponse({
+        'messages': [serialize_message(message) for message in new_messages],
+        'last_id': new_messages[-1].id if new_messages else after_id,
+        'has_more': has_more,
+    })
+
+
+@login_required
+def chat_history(request, chat_id):
+    """
+    JSON endpoint returning a window of chat history, oldest first.
+    Pass ``before`` to scroll back or ``after`` to scroll forward, using
+    the cursors returned by the previous window.
+    """
+    try:
+        member = request.user.member
+    except Member.DoesNotExist:
+        return JsonResponse({'error': 'Member profile required'}, status=400)
+    
+    chat = get_object_or_404(GroupChat, id=chat_id)
+    if not has_chat_access(member, chat):
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    before = request.GET.get('before')
+    after = request.GET.get('after')
+    try:
+        limit = request.GET.get('limit')
+        limit = min(max(int(limit), 1), 200) if limit else None
+        window, has_more = history_window(chat, before=before, after=after, limit=limit)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor or limit'}, status=400)
+    
+    return JsonResponse({
+        'messages': [serialize_message(message) for message in window],
+        'older_cursor': encode_cursor(window[0]) if window else before,
+        'newer_cursor': encode_cursor(window[-1]) if window else after,
+        'has_older': has_more if not after else True,
+        'has_newer': has_more if after else bool(before),
+    })
+
+
 @login_required
 def create_chat(request):
     """
@@ -542,11 +533,15 @@ def notifications(request):
             'sender__user', 'post', 'comment', 'group'
         ).order_by('-created_at')
         
-        # Mark as read if requested
+        # Mark as read if requested, up to the newest notification the member has seen
         if request.GET.get('mark_read'):
-            notifications_list.update(is_read=True)
+            try:
+                up_to = int(request.GET['up_to']) if request.GET.get('up_to') else None
+            except ValueError:
+                up_to = None
+            inbox.mark_read(member.id, up_to)
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                return JsonResponse({'success': True})
+                return JsonResponse({'success': True, 'unread_count': inbox.unread_count(member.id)})
             return redirect('social:notifications')
         
         # Pagination
@@ -556,7 +551,8 @@ def notifications(request):
         
         context = {
             'notifications': page_notifications,
-            'unread_count': notifications_list.filter(is_read=False).count(),
+            'unread_count': inbox.unread_count(member.id),
+            'latest_notification_id': inbox.latest_notification_id(member.id) or 0,
             'member': member,
         }
         
@@ -570,6 +566,19 @@ def notifications(request):
         messages.error(request, "Please complete your member profile first.")
         return redirect('members:profile_setup')
 
+
+@login_required
+def notification_count(request):
+    """
+    Unread notification count for the notification badge
+    """
+    try:
+        member = request.user.member
+    except Member.DoesNotExist:
+        return JsonResponse({'unread_count': 0})
+    
+    return JsonResponse({'unread_count': inbox.unread_count(member.id)})
+
 @login_required
 def stories(request):
     """
@@ -579,10 +588,7 @@ def stories(request):
         member = request.user.member
         
         # Get active stories for member's stage
-        active_stories = StageStory.objects.filter(
-            stage=member.stage,
-            expires_at__gt=timezone.now()
-        ).select_related('author__user')
+        stage_stories = list(active_stories(member.stage_id))
         
         # Handle new story creation
         if request.method == 'POST':
@@ -600,8 +606,11 @@ def stories(request):
                 messages.success(request, "Story shared successfully!")
                 return redirect('social:stories')
         
+        # Everything on the page counts as seen
+        record_views(member, stage_stories)
+        
         context = {
-            'stories': active_stories,
+            'stories': stage_stories,
             'member': member,
         }
         
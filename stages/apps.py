@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class StagesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'stages'
+
+    def ready(self):
+        """Import signals when app is ready."""
+        import stages.signals
@@ -0,0 +1,126 @@
+"""
+Denormalized active-member counters for stages and organizations.
+
+``Stage.member_count`` and ``Organization.member_count`` are kept in step with
+``Member`` rows by the signal handlers in ``stages.signals``. Bulk operations
+such as ``QuerySet.update()`` bypass those handlers, so ``rebuild_member_counts``
+can recompute everything from scratch and ``check_member_counts`` reports any
+drift.
+
+Member counts are shown on the stage map, but they do not start a new map
+version; cached map responses pick them up when they expire (see
+``stages.geo``).
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+
+from .models import Organization, Stage
+
+
+def member_counter_stage(member):
+    """Return the stage id a member is counted against, or None if not counted"""
+    if member.status == 'active':
+        return member.stage_id
+    return None
+
+
+def adjust_member_count(stage_id, delta):
+    """Add ``delta`` to the counters of a stage and its organization"""
+    if not stage_id or not delta:
+        return
+
+    counter = Greatest(F('member_count') + delta, 0)
+    Stage.objects.filter(id=stage_id).update(member_count=counter)
+    Organization.objects.filter(stages__id=stage_id).update(member_count=counter)
+
+
+def move_member_count(old_stage_id, new_stage_id):
+    """Move one member's contribution to the counters from one stage to another"""
+    if old_stage_id == new_stage_id:
+        return
+
+    adjust_member_count(old_stage_id, -1)
+    adjust_member_count(new_stage_id, 1)
+
+
+def move_stage_count(stage, old_organization_id):
+    """Move a stage's members from one organization's counter to another"""
+    if old_organization_id == stage.organization_id:
+        return
+
+    # Read the stored counter; the instance may hold a stale value
+    count = Stage.objects.filter(id=stage.id).values_list('member_count', flat=True).first()
+    if not count:
+        return
+
+    Organization.objects.filter(id=old_organization_id).update(
+        member_count=Greatest(F('member_count') - count, 0)
+    )
+    Organization.objects.filter(id=stage.organization_id).update(
+        member_count=F('member_count') + count
+    )
+
+
+def _actual_stage_counts():
+    return dict(
+        Stage.objects.annotate(
+            actual=Count('members', filter=Q(members__status='active'))
+        ).values_list('id', 'actual')
+    )
+
+
+def _actual_organization_counts():
+    return dict(
+        Organization.objects.annotate(
+            actual=Count('stages__members', filter=Q(stages__members__status='active'))
+        ).values_list('id', 'actual')
+    )
+
+
+def rebuild_member_counts():
+    """
+    Recompute every stage and organization counter from the ``Member`` table.
+
+    Returns:
+        tuple: Number of stages and organizations whose counters changed
+    """
+    with transaction.atomic():
+        stage_counts = _actual_stage_counts()
+        stages = list(Stage.objects.select_for_update().only('id', 'member_count'))
+        changed_stages = [s for s in stages if s.member_count != stage_counts[s.id]]
+        for stage in changed_stages:
+            stage.member_count = stage_counts[stage.id]
+        Stage.objects.bulk_update(changed_stages, ['member_count'], batch_size=500)
+
+        organization_counts = _actual_organization_counts()
+        organizations = list(Organization.objects.select_for_update().only('id', 'member_count'))
+        changed_organizations = [o for o in organizations if o.member_count != organization_counts[o.id]]
+        for organization in changed_organizations:
+            organization.member_count = organization_counts[organization.id]
+        Organization.objects.bulk_update(changed_organizations, ['member_count'], batch_size=500)
+
+    return len(changed_stages), len(changed_organizations)
+
+
+def check_member_counts():
+    """
+    Compare stored counters with the ``Member`` table.
+
+    Returns:
+        list: ``(model_name, pk, stored, actual)`` for every counter that drifted
+    """
+    problems = []
+
+    stage_counts = _actual_stage_counts()
+    for stage_id, stored in Stage.objects.values_list('id', 'member_count'):
+        if stored != stage_counts[stage_id]:
+            problems.append(('Stage', stage_id, stored, stage_counts[stage_id]))
+
+    organization_counts = _actual_organization_counts()
+    for organization_id, stored in Organization.objects.values_list('id', 'member_count'):
+        if stored != organization_counts[organization_id]:
+            problems.append(('Organization', organization_id, stored, organization_counts[organization_id]))
+
+    return problems
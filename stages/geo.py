@@ -0,0 +1,213 @@
+"""
+Stage map data.
+
+``map.geojson`` serves the stages inside the visible bounding box as a
+GeoJSON ``FeatureCollection``. Below ``STAGES_MAP_CLUSTER_ZOOM`` stages are
+grouped into grid cells sized for the zoom level, so a country-wide view
+returns a few hundred clusters rather than every stage.
+
+Responses are cached per map version, zoom level and bounding box. The
+version is derived from the ``Stage`` table (row count, newest id and latest
+edit), so every worker computes the same version and the same ETag, and it
+also rolls over every ``STAGES_MAP_CACHE_TIMEOUT`` seconds. Member counts
+are left out of it, so members joining do not drop every cached body; the
+counts shown are at most one timeout old. Each process keeps the version in
+the cache until the end of the current period, and drops it as soon as it
+saves or deletes a stage itself (see ``stages.signals``). Bounding boxes are
+snapped outwards to the grid so that nearby requests share cache entries.
+"""
+
+import hashlib
+import json
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, FloatField, Max, Sum, Value
+from django.db.models.functions import Cast, Floor
+
+from .models import Stage
+
+STATE_KEY = 'stages:map:state'
+BODY_KEY_PREFIX = 'stages:map:body:'
+
+MAX_ZOOM = 22
+# Grid cells are a quarter of a 256px map tile wide at the requested zoom
+CELLS_PER_TILE = 4
+
+
+def _cache_timeout():
+    return getattr(settings, 'STAGES_MAP_CACHE_TIMEOUT', 300)
+
+
+def _cluster_zoom():
+    return getattr(settings, 'STAGES_MAP_CLUSTER_ZOOM', 11)
+
+
+def compute_map_state(now=None):
+    """
+    Derive the map version from the ``Stage`` table and the current period.
+
+    Returns:
+        tuple: ``({'version': str, 'modified': datetime}, seconds until the period ends)``
+    """
+    timeout = max(_cache_timeout(), 1)
+    now = int((now or datetime.now(dt_timezone.utc)).timestamp())
+    period_start = now - now % timeout
+    stats = Stage.objects.aggregate(count=Count('id'), last_id=Max('id'), last_edit=Max('updated_at'))
+    version = hashlib.md5(
+        f"{stats['count']}:{stats['last_id']}:{stats['last_edit']}:{period_start}".encode()
+    ).hexdigest()
+    modified = datetime.fromtimestamp(period_start, dt_timezone.utc)
+    if stats['last_edit']:
+        modified = max(modified, stats['last_edit'].replace(microsecond=0))
+    return {'version': version, 'modified': modified}, period_start + timeout - now
+
+
+def map_state():
+    """
+    The current map version and when it last changed.
+
+    Returns:
+        dict: ``{'version': str, 'modified': datetime}``
+    """
+    state = cache.get(STATE_KEY)
+    if state is None:
+        state, remaining = compute_map_state()
+        cache.set(STATE_KEY, state, remaining)
+    return state
+
+
+def invalidate_map():
+    """Recompute the map version once the current transaction commits"""
+    transaction.on_commit(lambda: cache.delete(STATE_KEY))
+
+
+class MapQuery:
+    """
+    A validated map request.
+
+    Args:
+        bbox: ``"west,south,east,north"`` in degrees, or None for the whole map
+        zoom: Map zoom level, or None to return every stage unclustered
+    """
+
+    def __init__(self, bbox=None, zoom=None):
+        self.zoom = None
+        if zoom not in (None, ''):
+            self.zoom = int(zoom)
+            if not 0 <= self.zoom <= MAX_ZOOM:
+                raise ValueError('zoom must be between 0 and %d' % MAX_ZOOM)
+
+        self.cell = 360 / 2 ** (self.zoom if self.zoom is not None else MAX_ZOOM) / CELLS_PER_TILE
+        self.bbox = None
+        if bbox:
+            west, south, east, north = (float(value) for value in bbox.split(','))
+            if not all(math.isfinite(value) for value in (west, south, east, north)):
+                raise ValueError('bbox must be finite')
+            if west > east or south > north:
+                raise ValueError('bbox must be west,south,east,north')
+            # Snap outwards so nearby requests share a cache entry
+            self.bbox = (
+                max(math.floor(west / self.cell) * self.cell, -180.0),
+                max(math.floor(south / self.cell) * self.cell, -90.0),
+                min(math.ceil(east / self.cell) * self.cell, 180.0),
+                min(math.ceil(north / self.cell) * self.cell, 90.0),
+            )
+
+    @classmethod
+    def from_request(cls, request):
+        return cls(request.GET.get('bbox'), request.GET.get('zoom'))
+
+    @property
+    def clustered(self):
+        return self.zoom is not None and self.zoom < _cluster_zoom()
+
+    @property
+    def key(self):
+        bbox = ','.join('%.7f' % value for value in self.bbox) if self.bbox else 'all'
+        return f'{self.zoom}:{bbox}'
+
+    def stages(self):
+        queryset = Stage.objects.filter(latitude__isnull=False, longitude__isnull=False)
+        if self.bbox:
+            west, south, east, north = self.bbox
+            queryset = queryset.filter(
+                longitude__gte=west, longitude__lte=east,
+                latitude__gte=south, latitude__lte=north
+            )
+        return queryset.order_by()
+
+
+def etag(query, state=None):
+    state = state or map_state()
+    return hashlib.md5(f"{state['version']}:{query.key}".encode()).hexdigest()
+
+
+def _stage_features(query):
+    rows = query.stages().values_list(
+        'id', 'name', 'location', 'description', 'latitude', 'longitude', 'member_count'
+    )
+    for stage_id, name, location, description, latitude, longitude, member_count in rows.iterator(chunk_size=2000):
+        yield {
+            'type': 'Feature',
+            'id': stage_id,
+            'geometry': {'type': 'Point', 'coordinates': [float(longitude), float(latitude)]},
+            'properties': {
+                'name': name,
+                'location': location,
+                'description': description,
+                'member_count': member_count,
+            },
+        }
+
+
+def _cluster_features(query):
+    cell = Value(query.cell, output_field=FloatField())
+    clusters = (
+        query.stages()
+        .annotate(
+            cell_x=Floor(Cast('longitude', FloatField()) / cell),
+            cell_y=Floor(Cast('latitude', FloatField()) / cell),
+        )
+        .values('cell_x', 'cell_y')
+        .annotate(
+            stages=Count('id'),
+            members=Sum('member_count'),
+            avg_latitude=Avg(Cast('latitude', FloatField())),
+            avg_longitude=Avg(Cast('longitude', FloatField())),
+        )
+        .values_list('avg_latitude', 'avg_longitude', 'stages', 'members')
+    )
+    for latitude, longitude, stages, members in clusters.iterator(chunk_size=2000):
+        yield {
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [round(longitude, 7), round(latitude, 7)]},
+            'properties': {'cluster': True, 'stage_count': stages, 'member_count': members or 0},
+        }
+
+
+def cached_geojson(query, state=None):
+    """The cached response body for a query, or None"""
+    state = state or map_state()
+    return cache.get(f"{BODY_KEY_PREFIX}{state['version']}:{query.key}")
+
+
+def stream_geojson(query, state=None):
+    """
+    Yield a GeoJSON ``FeatureCollection`` for a query in chunks, caching the
+    complete body once the last chunk has been produced.
+    """
+    state = state or map_state()
+    features = _cluster_features(query) if query.clustered else _stage_features(query)
+    chunks = ['{"type": "FeatureCollection", "features": [']
+    yield chunks[0]
+    for index, feature in enumerate(features):
+        chunk = (',' if index else '') + json.dumps(feature, separators=(',', ':'))
+        chunks.append(chunk)
+        yield chunk
+    chunks.append(']}')
+    yield chunks[-1]
+    cache.set(f"{BODY_KEY_PREFIX}{state['version']}:{query.key}", ''.join(chunks).encode(), _cache_timeout())
@@ -0,0 +1,110 @@
+"""
+Management command to benchmark nearby-stage lookups.
+"""
+
+import random
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from bodaboda_welfare.benchmarking import format_timing, rolled_back, timed
+from bodaboda_welfare.testing import make_stage
+from stages.models import Stage
+from stages.spatial import distance_km, encode, nearest_stages, stages_within
+
+# Roughly the extent of Kenya
+SOUTH, WEST, NORTH, EAST = -4.7, 33.9, 5.0, 41.9
+
+
+class Command(BaseCommand):
+    help = 'Compare scanning every stage with geohash lookups for nearby stages (all data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stages',
+            type=int,
+            default=50000,
+            help='Number of stages to create (default: 50000)'
+        )
+        parser.add_argument(
+            '--radius',
+            type=float,
+            default=2,
+            help='Search radius in kilometres (default: 2)'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=5,
+            help='Stages returned by the nearest lookup (default: 5)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=50,
+            help='Lookups to time per scenario (default: 50)'
+        )
+        parser.add_argument(
+            '--scan-repeat',
+            type=int,
+            default=5,
+            help='Full scans to time (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        radius = options['radius']
+        limit = options['limit']
+        repeat = options['repeat']
+
+        with rolled_back():
+            organization = make_stage().organization
+
+            self.stdout.write(f"Creating {options['stages']} stages...")
+            positions = [
+                (round(random.uniform(SOUTH, NORTH), 7), round(random.uniform(WEST, EAST), 7))
+                for _ in range(options['stages'])
+            ]
+            Stage.objects.bulk_create([
+                Stage(
+                    name=f'Benchmark Stage {i}',
+                    organization=organization,
+                    location='Benchmark',
+                    county='nairobi',
+                    sub_county='Benchmark',
+                    ward='Benchmark',
+                    registration_date=date.today(),
+                    latitude=latitude,
+                    longitude=longitude,
+                    geohash=encode(latitude, longitude)
+                )
+                for i, (latitude, longitude) in enumerate(positions)
+            ], batch_size=2000)
+
+            # Search around existing stages so lookups find something
+            points = random.sample(positions, min(repeat, len(positions)))
+
+            def scan():
+                latitude, longitude = random.choice(points)
+                rows = Stage.objects.filter(
+                    is_active=True, latitude__isnull=False, longitude__isnull=False
+                ).values_list('id', 'latitude', 'longitude')
+                distances = sorted(
+                    (distance_km(latitude, longitude, lat, lng), stage_id) for stage_id, lat, lng in rows
+                )
+                return distances[:limit]
+
+            results = [
+                ('Before, scan every stage', timed(scan, options['scan_repeat'])),
+                (f'After, stages within {radius:g} km', timed(
+                    lambda: stages_within(*random.choice(points), radius), repeat
+                )),
+                (f'After, nearest {limit} stages', timed(
+                    lambda: nearest_stages(*random.choice(points), limit), repeat
+                )),
+            ]
+
+        for label, result in results:
+            self.stdout.write(format_timing(label, result))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Benchmarked nearby lookups over {options['stages']} stages"
+        ))
@@ -0,0 +1,39 @@
+"""
+Management command to rebuild or verify the denormalized member counters
+on Stage and Organization.
+"""
+
+from django.core.management.base import BaseCommand
+from stages.counters import check_member_counts, rebuild_member_counts
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the active member counters on stages and organizations from the Member table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report counters that differ from the Member table, without changing them'
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            problems = check_member_counts()
+            for model_name, pk, stored, actual in problems:
+                self.stdout.write(
+                    self.style.WARNING(f'{model_name} #{pk}: stored {stored}, actual {actual}')
+                )
+            if problems:
+                self.stdout.write(self.style.ERROR(f'{len(problems)} counters are out of date'))
+            else:
+                self.stdout.write(self.style.SUCCESS('All member counters are consistent'))
+            return
+
+        stages_changed, organizations_changed = rebuild_member_counts()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Rebuilt member counters '
+                f'({stages_changed} stages and {organizations_changed} organizations corrected)'
+            )
+        )
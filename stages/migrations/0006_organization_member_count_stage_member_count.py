@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-17 15:33
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_member_counts(apps, schema_editor):
+    Stage = apps.get_model('stages', 'Stage')
+    Organization = apps.get_model('stages', 'Organization')
+
+    for stage in Stage.objects.annotate(
+        actual=Count('members', filter=Q(members__status='active'))
+    ):
+        Stage.objects.filter(pk=stage.pk).update(member_count=stage.actual)
+
+    for organization in Organization.objects.annotate(
+        actual=Count('stages__members', filter=Q(stages__members__status='active'))
+    ):
+        Organization.objects.filter(pk=organization.pk).update(member_count=organization.actual)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0007_memberprofile'),
+        ('stages', '0005_alter_organization_county_alter_organization_town_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Active members across all stages'),
+        ),
+        migrations.AddField(
+            model_name='stage',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Active members at this stage'),
+        ),
+        migrations.RunPython(populate_member_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:10
+
+from django.db import migrations, models
+
+
+def populate_geohashes(apps, schema_editor):
+    from stages.spatial import encode
+
+    Stage = apps.get_model('stages', 'Stage')
+    stages = list(
+        Stage.objects.filter(latitude__isnull=False, longitude__isnull=False).only('id', 'latitude', 'longitude')
+    )
+    for stage in stages:
+        stage.geohash = encode(stage.latitude, stage.longitude)
+    Stage.objects.bulk_update(stages, ['geohash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stages', '0006_organization_member_count_stage_member_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stage',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.RunPython(populate_geohashes, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
+from bodaboda_welfare.models_utils import counter_safe_save_kwargs
 from .constants import KENYAN_COUNTIES, MAJOR_TOWNS
 
 class Organization(models.Model):
@@ -40,6 +41,9 @@ class Organization(models.Model):
     is_active = models.BooleanField(default=True)
     allow_inter_org_communication = models.BooleanField(default=True, help_text="Allow communication with other organizations for lost bikes etc")
     
+    # Denormalized counters, maintained by stages.counters
+    member_count = models.PositiveIntegerField(default=0, editable=False, help_text="Active members across all stages")
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -51,9 +55,12 @@ class Organization(models.Model):
     def __str__(self):
         return f"{self.name} ({self.get_organization_type_display()})"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **counter_safe_save_kwargs(self, kwargs))
+    
     def total_members(self):
         """Total members across all stages in this organization"""
-        return sum(stage.active_members_count() for stage in self.stages.all())
+        return self.member_count
     
     def total_stages(self):
         """Total stages in this organization"""
@@ -132,6 +139,8 @@ class Stage(models.Model):
     # Geographic coordinates
     latitude = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True, help_text="GPS Latitude coordinate")
     longitude = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True, help_text="GPS Longitude coordinate")
+    # Maintained from the coordinates, see stages.spatial
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
     
     # Stage leadership
     stage_leader = models.ForeignKey(
@@ -155,6 +164,9 @@ class Stage(models.Model):
     registration_date = models.DateField()
     is_active = models.BooleanField(default=True)
     
+    # Denormalized counters, maintained by stages.counters
+    member_count = models.PositiveIntegerField(default=0, editable=False, help_text="Active members at this stage")
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -167,17 +179,31 @@ class Stage(models.Model):
     def __str__(self):
         return f"{self.name} - {self.organization.name}"
     
+    def save(self, *args, **kwargs):
+        from .spatial import encode
+
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **counter_safe_save_kwargs(self, kwargs))
+    
     def active_members_count(self):
         """Count of active members in this stage"""
-        return self.members.filter(status='active').count()
+        return self.member_count
     
     def total_contributions(self):
         """Total contributions from all members in this stage"""
-        from contributions.models import Contribution
-        return Contribution.objects.filter(
-            member__stage=self, 
-            status='completed'
-        ).aggregate(total=models.Sum('amount'))['total'] or 0
+        return self.contribution_rollups.aggregate(
+            total=models.Sum('total')
+        )['total'] or 0
+    
+    def monthly_contributions(self, months=12):
+        """Completed contribution totals for the most recent months, newest first"""
+        return self.contribution_rollups.values('month', 'total', 'count')[:months]
 
 class StageLeadership(models.Model):
     """
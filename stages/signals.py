@@ -0,0 +1,84 @@
+"""
+Django signals for the stages app.
+Keep the denormalized member counters on Stage and Organization up to date,
+and start a new stage map version when a stage changes.
+"""
+
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+from members.models import Member
+from .geo import invalidate_map
+from .counters import adjust_member_count, member_counter_stage, move_member_count, move_stage_count
+from .models import Stage
+
+
+def _snapshot_member(instance):
+    instance._counted_stage_id = member_counter_stage(instance)
+
+
+@receiver(post_init, sender=Member)
+def remember_member_counter_state(sender, instance, **kwargs):
+    """
+    Remember which stage counter a loaded member contributes to.
+    Skipped for deferred loads so that no extra query is issued.
+    """
+    if 'status' in instance.__dict__ and 'stage_id' in instance.__dict__:
+        _snapshot_member(instance)
+
+
+@receiver(pre_save, sender=Member)
+def load_member_counter_state(sender, instance, **kwargs):
+    """
+    Fetch the stored state for members loaded without it.
+    """
+    if instance._state.adding or hasattr(instance, '_counted_stage_id'):
+        return
+    stored = Member.objects.filter(pk=instance.pk).values('status', 'stage_id').first()
+    if stored:
+        instance._counted_stage_id = stored['stage_id'] if stored['status'] == 'active' else None
+
+
+@receiver(post_save, sender=Member)
+def update_member_counters(sender, instance, created, **kwargs):
+    """
+    Adjust stage and organization counters when a member joins, changes
+    status or moves to another stage.
+    """
+    old_stage_id = None if created else getattr(instance, '_counted_stage_id', None)
+    move_member_count(old_stage_id, member_counter_stage(instance))
+    _snapshot_member(instance)
+
+
+@receiver(post_delete, sender=Member)
+def release_member_counters(sender, instance, **kwargs):
+    """
+    Remove a deleted member from the counters.
+    """
+    stage_id = getattr(instance, '_counted_stage_id', member_counter_stage(instance))
+    adjust_member_count(stage_id, -1)
+
+
+@receiver(post_init, sender=Stage)
+def remember_stage_organization(sender, instance, **kwargs):
+    if 'organization_id' in instance.__dict__:
+        instance._counted_organization_id = instance.organization_id
+
+
+@receiver(post_save, sender=Stage)
+def update_organization_counters(sender, instance, created, **kwargs):
+    """
+    Move a stage's member count when it is reassigned to another organization.
+    """
+    old_organization_id = getattr(instance, '_counted_organization_id', None)
+    if not created and old_organization_id is not None:
+        move_stage_count(instance, old_organization_id)
+    instance._counted_organization_id = instance.organization_id
+
+
+@receiver(post_save, sender=Stage)
+@receiver(post_delete, sender=Stage)
+def invalidate_stage_map(sender, instance, **kwargs):
+    """
+    Drop cached map responses once a stage is added, edited or removed.
+    """
+    invalidate_map()
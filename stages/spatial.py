@@ -0,0 +1,193 @@
+"""
+Proximity lookups for stages without a spatial database.
+
+Every stage with coordinates stores a ``geohash`` of its position (see
+``Stage.save``). A geohash names a grid cell, and every point inside a cell
+shares the cell's hash as a prefix, so the stages in a cell are a range scan
+on the indexed ``geohash`` column. ``stages_within`` covers a search circle
+with a handful of cells of a suitable size, then measures exact distances in
+Python for the few rows those cells return. ``nearest_stages`` widens the
+circle until it holds enough stages.
+
+Works the same on SQLite and Postgres; positions are assumed not to straddle
+the antimeridian.
+"""
+
+import math
+
+from django.db.models import Q
+
+from .models import Stage
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# Sorts after every geohash character, closing a prefix range
+PREFIX_END = '~'
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    """
+    Geohash of a position.
+
+    Args:
+        latitude: Degrees north
+        longitude: Degrees east
+        precision: Hash length; 9 characters is a cell of about 5m
+    """
+    latitude, longitude = float(latitude), float(longitude)
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value, bounds = (longitude, lng_range) if even else (latitude, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """Height and width in degrees of the cells at a geohash precision"""
+    bits = 5 * precision
+    return 180 / 2 ** (bits // 2), 360 / 2 ** ((bits + 1) // 2)
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two positions"""
+    lat1, lng1, lat2, lng2 = (math.radians(float(value)) for value in (lat1, lng1, lat2, lng2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _check_search(latitude, longitude, radius_km):
+    # NaN fails every comparison, so the cell loops below would never finish
+    if not all(math.isfinite(value) for value in (latitude, longitude, radius_km)):
+        raise ValueError('Search position and radius must be finite numbers')
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError(f'Position out of range: {latitude}, {longitude}')
+    if radius_km <= 0:
+        raise ValueError(f'Search radius must be positive: {radius_km}')
+
+
+def _bounding_box(latitude, longitude, radius_km):
+    lat_delta = radius_km / KM_PER_DEGREE
+    south = max(latitude - lat_delta, -90.0)
+    north = min(latitude + lat_delta, 90.0)
+    # Widen by the narrowest parallel inside the box
+    widest = max(abs(south), abs(north))
+    if widest >= 90:
+        return south, -180.0, north, 180.0
+    lng_delta = min(radius_km / (KM_PER_DEGREE * math.cos(math.radians(widest))), 180.0)
+    return south, max(longitude - lng_delta, -180.0), north, min(longitude + lng_delta, 180.0)
+
+
+def covering_prefixes(latitude, longitude, radius_km):
+    """
+    Geohash prefixes whose cells together cover a search circle.
+
+    Uses the finest precision whose cells are at least as large as the
+    circle, so at most four cells are needed.
+
+    Raises:
+        ValueError: If the position or radius is not finite, out of range, or
+            the radius is not positive
+    """
+    latitude, longitude, radius_km = float(latitude), float(longitude), float(radius_km)
+    _check_search(latitude, longitude, radius_km)
+    south, west, north, east = _bounding_box(latitude, longitude, radius_km)
+    precision = PRECISION
+    while precision > 1:
+        height, width = cell_size(precision)
+        if height >= north - south and width >= east - west:
+            break
+        precision -= 1
+    height, width = cell_size(precision)
+
+    prefixes = set()
+    lat = south
+    while True:
+        lng = west
+        while True:
+            prefixes.add(encode(lat, lng, precision))
+            if lng >= east:
+                break
+            lng = min(lng + width, east)
+        if lat >= north:
+            break
+        lat = min(lat + height, north)
+    return sorted(prefixes)
+
+
+def _candidates(latitude, longitude, radius_km, queryset):
+    ranges = Q()
+    for prefix in covering_prefixes(latitude, longitude, radius_km):
+        ranges |= Q(geohash__gte=prefix, geohash__lt=prefix + PREFIX_END)
+    return queryset.filter(ranges).exclude(geohash='')
+
+
+def stages_within(latitude, longitude, radius_km, queryset=None):
+    """
+    Stages within ``radius_km`` of a position, nearest first.
+
+    Args:
+        latitude: Degrees north
+        longitude: Degrees east
+        radius_km: Search radius in kilometres
+        queryset: Stages to search, active stages by default
+
+    Returns:
+        list: ``Stage`` instances with a ``distance_km`` attribute
+
+    Raises:
+        ValueError: If the position or radius is not finite, out of range, or
+            the radius is not positive
+    """
+    latitude, longitude, radius_km = float(latitude), float(longitude), float(radius_km)
+    _check_search(latitude, longitude, radius_km)
+    if queryset is None:
+        queryset = Stage.objects.filter(is_active=True)
+
+    stages = []
+    for stage in _candidates(latitude, longitude, radius_km, queryset):
+        stage.distance_km = distance_km(latitude, longitude, stage.latitude, stage.longitude)
+        if stage.distance_km <= radius_km:
+            stages.append(stage)
+    stages.sort(key=lambda stage: stage.distance_km)
+    return stages
+
+
+def nearest_stages(latitude, longitude, limit=5, max_radius_km=50, queryset=None):
+    """
+    The ``limit`` stages closest to a position.
+
+    The search circle starts small and doubles until it holds ``limit``
+    stages, so a rider in town touches a few index cells while a rider far
+    from any stage scans up to ``max_radius_km``.
+
+    Returns:
+        list: ``Stage`` instances with a ``distance_km`` attribute, nearest first
+    """
+    radius_km = min(0.5, max_radius_km)
+    while True:
+        stages = stages_within(latitude, longitude, radius_km, queryset)
+        if len(stages) >= limit or radius_km >= max_radius_km:
+            return stages[:limit]
+        radius_km = min(radius_km * 2, max_radius_km)
@@ -1,3 +1,176 @@
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+
+from bodaboda_welfare.testing import create_member, make_stage
+from members.models import Member
+from stages import geo, spatial
+from stages.counters import check_member_counts, rebuild_member_counts
+
+
+class MemberCounterTests(TestCase):
+    def setUp(self):
+        self.stage = make_stage()
+        self.organization = self.stage.organization
+
+    def assertCounts(self, stage, stage_count, organization_count):
+        stage.refresh_from_db()
+        stage.organization.refresh_from_db()
+        self.assertEqual(stage.member_count, stage_count)
+        self.assertEqual(stage.organization.member_count, organization_count)
+
+    def test_new_active_member_is_counted(self):
+        create_member(self.stage)
+        create_member(self.stage, status='inactive')
+        self.assertCounts(self.stage, 1, 1)
+
+    def test_status_change_adjusts_counters(self):
+        member = create_member(self.stage)
+        member.status = 'suspended'
+        member.save()
+        self.assertCounts(self.stage, 0, 0)
+
+        member.status = 'active'
+        member.save()
+        self.assertCounts(self.stage, 1, 1)
+
+    def test_stage_move_moves_counter(self):
+        other = make_stage(organization=self.organization)
+        member = create_member(self.stage)
+        member.stage = other
+        member.save()
+        self.assertCounts(self.stage, 0, 1)
+        self.assertCounts(other, 1, 1)
+
+    def test_status_change_on_deferred_load(self):
+        member = create_member(self.stage)
+        member = Member.objects.only('id').get(id=member.id)
+        member.status = 'deceased'
+        member.save()
+        self.assertCounts(self.stage, 0, 0)
+
+    def test_delete_releases_counter(self):
+        create_member(self.stage).delete()
+        self.assertCounts(self.stage, 0, 0)
+
+    def test_rebuild_repairs_drift(self):
+        member = create_member(self.stage)
+        Member.objects.filter(id=member.id).update(status='inactive')
+        self.assertEqual(len(check_member_counts()), 2)
+
+        self.assertEqual(rebuild_member_counts(), (1, 1))
+        self.assertEqual(check_member_counts(), [])
+        self.assertCounts(self.stage, 0, 0)
+
+
+class NearbyStageTests(TestCase):
+    def setUp(self):
+        self.stage = make_stage()
+        self.stage.latitude, self.stage.longitude = Decimal('-1.2921000'), Decimal('36.8219000')
+        self.stage.save()
+
+    def test_stages_within_measures_distance(self):
+        stages = spatial.stages_within(-1.2921, 36.8300, 2)
+        self.assertEqual([stage.id for stage in stages], [self.stage.id])
+        self.assertAlmostEqual(stages[0].distance_km, 0.9, places=1)
+        self.assertEqual(spatial.stages_within(-1.2921, 36.8300, 0.5), [])
+
+    def test_helpers_reject_non_finite_and_empty_searches(self):
+        nan, inf = float('nan'), float('inf')
+        for args in ((-1.29, 36.82, nan), (nan, 36.82, 1), (-1.29, inf, 1), (-1.29, 36.82, 0), (-1.29, 36.82, -5)):
+            with self.assertRaises(ValueError, msg=args):
+                spatial.covering_prefixes(*args)
+            with self.assertRaises(ValueError, msg=args):
+                spatial.stages_within(*args)
+
+    def test_view_rejects_non_finite_parameters(self):
+        middleware = [m for m in settings.MIDDLEWARE if 'TwoFactor' not in m]
+        self.client.force_login(User.objects.create(username='nearby_rider'))
+        url = reverse('stages:nearby')
+        with self.settings(MIDDLEWARE=middleware):
+            for params in ({'radius': 'nan'}, {'radius': 'inf'}, {'lat': 'nan'}, {'lng': '-inf'}):
+                query = {'lat': '-1.2921', 'lng': '36.8300', **params}
+                self.assertEqual(self.client.get(url, query).status_code, 400, params)
+            response = self.client.get(url, {'lat': '-1.2921', 'lng': '36.8300', 'radius': '2'})
+        self.assertEqual([stage['id'] for stage in response.json()['stages']], [self.stage.id])
+
+
+class StageMapTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.stages = []
+        for latitude, longitude in (('-1.2921', '36.8219'), ('-1.2925', '36.8225'), ('-4.0435', '39.6682')):
+            stage = make_stage()
+            stage.latitude, stage.longitude = Decimal(latitude), Decimal(longitude)
+            stage.save()
+            self.stages.append(stage)
+        self.client.force_login(User.objects.create(username='map_rider'))
+        self.middleware = [m for m in settings.MIDDLEWARE if 'TwoFactor' not in m]
+
+    def get(self, **params):
+        headers = {'HTTP_IF_NONE_MATCH': params.pop('etag')} if 'etag' in params else {}
+        # A long period keeps the version from rolling over during a test
+        with self.settings(MIDDLEWARE=self.middleware, STAGES_MAP_CACHE_TIMEOUT=86400):
+            return self.client.get(reverse('stages:map_geojson'), params, **headers)
+
+    def features(self, **params):
+        response = self.get(**params)
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return json.loads(body)['features']
+
+    def test_rejects_invalid_bbox_and_zoom(self):
+        for params in ({'bbox': '1,2,3'}, {'bbox': 'a,b,c,d'}, {'bbox': 'nan,0,1,1'}, {'bbox': '10,0,5,1'},
+                       {'bbox': '0,10,1,5'}, {'zoom': '23'}, {'zoom': '-1'}, {'zoom': 'x'}):
+            self.assertEqual(self.get(**params).status_code, 400, params)
+
+    def test_bbox_limits_stages(self):
+        features = self.features(bbox='36.8,-1.3,36.9,-1.2')
+        self.assertEqual({feature['id'] for feature in features}, {self.stages[0].id, self.stages[1].id})
+        self.assertEqual(len(self.features()), 3)
+
+    def test_nearby_stages_are_clustered_below_cluster_zoom(self):
+        create_member(self.stages[0])
+        with self.settings(STAGES_MAP_CLUSTER_ZOOM=11):
+            clusters = self.features(zoom='6')
+            points = self.features(zoom='11', bbox='36.8,-1.3,36.9,-1.2')
+        counts = [(cluster['properties']['stage_count'], cluster['properties']['member_count']) for cluster in clusters]
+        self.assertEqual(sorted(counts), [(1, 0), (2, 1)])
+        self.assertTrue(all(cluster['properties']['cluster'] for cluster in clusters))
+        self.assertEqual(len(points), 2)
+        self.assertNotIn('cluster', points[0]['properties'])
+
+    def test_unchanged_map_is_revalidated(self):
+        etag = self.get(zoom='6')['ETag']
+        self.assertEqual(self.get(zoom='6', etag=etag).status_code, 304)
+        self.assertNotEqual(self.get(zoom='7')['ETag'], etag)
+
+        # Member counts do not start a new version
+        with self.captureOnCommitCallbacks(execute=True):
+            create_member(self.stages[0])
+        self.assertEqual(self.get(zoom='6', etag=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stages[2].name = 'Renamed'
+            self.stages[2].save()
+        response = self.get(zoom='6', etag=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_version_is_derived_from_stages_and_period(self):
+        now = datetime(2026, 1, 1, 12, 0, 10, tzinfo=dt_timezone.utc)
+        with self.settings(STAGES_MAP_CACHE_TIMEOUT=60):
+            state, remaining = geo.compute_map_state(now)
+            # Another worker computes the same version
+            self.assertEqual(geo.compute_map_state(now + timedelta(seconds=30))[0], state)
+            self.assertEqual(remaining, 50)
+            self.assertNotEqual(geo.compute_map_state(now + timedelta(seconds=60))[0], state)
 
-# Create your tests here.
+            self.stages[0].delete()
+            self.assertNotEqual(geo.compute_map_state(now)[0], state)
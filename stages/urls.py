@@ -13,6 +13,8 @@ urlpatterns = [
     path('leadership/<int:stage_id>/', views.manage_leadership, name='leadership'),
     path('create/', views.create_stage, name='create'),
     path('map-view/', views.map_view, name='map_view'),
+    path('map.geojson', views.map_geojson, name='map_geojson'),
     path('reports/', views.stage_reports, name='reports'),
     path('api/save-coordinates/', views.save_stage_coordinates, name='save_coordinates'),
+    path('api/nearby/', views.nearby_stages, name='nearby'),
 ]
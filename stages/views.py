@@ -1,11 +1,16 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_GET
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import messages
 from django.utils import timezone
+from django.conf import settings
+from . import geo, spatial
 from .models import Stage
 import json
+import math
 
 @login_required
 def stage_list(request):
@@ -108,48 +113,43 @@ def create_stage(request):
 
 @login_required
 def map_view(request):
-    # Get existing stages from database
-    stages = Stage.objects.all()
-    existing_stages = []
-    
-    for stage in stages:
-        stage_data = {
-            'name': stage.name,
-            'description': stage.description or 'No description available',
-        }
-        
-        # Add coordinates if available
-        if stage.latitude and stage.longitude:
-            stage_data['latitude'] = float(stage.latitude)
-            stage_data['longitude'] = float(stage.longitude)
-        else:
-            # Default coordinates (you can remove this or set to None)
-            stage_data['latitude'] = -1.2921
-            stage_data['longitude'] = 36.8219
-            
-        existing_stages.append(stage_data)
-    
-    # If no stages exist, add some sample data
-    if not existing_stages:
-        existing_stages = [
-            {
-                'name': 'Kencom Stage',
-                'latitude': -1.2921,
-                'longitude': 36.8219,
-                'description': 'Main CBD stage'
-            },
-            {
-                'name': 'Kawangware Stage', 
-                'latitude': -1.2921,
-                'longitude': 36.7219,
-                'description': 'Dagoretti area stage'
-            }
-        ]
-    
-    context = {
-        'existing_stages': existing_stages
-    }
-    return render(request, 'stages/map_view.html', context)
+    # Stages are loaded by the page from map.geojson for the visible area
+    return render(request, 'stages/map_view.html')
+
+
+def _map_etag(request):
+    try:
+        return geo.etag(geo.MapQuery.from_request(request))
+    except ValueError:
+        return None
+
+
+def _map_last_modified(request):
+    return geo.map_state()['modified']
+
+
+@login_required
+@require_GET
+@condition(etag_func=_map_etag, last_modified_func=_map_last_modified)
+def map_geojson(request):
+    """
+    Stages inside ``?bbox=west,south,east,north`` as GeoJSON, clustered
+    below ``STAGES_MAP_CLUSTER_ZOOM`` when ``?zoom=`` is given.
+    """
+    try:
+        query = geo.MapQuery.from_request(request)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    state = geo.map_state()
+    body = geo.cached_geojson(query, state)
+    if body is not None:
+        response = HttpResponse(body, content_type='application/geo+json')
+    else:
+        response = StreamingHttpResponse(geo.stream_geojson(query, state), content_type='application/geo+json')
+    # Let the browser keep the body but revalidate it against the ETag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 # Alias for create_stage
 create = create_stage
@@ -158,6 +158,53 @@ create = create_stage
 def stage_reports(request):
     return render(request, 'stages/reports.html')
 
+@login_required
+@require_GET
+def nearby_stages(request):
+    """
+    Active stages near ``?lat=&lng=``, nearest first.
+
+    With ``?radius=`` (km) every stage inside the circle is returned, up to
+    ``?limit=``; without it the ``limit`` closest stages within
+    ``STAGES_NEARBY_MAX_RADIUS_KM``.
+    """
+    max_radius = settings.STAGES_NEARBY_MAX_RADIUS_KM
+    try:
+        latitude = float(request.GET['lat'])
+        longitude = float(request.GET['lng'])
+        limit = min(int(request.GET.get('limit', 10)), 50)
+        radius = request.GET.get('radius')
+        radius = float(radius) if radius else None
+        # NaN passes every range check below and never ends the cell search
+        if not all(math.isfinite(value) for value in (latitude, longitude, radius or 0)):
+            raise ValueError
+        if radius is not None:
+            radius = min(radius, max_radius)
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180) or limit < 1 or (radius is not None and radius <= 0):
+            raise ValueError
+    except (KeyError, ValueError):
+        return JsonResponse({'status': 'error', 'message': 'lat and lng are required'}, status=400)
+
+    if radius is not None:
+        stages = spatial.stages_within(latitude, longitude, radius)[:limit]
+    else:
+        stages = spatial.nearest_stages(latitude, longitude, limit, max_radius)
+
+    return JsonResponse({
+        'status': 'success',
+        'stages': [
+            {
+                'id': stage.id,
+                'name': stage.name,
+                'location': stage.location,
+                'county': stage.county,
+                'member_count': stage.member_count,
+                'distance_km': round(stage.distance_km, 3),
+            }
+            for stage in stages
+        ]
+    })
+
 @csrf_exempt
 @login_required
 def save_stage_coordinates(request):